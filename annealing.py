@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+# coding=utf-8
+
+from time import time
+import numpy as np
+from numba import njit
+from array_tour import flip
+from tsp import seed_random, total_distance, EVALUATIONS, ACCEPTED, NUM_COUNTERS
+
+"""
+Simulated annealing and late acceptance hill climbing for the traveling salesman problem.
+Both keep one tour alive instead of restarting, score each 2-opt move by its cost delta against
+the precomputed distances, and run in compiled batches between wall-clock checks.
+Moves pair a random city with one of its k nearest neighbors, see local_search.build_neighbor_lists.
+"""
+
+# The annealing counter arrays extend the tsp.EVALUATIONS / ACCEPTED counters with the number of new best tours.
+IMPROVED = NUM_COUNTERS
+
+def geometric_cooling(progress, startTemperature, endTemperature):
+    return startTemperature * (endTemperature / startTemperature) ** progress
+
+def linear_cooling(progress, startTemperature, endTemperature):
+    return startTemperature + (endTemperature - startTemperature) * progress
+
+COOLING_SCHEDULES = {
+    "geometric": geometric_cooling,
+    "linear": linear_cooling,
+}
+
+@njit(cache=True)
+def two_opt_move(tour, positions, distanceMap, neighbors):
+    """
+    Pick a random city and one of its neighbors, and score the 2-opt move that connects them.
+    :return: The change in distance and the two tour positions bounding the move, or (inf, 0, 0) for a no-op.
+    """
+    n = len(tour)
+    a = np.random.randint(n)
+    c = neighbors[a, np.random.randint(neighbors.shape[1])]
+    i = positions[a]
+    j = positions[c]
+    b = tour[(i + 1) % n]
+    d = tour[(j + 1) % n]
+    if c == b or d == a:
+        return np.inf, 0, 0
+    delta = distanceMap[a, c] + distanceMap[b, d] - distanceMap[a, b] - distanceMap[c, d]
+    return delta, i, j
+
+@njit(cache=True)
+def apply_two_opt(tour, positions, i, j):
+    """
+    Reverse the segment between positions i + 1 and j, or the rest of the tour if that is shorter.
+    Both give the same cycle.
+    """
+    flip(tour, positions, tour[(i + 1) % len(tour)], tour[j])
+
+@njit(cache=True)
+def anneal_batch(tour, positions, bestTour, distanceMap, neighbors, current, best, moves, startTemperature, endTemperature, counters):
+    """
+    Run a batch of simulated annealing moves, cooling geometrically from startTemperature to endTemperature.
+    The schedule is only evaluated at batch boundaries, see anneal.
+    :param counters: An EVALUATIONS / ACCEPTED / IMPROVED counter array that is incremented in place.
+    :return: The current distance and the best distance after the batch.
+    """
+    cooling = (endTemperature / startTemperature) ** (1.0 / max(moves, 1))
+    temperature = startTemperature
+    for _ in range(moves):
+        temperature *= cooling
+        delta, i, j = two_opt_move(tour, positions, distanceMap, neighbors)
+        counters[EVALUATIONS] += 1
+        if delta == np.inf:
+            continue
+        if delta <= 0.0 or np.random.random() < np.exp(-delta / temperature):
+            apply_two_opt(tour, positions, i, j)
+            current += delta
+            counters[ACCEPTED] += 1
+            if current < best:
+                best = current
+                bestTour[:] = tour
+                counters[IMPROVED] += 1
+    return current, best
+
+@njit(cache=True)
+def late_acceptance_batch(tour, positions, bestTour, distanceMap, neighbors, current, best, moves, history, step, counters):
+    """
+    Run a batch of late acceptance hill climbing moves.
+    A move is accepted if it is no worse than the current tour, or than the tour from len(history) steps ago.
+    :param step: The total number of moves made before this batch, to index the history.
+    :param counters: An EVALUATIONS / ACCEPTED / IMPROVED counter array that is incremented in place.
+    :return: The current distance and the best distance after the batch.
+    """
+    length = len(history)
+    for k in range(moves):
+        v = (step + k) % length
+        delta, i, j = two_opt_move(tour, positions, distanceMap, neighbors)
+        counters[EVALUATIONS] += 1
+        if delta != np.inf:
+            candidate = current + delta
+            if candidate <= current or candidate <= history[v]:
+                apply_two_opt(tour, positions, i, j)
+                current = candidate
+                counters[ACCEPTED] += 1
+                if current < best:
+                    best = current
+                    bestTour[:] = tour
+                    counters[IMPROVED] += 1
+        history[v] = current
+    return current, best
+
+@njit(cache=True)
+def sample_uphill_delta(tour, positions, distanceMap, neighbors, samples):
+    """
+    The mean cost of worsening moves from the current tour, used to pick a starting temperature.
+    """
+    total = 0.0
+    count = 0
+    for _ in range(samples):
+        delta, _, _ = two_opt_move(tour, positions, distanceMap, neighbors)
+        if delta != np.inf and delta > 0.0:
+            total += delta
+            count += 1
+    return total / count if count > 0 else 1.0
+
+def prepare(solution, distanceMap, seed):
+    """
+    Seed the compiled random generator and build the position index of a tour.
+    :return: The tour, its position index, a copy for the best tour, and its distance.
+    """
+    if seed is not None:
+        seed_random(seed)
+    tour = np.ascontiguousarray(solution, dtype=np.int64)
+    positions = np.empty(len(tour), dtype=np.int64)
+    positions[tour] = np.arange(len(tour))
+    return tour, positions, tour.copy(), total_distance(tour, distanceMap)
+
+def budget_progress(startTime, timeLimit, moves, maxMoves):
+    """
+    How far through its budget a run is, from 0 to 1, by time or by moves, whichever is further along.
+    """
+    progress = 0.0
+    if timeLimit is not None:
+        progress = max(progress, (time() - startTime) / timeLimit)
+    if maxMoves is not None:
+        progress = max(progress, moves / maxMoves)
+    return min(progress, 1.0)
+
+def expected_progress(progress, movesDone, moves, maxMoves):
+    """
+    Estimate the progress after the next batch of moves from the pace of the batches so far.
+    The first batch of a time-limited run stays at one temperature while the pace is measured.
+    """
+    estimate = progress + progress / movesDone * moves if movesDone > 0 else progress
+    if maxMoves is not None:
+        estimate = max(estimate, (movesDone + moves) / maxMoves)
+    return min(estimate, 1.0)
+
+def anneal(solution, distanceMap, neighbors, timeLimit=None, maxMoves=None, schedule="geometric",
+           startTemperature=None, endTemperature=None, batchSize=50000, seed=None, policy=None):
+    """
+    Improve one tour with simulated annealing until the time or move budget runs out.
+    :param solution: A list of cities in some order. Modified in place.
+    :param distanceMap: The distance matrix or backend.
+    :param neighbors: The candidate neighbor lists from local_search.build_neighbor_lists.
+    :param timeLimit: The wall-clock budget in seconds.
+    :param maxMoves: The move budget. Defaults to 2000 moves per city when there is no time limit.
+    :param schedule: A name in COOLING_SCHEDULES, or a function(progress, startTemperature, endTemperature).
+                     It is evaluated at the start and expected end of every batch, and anneal_batch cools geometrically
+                     between the two, so other schedules are followed piecewise-geometrically with one piece per batch.
+                     Lower batchSize to follow them more closely.
+    :param startTemperature: Defaults to a temperature that accepts a typical worsening move half the time.
+    :param endTemperature: Defaults to startTemperature / 1000.
+    :param batchSize: The number of moves between clock checks.
+    :param seed: Seed the compiled random generator first.
+    :param policy: A stopping.StoppingPolicy checked after every batch, counting each move as one restart.
+                   The cooling schedule still runs over timeLimit and maxMoves, so a stall ends the run early.
+    :return: The best tour found, its distance, the EVALUATIONS / ACCEPTED / IMPROVED counters,
+             and the policy's stop reason (None without a policy or if the budget ran out first).
+    """
+    startTime = time()
+    cooling = COOLING_SCHEDULES[schedule] if isinstance(schedule, str) else schedule
+    if timeLimit is None and maxMoves is None:
+        maxMoves = 2000 * len(solution)
+    tour, positions, bestTour, current = prepare(solution, distanceMap, seed)
+    best = current
+    running = None if policy is None else policy.start(startTime, best=best)
+    if startTemperature is None:
+        startTemperature = sample_uphill_delta(tour, positions, distanceMap, neighbors, 1000) / np.log(2.0)
+    if endTemperature is None:
+        endTemperature = startTemperature / 1000.0
+
+    counters = np.zeros(NUM_COUNTERS + 1, dtype=np.int64)
+    progress = 0.0
+    while progress < 1.0:
+        moves = batchSize if maxMoves is None else min(batchSize, maxMoves - counters[EVALUATIONS])
+        t1 = max(cooling(progress, startTemperature, endTemperature), 1e-12)
+        t2 = max(cooling(expected_progress(progress, counters[EVALUATIONS], moves, maxMoves), startTemperature, endTemperature), 1e-12)
+        current, best = anneal_batch(tour, positions, bestTour, distanceMap, neighbors, current, best, moves, t1, t2, counters)
+        progress = budget_progress(startTime, timeLimit, counters[EVALUATIONS], maxMoves)
+        if running is not None and running.update(best, moves):
+            break
+
+    solution[:] = bestTour
+    return solution, total_distance(solution, distanceMap), counters, None if running is None else running.reason
+
+def late_acceptance(solution, distanceMap, neighbors, timeLimit=None, maxMoves=None, historyLength=5000, batchSize=50000, seed=None,
+                    policy=None):
+    """
+    Improve one tour with late acceptance hill climbing until the time or move budget runs out.
+    Takes the same arguments as anneal, with a history length instead of a cooling schedule.
+    :return: The best tour found, its distance, the EVALUATIONS / ACCEPTED / IMPROVED counters,
+             and the policy's stop reason (None without a policy or if the budget ran out first).
+    """
+    startTime = time()
+    if timeLimit is None and maxMoves is None:
+        maxMoves = 2000 * len(solution)
+    tour, positions, bestTour, current = prepare(solution, distanceMap, seed)
+    best = current
+    running = None if policy is None else policy.start(startTime, best=best)
+    history = np.full(historyLength, current, dtype=np.float64)
+
+    counters = np.zeros(NUM_COUNTERS + 1, dtype=np.int64)
+    progress = 0.0
+    while progress < 1.0:
+        moves = batchSize if maxMoves is None else min(batchSize, maxMoves - counters[EVALUATIONS])
+        current, best = late_acceptance_batch(tour, positions, bestTour, distanceMap, neighbors, current, best, moves, history, counters[EVALUATIONS], counters)
+        progress = budget_progress(startTime, timeLimit, counters[EVALUATIONS], maxMoves)
+        if running is not None and running.update(best, moves):
+            break
+
+    solution[:] = bestTour
+    return solution, total_distance(solution, distanceMap), counters, None if running is None else running.reason
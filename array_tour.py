@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+# coding=utf-8
+
+import numpy as np
+from numba import njit
+
+"""
+Tour operations for segment reversal moves, callable from the compiled kernels.
+A tour is the usual array of cities plus a positions array with the index of every city in it.
+flip() reverses whichever side of the tour is shorter, since reversing a path or the rest of the
+cycle gives the same tour, so a 2-opt move costs at most n / 2 swaps and far less for the short
+segments that neighbor list moves make on good tours.
+
+After a flip the tour may run the other way round, so callers must look up the neighbors of a city
+through positions again instead of assuming the reversed path kept its direction.
+"""
+
+@njit(cache=True)
+def build_positions(tour):
+    """
+    :return: The position of every city in the tour.
+    """
+    positions = np.empty(len(tour), dtype=np.int64)
+    for idx in range(len(tour)):
+        positions[tour[idx]] = idx
+    return positions
+
+@njit(cache=True)
+def reverse_segment(tour, positions, i, j):
+    """
+    Reverse the tour between positions i and j inclusive, wrapping around the end if needed.
+    :param tour: A list of cities. Modified in place.
+    :param positions: The position of every city in the tour. Kept in sync.
+    :param i: The first position of the segment.
+    :param j: The last position of the segment.
+    """
+    n = len(tour)
+    length = (j - i) % n + 1
+    for _ in range(length // 2):
+        cityA = tour[i]
+        cityB = tour[j]
+        tour[i] = cityB
+        positions[cityB] = i
+        tour[j] = cityA
+        positions[cityA] = j
+        i = i + 1 if i < n - 1 else 0
+        j = j - 1 if j > 0 else n - 1
+
+@njit(cache=True)
+def flip(tour, positions, a, b):
+    """
+    Reverse the path going forward from city a to city b, or the rest of the tour if that is shorter.
+    :param tour: A list of cities. Modified in place.
+    :param positions: The position of every city in the tour. Kept in sync.
+    """
+    n = len(tour)
+    i = positions[a]
+    j = positions[b]
+    if 2 * ((j - i) % n + 1) <= n:
+        reverse_segment(tour, positions, i, j)
+    else:
+        reverse_segment(tour, positions, (j + 1) % n, (i - 1) % n)
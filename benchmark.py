@@ -0,0 +1,348 @@
+#!/usr/bin/env python3
+# coding=utf-8
+
+import argparse
+import json
+import os
+import platform
+import resource
+import sys
+import tracemalloc
+from time import perf_counter, strftime
+import numba
+import numpy as np
+from numba import njit
+from io_manager import IOManager
+from tsp import build_cities_index, build_distance_map, random_solution, total_distance, seed_random, EVALUATIONS
+from array_tour import build_positions, reverse_segment, flip
+from initial_tours import space_filling_curve_tour
+from spatial_index import KDTree, sphere_points
+import hill_climbing
+import gradient_descent
+
+"""
+Benchmark the TSP kernels on the bundled files and synthetic instances.
+JIT compile time is measured once on a tiny instance, then every kernel is timed warm.
+Results are saved as JSON and can be compared against a stored baseline to catch regressions.
+"""
+
+BUNDLED_FILES = ("49_cities.txt", "cities_full.txt")
+DEFAULT_SIZES = (1000, 5000, 20000)
+# Segment reversals need no distance matrix, so they are also timed on instances too big for one.
+DEFAULT_FLIP_SIZES = (100000, 1000000)
+# Kernels faster than this many seconds per call are timed in batches of calls.
+BATCH_TIME = 0.01
+
+def synthetic_coordinates(n, seed=0):
+    """
+    Make n random cities spread uniformly over the globe.
+    :param n: The number of cities.
+    :param seed: The seed for the coordinates.
+    :return: Arrays of longitudes and latitudes in degrees.
+    """
+    rng = np.random.default_rng(seed)
+    longitudes = rng.uniform(-180.0, 180.0, n)
+    latitudes = np.rad2deg(np.arcsin(rng.uniform(-1.0, 1.0, n))) # Uniform over the sphere, not the grid
+    return longitudes, latitudes
+
+def synthetic_cities(n, seed=0):
+    """
+    Make n random cities spread uniformly over the globe.
+    :return: A list of city tuples composed of (cityname, longitude, latitude), like IOManager.read_file.
+    """
+    longitudes, latitudes = synthetic_coordinates(n, seed)
+    return [(f"City{i}", f"{longitudes[i]:.4f}", f"{latitudes[i]:.4f}") for i in range(n)]
+
+def time_kernel(call, setup=None, minTime=1.0, maxRepeats=20, minRepeats=5):
+    """
+    Time warm calls of a kernel until minTime has passed or maxRepeats samples were taken.
+    Calls shorter than BATCH_TIME are timed in batches, so each sample is long enough for the timer and one
+    stray interruption does not decide it. Every sample is reported per call.
+    :param call: A function taking the setup result and returning the number of evaluations done.
+    :param setup: A function producing fresh arguments for each call, excluded from the timing.
+    :param minRepeats: The fewest samples, so the quartiles mean something.
+    :return: A dictionary of timings, evaluations per second and peak traced memory.
+    """
+    # One untimed call sizes the batches.
+    args = setup() if setup is not None else None
+    t1 = perf_counter()
+    call(args)
+    first = perf_counter() - t1
+    batch = max(1, int(np.ceil(BATCH_TIME / max(first, 1e-9)))) if first < BATCH_TIME else 1
+
+    times = []
+    evaluations = 0
+    tracemalloc.start()
+    spent = 0.0
+    while len(times) < maxRepeats and (spent < minTime or len(times) < minRepeats):
+        argsList = [setup() if setup is not None else None for _ in range(batch)]
+        tracemalloc.reset_peak()
+        t1 = perf_counter()
+        for args in argsList:
+            evaluations += call(args)
+        elapsed = perf_counter() - t1
+        times.append(elapsed / batch)
+        spent += elapsed
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    q1, median, q3 = np.percentile(times, (25, 50, 75))
+    return {
+        "median": float(median),
+        "q1": float(q1),
+        "q3": float(q3),
+        "min": float(np.min(times)),
+        "repeats": len(times),
+        "batch": batch,
+        "evaluations_per_sec": evaluations / (sum(times) * batch) if sum(times) > 0 else None,
+        "peak_traced_bytes": int(peak),
+    }
+
+def kernel_specs(citiesIdx, distanceMap, limit):
+    """
+    Describe each compiled kernel as a (name, call, setup) triple.
+    Every call returns the number of evaluations it did.
+    """
+    def fresh_solution():
+        return random_solution(citiesIdx)
+
+    def shuffle(_):
+        random_solution(citiesIdx)
+        return 1
+
+    def evaluate(solution):
+        total_distance(solution, distanceMap)
+        return 1
+
+    # The kernels count their own evaluations in the counter array they return.
+    def hill_climb(solution):
+        return int(hill_climbing.find_best_neighbor(solution, distanceMap)[2][EVALUATIONS])
+
+    def descend(solution):
+        return int(gradient_descent.find_best_neighbor(solution, distanceMap)[2][EVALUATIONS])
+
+    def descend_sampled(solution):
+        return int(gradient_descent.find_best_neighbor(solution, distanceMap, limit)[2][EVALUATIONS])
+
+    return [
+        ("random_solution", shuffle, None),
+        ("total_distance", evaluate, fresh_solution),
+        ("hill_climbing.find_best_neighbor", hill_climb, fresh_solution),
+        ("gradient_descent.find_best_neighbor", descend, fresh_solution),
+        (f"gradient_descent.find_best_neighbor[limit={limit}]", descend_sampled, fresh_solution),
+    ]
+
+@njit(cache=True)
+def plain_flips(tour, positions, pairs):
+    """
+    Apply the 2-opt move joining each pair of cities, always reversing the path after the first city.
+    """
+    n = len(tour)
+    for k in range(len(pairs)):
+        i = positions[pairs[k, 0]]
+        j = positions[pairs[k, 1]]
+        if i != j:
+            reverse_segment(tour, positions, (i + 1) % n, j)
+
+@njit(cache=True)
+def shorter_flips(tour, positions, pairs):
+    """
+    Apply the same moves as plain_flips with array_tour.flip, which reverses the shorter side.
+    """
+    n = len(tour)
+    for k in range(len(pairs)):
+        i = positions[pairs[k, 0]]
+        j = positions[pairs[k, 1]]
+        if i != j:
+            flip(tour, positions, tour[(i + 1) % n], tour[j])
+
+def benchmark_flips(points, minTime, moves=200, seed=0):
+    """
+    Time 2-opt segment reversals between cities and their nearest neighbors, starting from a space-filling curve tour
+    like a real search would, with the plain array reversal and with array_tour.flip.
+    :param points: The (n, 3) city positions.
+    :return: A dictionary with the instance size and both timings.
+    """
+    n = len(points)
+    tree = KDTree(points)
+    neighbors = tree.neighbor_lists(8)
+    start = space_filling_curve_tour(tree.points, False, np.empty(n, dtype=np.int64))
+    rng = np.random.default_rng(seed)
+    cities = rng.integers(0, n, moves)
+    pairs = np.ascontiguousarray(np.column_stack((cities, neighbors[cities, rng.integers(0, neighbors.shape[1], moves)])))
+    plain_flips(start.copy(), build_positions(start), pairs[:1]) # Compile both outside the timings
+    shorter_flips(start.copy(), build_positions(start), pairs[:1])
+
+    def fresh_tour():
+        return start.copy(), build_positions(start)
+    kernels = {}
+    for name, kernel in (("plain_reversal", plain_flips), ("array_tour.flip", shorter_flips)):
+        def call(args, kernel=kernel):
+            kernel(args[0], args[1], pairs)
+            return moves
+        kernels[name] = time_kernel(call, fresh_tour, minTime=minTime, maxRepeats=5)
+        print(f"  {name:<48} {kernels[name]['median']:.6f} sec", file=sys.stderr)
+    return {"cities": n, "moves": moves, "kernels": kernels}
+
+def measure_compile_times(limit):
+    """
+    Time the first call of every kernel on a tiny instance, minus a warm call.
+    :return: A dictionary of kernel name to compile seconds.
+    """
+    cities = synthetic_cities(8)
+    citiesIdx = build_cities_index(cities)
+    distanceMap, _ = build_distance_map(cities, citiesIdx, verbose=False)
+    compileTimes = {}
+    for name, call, setup in kernel_specs(citiesIdx, distanceMap, limit):
+        t1 = perf_counter()
+        call(setup() if setup is not None else None)
+        first = perf_counter() - t1
+        t1 = perf_counter()
+        call(setup() if setup is not None else None)
+        warm = perf_counter() - t1
+        compileTimes[name] = max(first - warm, 0.0)
+    return compileTimes
+
+def benchmark_instance(cities, minTime, limit, dtype, backend="auto"):
+    """
+    Time the distance build and every kernel on one instance.
+    :param backend: The distance backend, see tsp.build_distance_map. "auto" picks by size, so large instances
+                    may not be dense.
+    :return: A dictionary with the instance size, the distance backend used, process peak memory and kernel timings.
+    """
+    citiesIdx = build_cities_index(cities)
+    n = len(citiesIdx)
+    kernels = {}
+
+    holder = {}
+    def build(_):
+        holder["distanceMap"] = build_distance_map(cities, citiesIdx, dtype=dtype, verbose=False, backend=backend)[0]
+        return n * n
+    kernels["build_distance_map"] = time_kernel(build, minTime=minTime, maxRepeats=5, minRepeats=1)
+    distanceMap = holder.pop("distanceMap")
+    backendName = "dense" if isinstance(distanceMap, np.ndarray) else type(distanceMap).__name__
+    print(f"  {'distance backend':<48} {backendName}", file=sys.stderr)
+
+    for name, call, setup in kernel_specs(citiesIdx, distanceMap, limit):
+        kernels[name] = time_kernel(call, setup, minTime=minTime)
+        print(f"  {name:<48} {kernels[name]['median']:.6f} sec", file=sys.stderr)
+    del distanceMap
+    return {
+        "cities": n,
+        "backend": backendName,
+        "max_rss_bytes": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024,
+        "kernels": kernels,
+    }
+
+def compare(results, baseline, tolerance):
+    """
+    Find kernels that got slower than run-to-run noise explains: the new first quartile is above the baseline's
+    third quartile by more than the tolerance, so most of the new samples are slower than most of the old ones.
+    Baselines saved without quartiles are compared by their medians. Instances whose distance backend changed are skipped.
+    :return: A list of (instance, kernel, baseline seconds, new seconds) regressions, as medians.
+    """
+    regressions = []
+    for section in ("instances", "flips"):
+        for instance, data in results.get(section, {}).items():
+            old = baseline.get(section, {}).get(instance)
+            if old is None or old.get("backend") != data.get("backend"):
+                continue
+            for kernel, timing in data["kernels"].items():
+                oldTiming = old["kernels"].get(kernel)
+                if oldTiming is None:
+                    continue
+                if timing.get("q1", timing["median"]) > oldTiming.get("q3", oldTiming["median"]) * (1 + tolerance):
+                    regressions.append((instance, kernel, oldTiming["median"], timing["median"]))
+    return regressions
+
+def changed_backends(results, baseline):
+    """
+    :return: A list of (instance, baseline backend, new backend) for instances that were not compared.
+    """
+    old = baseline.get("instances", {})
+    return [(instance, old[instance].get("backend"), data.get("backend")) for instance, data in results.get("instances", {}).items()
+            if instance in old and old[instance].get("backend") != data.get("backend")]
+
+def run(sizes=DEFAULT_SIZES, bundled=True, minTime=1.0, limit=500, dtype=np.float64, seed=0, flipSizes=DEFAULT_FLIP_SIZES,
+        backend="auto"):
+    """
+    Run the whole benchmark.
+    :return: A JSON serializable dictionary of results.
+    """
+    seed_random(seed)
+    np.random.seed(seed)
+    results = {
+        "meta": {
+            "timestamp": strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "numba": numba.__version__,
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "dtype": np.dtype(dtype).name,
+            "backend": backend,
+            "min_time": minTime,
+        },
+        "compile": measure_compile_times(limit),
+        "instances": {},
+        "flips": {},
+    }
+    instances = []
+    flipInstances = []
+    if bundled:
+        ioManager = IOManager()
+        for filename in BUNDLED_FILES:
+            if os.path.exists(filename):
+                instances.append((filename.split('.')[0], lambda f=filename: ioManager.read_file(f)))
+                flipInstances.append((filename.split('.')[0], lambda f=filename: ioManager.read_coordinates(f)[1:]))
+    for n in flipSizes:
+        flipInstances.append((f"random_{n}", lambda n=n: synthetic_coordinates(n, seed)))
+    for n in sizes:
+        instances.append((f"random_{n}", lambda n=n: synthetic_cities(n, seed)))
+
+    for name, load in instances:
+        print(f"Benchmarking {name}", file=sys.stderr)
+        results["instances"][name] = benchmark_instance(load(), minTime, limit, dtype, backend)
+    for name, load in flipInstances:
+        print(f"Benchmarking segment reversals on {name}", file=sys.stderr)
+        longitudes, latitudes = load()
+        results["flips"][name] = benchmark_flips(sphere_points(latitudes, longitudes), minTime, seed=seed)
+    return results
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the TSP kernels across instance sizes.")
+    parser.add_argument("--sizes", type=int, nargs="*", default=list(DEFAULT_SIZES), help="Synthetic instance sizes (default 1000 5000 20000).")
+    parser.add_argument("--flip-sizes", type=int, nargs="*", default=list(DEFAULT_FLIP_SIZES),
+                        help="Synthetic instance sizes for the segment reversal benchmark (default 100000 1000000).")
+    parser.add_argument("--no-bundled", action="store_true", help="Skip 49_cities.txt and cities_full.txt.")
+    parser.add_argument("--min-time", type=float, default=1.0, help="Seconds to spend timing each kernel (default 1.0).")
+    parser.add_argument("--limit", type=int, default=500, help="Sampled swaps for gradient descent (default 500).")
+    parser.add_argument("--dtype", choices=("float64", "float32"), default="float64")
+    parser.add_argument("--backend", choices=("auto", "dense", "condensed", "haversine", "tiled"), default="auto",
+                        help="Distance backend (default auto, which is not dense once the matrix exceeds the memory limit).")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("-o", "--output", default="benchmark.json", help="Where to save the results (default benchmark.json).")
+    parser.add_argument("--baseline", default=None, help="A previous results file to compare against.")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="Allowed slowdown of the new first quartile over the baseline's third quartile (default 0.25).")
+    args = parser.parse_args(argv)
+
+    results = run(args.sizes, not args.no_bundled, args.min_time, args.limit, np.dtype(args.dtype), args.seed, args.flip_sizes,
+                  args.backend)
+    with open(args.output, mode='w') as outfile:
+        json.dump(results, outfile, indent=2)
+    print(f"Saved results to {args.output}")
+
+    if args.baseline is not None:
+        with open(args.baseline) as infile:
+            baseline = json.load(infile)
+        for instance, old, new in changed_backends(results, baseline):
+            print(f"Not compared {instance}: the baseline used the {old} backend, this run {new}.")
+        regressions = compare(results, baseline, args.tolerance)
+        for instance, kernel, old, new in regressions:
+            print(f"REGRESSION {instance} {kernel}: {old:.6f} sec -> {new:.6f} sec")
+        if regressions:
+            sys.exit(1)
+        print("No regressions against the baseline.")
+
+if __name__ == "__main__":
+    main()
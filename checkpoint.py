@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+# coding=utf-8
+
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from time import time
+import numpy as np
+from temp_files import create_temp_file
+
+"""
+Periodic checkpoints for long solves, so a run that dies can resume where it stopped.
+A checkpoint is an uncompressed .npz of plain arrays and strings, never pickles. It is written to a temporary
+file next to the target, flushed to disk and renamed over it, so a crash mid-write always leaves the previous one.
+Writes happen on a background thread, so the search only pays for copying its state.
+"""
+
+# Bump when the checkpoint layout changes, so old files are refused instead of misread.
+CHECKPOINT_VERSION = 2
+
+def write_checkpoint(path, state):
+    """
+    Atomically write a checkpoint.
+    :param path: The checkpoint file. Its directory is created if missing.
+    :param state: A dictionary of numpy arrays, numbers and strings.
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, tempPath = create_temp_file(directory, prefix=os.path.basename(path) + ".")
+    try:
+        with os.fdopen(fd, mode='wb') as outfile:
+            np.savez(outfile, version=CHECKPOINT_VERSION, **state)
+            outfile.flush()
+            os.fsync(outfile.fileno())
+        os.replace(tempPath, path)
+    except BaseException:
+        if os.path.exists(tempPath):
+            os.remove(tempPath)
+        raise
+
+def read_checkpoint(path):
+    """
+    Read a checkpoint written by write_checkpoint.
+    :return: A dictionary of the saved arrays. Scalars come back as 0-d arrays.
+    """
+    with np.load(path, allow_pickle=False) as data:
+        state = {key: data[key] for key in data.files}
+    if int(state.get("version", -1)) != CHECKPOINT_VERSION:
+        raise ValueError(f"{path} is not a version {CHECKPOINT_VERSION} checkpoint.")
+    return state
+
+class Checkpointer:
+    """
+    Write checkpoints to one path on a background thread, at most once per interval.
+    If the previous write is still running when the next one is due, the new state is skipped rather than queued.
+    Use as a context manager, or call close() when done, to wait for the last write.
+    """
+
+    def __init__(self, path, interval=60.0):
+        """
+        :param path: The checkpoint file.
+        :param interval: The least seconds between checkpoints.
+        """
+        self.path = path
+        self.interval = interval
+        self.lastSave = time()
+        self.written = 0
+        self.pending = None
+        self.pool = ThreadPoolExecutor(max_workers=1)
+
+    def due(self):
+        return time() - self.lastSave >= self.interval
+
+    def save(self, state, wait=False):
+        """
+        Hand a state to the writer thread. The caller must not modify its arrays afterwards.
+        :param wait: Write even if the previous write is still running, and block until this one is on disk.
+        :return: True if the state will be written.
+        """
+        if self.pending is not None:
+            if not self.pending.done() and not wait:
+                return False
+            self.pending.result() # Raise a failed earlier write here rather than lose it
+        self.pending = self.pool.submit(write_checkpoint, self.path, state)
+        self.lastSave = time()
+        self.written += 1
+        if wait:
+            self.pending.result()
+        return True
+
+    def close(self):
+        if self.pending is not None:
+            self.pending.result()
+            self.pending = None
+        self.pool.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def settings_string(**settings):
+    """
+    Serialize the settings that must match for a checkpoint to resume, in a stable order.
+    """
+    return json.dumps(settings, sort_keys=True)
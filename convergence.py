@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+# coding=utf-8
+
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+
+"""
+Record best-so-far convergence in bounded memory and render it without blocking the search.
+The recorder keeps only the points where a round improved, in preallocated arrays, and halves
+its resolution whenever it fills up, so a run of any length costs a fixed number of points.
+Plots are drawn with matplotlib's Agg backend in a separate process.
+"""
+
+class ConvergenceRecorder:
+    """
+    Best-so-far distance against iteration, one line per round.
+    Each round stores its first point, every improvement and its last point, at most capacity points in all.
+    """
+
+    def __init__(self, capacity=4096):
+        """
+        :param capacity: The most points kept. At least twice the number of rounds, so every round keeps both ends.
+        """
+        self.capacity = capacity
+        self.iterations = np.empty(capacity, dtype=np.int64)
+        self.distances = np.empty(capacity, dtype=np.float64)
+        self.size = 0
+        self.roundStarts = []
+
+    def record_trace(self, trace, offset=0):
+        """
+        Record one round from its best-so-far trace.
+        :param trace: The best-so-far distance after every iteration of the round, non-increasing.
+        :param offset: The iteration number of the first entry.
+        """
+        trace = np.asarray(trace, dtype=np.float64)
+        if len(trace) == 0:
+            return
+        improved = np.flatnonzero(trace[1:] < trace[:-1]) + 1
+        keep = np.unique(np.concatenate(([0], improved, [len(trace) - 1])))
+        while self.size + len(keep) > self.capacity and self.compact():
+            pass
+        if self.size + len(keep) > self.capacity:
+            keep = keep[np.unique(np.linspace(0, len(keep) - 1, max(2, self.capacity - self.size)).astype(np.int64))]
+        self.roundStarts.append(self.size)
+        self.iterations[self.size:self.size + len(keep)] = offset + keep
+        self.distances[self.size:self.size + len(keep)] = trace[keep]
+        self.size += len(keep)
+
+    def compact(self):
+        """
+        Drop every other stored point, keeping the first and last point of each round.
+        :return: True if any point was dropped.
+        """
+        ends = [start - 1 for start in self.roundStarts[1:]] + [self.size - 1]
+        keep = np.zeros(self.size, dtype=np.bool_)
+        keep[::2] = True
+        keep[self.roundStarts] = True
+        keep[ends] = True
+        if keep.all():
+            return False
+        newStarts = np.cumsum(keep) - 1
+        self.roundStarts = [int(newStarts[start]) for start in self.roundStarts]
+        count = int(keep.sum())
+        self.iterations[:count] = self.iterations[:self.size][keep]
+        self.distances[:count] = self.distances[:self.size][keep]
+        self.size = count
+        return True
+
+    def rounds(self):
+        """
+        :return: A list of (iterations, distances) array pairs, one per round.
+        """
+        bounds = self.roundStarts + [self.size]
+        return [(self.iterations[start:end], self.distances[start:end]) for start, end in zip(bounds[:-1], bounds[1:])]
+
+    def to_dict(self):
+        """
+        :return: A JSON serializable dictionary of the recorded points, readable by from_dict.
+        """
+        return {
+            "iterations": self.iterations[:self.size].tolist(),
+            "distances": self.distances[:self.size].tolist(),
+            "round_starts": list(self.roundStarts),
+        }
+
+    @classmethod
+    def from_dict(cls, data, capacity=None):
+        """
+        :param capacity: The capacity of the new recorder, for recording more rounds. Defaults to the points in data.
+        """
+        recorder = cls(max(len(data["iterations"]), 2, capacity or 0))
+        recorder.size = len(data["iterations"])
+        recorder.iterations[:recorder.size] = data["iterations"]
+        recorder.distances[:recorder.size] = data["distances"]
+        recorder.roundStarts = list(data["round_starts"])
+        return recorder
+
+def plot_convergence(ax, recorder):
+    """
+    Draw every round of a recorder as a best-so-far step line on a matplotlib axis.
+    Tick positions are left to matplotlib, so long runs do not create one tick per thousand iterations.
+    """
+    for iterations, distances in recorder.rounds():
+        ax.plot(iterations, distances, drawstyle="steps-post")
+
+def draw(data, filepath, title, subtitle):
+    """
+    Render a recorder's to_dict() data to an image file with the Agg backend. The format comes from the extension.
+    The figure is drawn on its own Agg canvas, so pyplot's backend and open figures in the caller are left alone.
+    """
+    from matplotlib import style
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+
+    with style.context("ggplot"):
+        fig = Figure(figsize=(8,6))
+        FigureCanvasAgg(fig)
+        ax = fig.subplots()
+        plot_convergence(ax, ConvergenceRecorder.from_dict(data))
+        fig.suptitle(title, fontsize=24)
+        ax.set_title(subtitle, fontsize=12)
+        ax.set_xlabel("Iterations", fontsize=16)
+        ax.set_ylabel("Shortest Distance (km)", fontsize=16)
+        ax.tick_params(axis="both", which="major", labelsize=12)
+        fig.tight_layout()
+        fig.savefig(filepath)
+    return filepath
+
+# One spawned process renders every plot in turn. Spawned, so it never shares matplotlib or GUI state with the caller.
+_renderer = None
+
+def render(recorder, filepath, title, subtitle="", background=True):
+    """
+    Save a convergence plot as PNG, SVG or any other format matplotlib knows from the file extension.
+    :param recorder: A ConvergenceRecorder.
+    :param filepath: The image file to write.
+    :param background: Render in a separate process and return at once.
+    :return: A concurrent.futures.Future resolving to filepath, or filepath itself when background is False.
+    """
+    global _renderer
+    data = recorder.to_dict()
+    if not background:
+        return draw(data, filepath, title, subtitle)
+    if _renderer is None:
+        _renderer = ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn"))
+    return _renderer.submit(draw, data, filepath, title, subtitle)
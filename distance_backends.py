@@ -0,0 +1,378 @@
+#!/usr/bin/env python3
+# coding=utf-8
+
+import math
+import numpy as np
+from numba import njit, float32, float64, int64
+from numba.experimental import jitclass
+from distance_metrics import get_metric, prepare, GEO_RADIUS
+
+"""
+Memory-bounded distance backends for instances too large for a dense n x n matrix.
+Every backend supports len(backend) and backend[cityA, cityB] from Python and from compiled code,
+so total_distance, find_best_neighbor and local_search accept them in place of the dense matrix.
+
+- dense: the (n, n) matrix from tsp.haversine_matrix. 8 n^2 bytes.
+- condensed: the upper triangle as a flat float32 array. 2 n^2 bytes. Works with any distance_metrics metric.
+- haversine: nothing stored, every lookup is computed from precomputed radians and cosines. O(n) bytes.
+- tiled: haversine plus an LRU cache of full rows for cities that are looked up often.
+- planar and geo: the euclidean, TSPLIB euc_2d, att and geo metrics computed on the fly, for TSPLIB instances
+  too large for the condensed backend. O(n) bytes.
+
+Functions that take a jitclass backend are compiled once per process. Numba cannot cache them on disk.
+"""
+
+# approximate radius of earth in km, same as tsp.haversine
+R = 6373.0
+
+# Memory budget for the distance data when backend="auto".
+DEFAULT_MEMORY_LIMIT = 2 * 1024**3
+
+# The metrics PlanarDistance computes, in the order of its kind codes.
+PLANAR_METRICS = ("euclidean", "euc_2d", "att")
+
+@njit(cache=True)
+def haversine_radians(latA, lngA, cosLatA, latB, lngB, cosLatB):
+    """
+    The haversine distance between two points whose radians and latitude cosines are already known.
+    """
+    d = np.sin((latB - latA)/2)**2 + \
+        cosLatA * cosLatB * \
+        np.sin((lngB - lngA)/2)**2
+    d = min(max(d, 0.0), 1.0) # Guard arcsin against rounding error
+    return 2 * R * np.arcsin(np.sqrt(d))
+
+@njit(cache=True)
+def haversine_rows(lat, lng, cosLat, start, end):
+    """
+    Compute full rows of the distance matrix on the fly.
+    :return: An (end - start, n) float64 array.
+    """
+    n = len(lat)
+    rows = np.empty((end - start, n), dtype=np.float64)
+    for r in range(end - start):
+        i = start + r
+        for j in range(n):
+            rows[r, j] = 0.0 if i == j else haversine_radians(lat[i], lng[i], cosLat[i], lat[j], lng[j], cosLat[j])
+    return rows
+
+def condensed_distances(metric, first, second, chunkSize=1024):
+    """
+    The flat upper triangle of the distance matrix for any distance_metrics metric, computed in blocks of rows.
+    Plain NumPy rather than threads, so the process can still fork its restart workers afterwards.
+    :param metric: A distance_metrics metric name.
+    :param first: Latitudes in degrees for geographic metrics, x otherwise.
+    :param second: Longitudes in degrees for geographic metrics, y otherwise.
+    :return: A CondensedDistance.
+    """
+    kernel = get_metric(metric).kernel
+    prepared = prepare(metric, first, second)
+    n = len(prepared[0])
+    data = np.empty(n * (n - 1) // 2, dtype=np.float32)
+    for start in range(0, n - 1, chunkSize):
+        end = min(start + chunkSize, n - 1)
+        block = kernel(prepared, np.arange(start, end)[:, np.newaxis], np.arange(start + 1, n)[np.newaxis, :])
+        for i in range(start, end):
+            offset = i * n - i * (i + 1) // 2
+            data[offset:offset + n - i - 1] = block[i - start, i - start:]
+    return CondensedDistance(data, n)
+
+@jitclass([("data", float32[::1]), ("n", int64)])
+class CondensedDistance:
+    """
+    The upper triangle of a symmetric distance matrix stored as one flat float32 array.
+    """
+
+    def __init__(self, data, n):
+        self.data = data
+        self.n = n
+
+    def __len__(self):
+        return self.n
+
+    def __getitem__(self, key):
+        i, j = key
+        if i == j:
+            return 0.0
+        if i > j:
+            i, j = j, i
+        return self.data[i * self.n - i * (i + 1) // 2 + j - i - 1]
+
+    def rows(self, start, end):
+        rows = np.empty((end - start, self.n), dtype=np.float64)
+        for r in range(end - start):
+            for j in range(self.n):
+                rows[r, j] = self[start + r, j]
+        return rows
+
+@jitclass([("lat", float64[::1]), ("lng", float64[::1]), ("cosLat", float64[::1])])
+class HaversineDistance:
+    """
+    Computes every lookup on the fly from coordinates already converted to radians.
+    """
+
+    def __init__(self, lat, lng, cosLat):
+        self.lat = lat
+        self.lng = lng
+        self.cosLat = cosLat
+
+    def __len__(self):
+        return len(self.lat)
+
+    def __getitem__(self, key):
+        i, j = key
+        if i == j:
+            return 0.0
+        return haversine_radians(self.lat[i], self.lng[i], self.cosLat[i], self.lat[j], self.lng[j], self.cosLat[j])
+
+    def rows(self, start, end):
+        return haversine_rows(self.lat, self.lng, self.cosLat, start, end)
+
+@jitclass([("lat", float64[::1]), ("lng", float64[::1]), ("cosLat", float64[::1]),
+           ("tiles", float32[:, ::1]), ("slotOf", int64[::1]), ("rowOf", int64[::1]),
+           ("lastUsed", int64[::1]), ("heat", int64[::1]), ("promoteAfter", int64),
+           ("clock", int64), ("hits", int64), ("misses", int64)])
+class TiledDistance:
+    """
+    On the fly haversine with an LRU cache of full rows.
+    A row is only cached once its city has been looked up promoteAfter times without a cached row,
+    so scattered lookups stay cheap and the rows the search keeps scanning are served from memory.
+    Not safe to share between threads. Each worker process gets its own copy of the cache.
+    """
+
+    def __init__(self, lat, lng, cosLat, capacity, promoteAfter):
+        n = len(lat)
+        self.lat = lat
+        self.lng = lng
+        self.cosLat = cosLat
+        self.tiles = np.empty((capacity, n), dtype=np.float32)
+        self.slotOf = np.full(n, -1, dtype=np.int64)
+        self.rowOf = np.full(capacity, -1, dtype=np.int64)
+        self.lastUsed = np.zeros(capacity, dtype=np.int64)
+        self.heat = np.zeros(n, dtype=np.int64)
+        self.promoteAfter = promoteAfter
+        self.clock = 0
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.lat)
+
+    def load_row(self, i):
+        """
+        Compute row i into the least recently used slot.
+        :return: The slot holding the row.
+        """
+        slot = np.argmin(self.lastUsed)
+        evicted = self.rowOf[slot]
+        if evicted >= 0:
+            self.slotOf[evicted] = -1
+            self.heat[evicted] = 0
+        self.tiles[slot] = haversine_rows(self.lat, self.lng, self.cosLat, i, i + 1)[0]
+        self.rowOf[slot] = i
+        self.slotOf[i] = slot
+        return slot
+
+    def __getitem__(self, key):
+        i, j = key
+        if i == j:
+            return 0.0
+        self.clock += 1
+        slot = self.slotOf[i]
+        if slot >= 0:
+            self.hits += 1
+            self.lastUsed[slot] = self.clock
+            return float64(self.tiles[slot, j])
+        slot = self.slotOf[j] # The matrix is symmetric, so row j works too
+        if slot >= 0:
+            self.hits += 1
+            self.lastUsed[slot] = self.clock
+            return float64(self.tiles[slot, i])
+
+        self.misses += 1
+        self.heat[i] += 1
+        if self.heat[i] >= self.promoteAfter:
+            slot = self.load_row(i)
+            self.lastUsed[slot] = self.clock
+            return float64(self.tiles[slot, j])
+        return haversine_radians(self.lat[i], self.lng[i], self.cosLat[i], self.lat[j], self.lng[j], self.cosLat[j])
+
+    def rows(self, start, end):
+        return haversine_rows(self.lat, self.lng, self.cosLat, start, end)
+
+@njit(cache=True)
+def planar_distance(kind, xA, yA, xB, yB):
+    """
+    One of the PLANAR_METRICS between two points, with the same rounding as its distance_metrics kernel.
+    :param kind: The metric's index in PLANAR_METRICS.
+    """
+    dx = xB - xA
+    dy = yB - yA
+    if kind == 2: # TSPLIB ATT: rounded up unless it is whole
+        r = np.sqrt((dx**2 + dy**2) / 10.0)
+        t = np.floor(r + 0.5)
+        return t + 1.0 if t < r else t
+    d = math.hypot(dx, dy)
+    if kind == 1: # TSPLIB EUC_2D: rounded to the nearest integer
+        return np.floor(d + 0.5)
+    return d
+
+@njit(cache=True)
+def planar_rows(x, y, kind, start, end):
+    """
+    Compute full rows of a planar distance matrix on the fly.
+    :return: An (end - start, n) float64 array.
+    """
+    n = len(x)
+    rows = np.empty((end - start, n), dtype=np.float64)
+    for r in range(end - start):
+        i = start + r
+        for j in range(n):
+            rows[r, j] = 0.0 if i == j else planar_distance(kind, x[i], y[i], x[j], y[j])
+    return rows
+
+@njit(cache=True)
+def geo_distance(latA, lngA, latB, lngB):
+    """
+    The TSPLIB GEO distance between two points already converted to radians with distance_metrics.geo_radians.
+    """
+    q1 = np.cos(lngA - lngB)
+    q2 = np.cos(latA - latB)
+    q3 = np.cos(latA + latB)
+    arc = np.arccos(min(max(0.5 * ((1.0 + q1) * q2 - (1.0 - q1) * q3), -1.0), 1.0))
+    return np.trunc(GEO_RADIUS * arc + 1.0)
+
+@njit(cache=True)
+def geo_rows(lat, lng, start, end):
+    """
+    Compute full rows of the GEO distance matrix on the fly.
+    :return: An (end - start, n) float64 array.
+    """
+    n = len(lat)
+    rows = np.empty((end - start, n), dtype=np.float64)
+    for r in range(end - start):
+        i = start + r
+        for j in range(n):
+            rows[r, j] = 0.0 if i == j else geo_distance(lat[i], lng[i], lat[j], lng[j])
+    return rows
+
+@jitclass([("x", float64[::1]), ("y", float64[::1]), ("kind", int64)])
+class PlanarDistance:
+    """
+    Computes every lookup of one of the PLANAR_METRICS on the fly from x, y coordinates.
+    """
+
+    def __init__(self, x, y, kind):
+        self.x = x
+        self.y = y
+        self.kind = kind
+
+    def __len__(self):
+        return len(self.x)
+
+    def __getitem__(self, key):
+        i, j = key
+        if i == j:
+            return 0.0
+        return planar_distance(self.kind, self.x[i], self.y[i], self.x[j], self.y[j])
+
+    def rows(self, start, end):
+        return planar_rows(self.x, self.y, self.kind, start, end)
+
+@jitclass([("lat", float64[::1]), ("lng", float64[::1])])
+class GeoDistance:
+    """
+    Computes every TSPLIB GEO lookup on the fly from coordinates already converted to radians.
+    """
+
+    def __init__(self, lat, lng):
+        self.lat = lat
+        self.lng = lng
+
+    def __len__(self):
+        return len(self.lat)
+
+    def __getitem__(self, key):
+        i, j = key
+        if i == j:
+            return 0.0
+        return geo_distance(self.lat[i], self.lng[i], self.lat[j], self.lng[j])
+
+    def rows(self, start, end):
+        return geo_rows(self.lat, self.lng, start, end)
+
+def select_backend(n, memoryLimit=DEFAULT_MEMORY_LIMIT, itemsize=8):
+    """
+    Pick the fastest backend whose distance data fits in the memory budget.
+    :param n: The number of cities.
+    :param memoryLimit: The budget in bytes.
+    :param itemsize: The bytes per entry of the dense matrix.
+    :return: "dense", "condensed" or "tiled".
+    """
+    if n * n * itemsize <= memoryLimit:
+        return "dense"
+    if n * (n - 1) // 2 * 4 <= memoryLimit:
+        return "condensed"
+    return "tiled"
+
+def build_distance_backend(latitudes, longitudes, backend, memoryLimit=DEFAULT_MEMORY_LIMIT, promoteAfter=64):
+    """
+    Build a non-dense distance backend from coordinates in degrees.
+    :param latitudes: An array of latitudes in degrees.
+    :param longitudes: An array of longitudes in degrees.
+    :param backend: "condensed", "haversine" or "tiled".
+    :param memoryLimit: The budget in bytes for the tiled backend's row cache.
+    :param promoteAfter: The tiled backend caches a row after this many uncached lookups of its city.
+    :return: A backend supporting len() and [cityA, cityB] lookups.
+    """
+    lat = np.ascontiguousarray(np.deg2rad(latitudes), dtype=np.float64)
+    lng = np.ascontiguousarray(np.deg2rad(longitudes), dtype=np.float64)
+    cosLat = np.cos(lat)
+    n = len(lat)
+    if backend == "condensed":
+        return condensed_distances("haversine", latitudes, longitudes)
+    if backend == "haversine":
+        return HaversineDistance(lat, lng, cosLat)
+    if backend == "tiled":
+        capacity = int(max(1, min(n, memoryLimit // (4 * n))))
+        return TiledDistance(lat, lng, cosLat, capacity, promoteAfter)
+    raise ValueError(f"Unknown distance backend '{backend}'.")
+
+def build_metric_backend(metric, first, second, backend, memoryLimit=DEFAULT_MEMORY_LIMIT):
+    """
+    Build a non-dense distance backend for any distance_metrics metric.
+    The haversine, planar and geo metrics are computed on the fly when asked for the haversine or tiled backend,
+    which is what "auto" picks once the condensed backend does not fit. Other metrics need the condensed backend to fit.
+    :param metric: A distance_metrics metric name.
+    :param first: Latitudes in degrees for geographic metrics, x otherwise.
+    :param second: Longitudes in degrees for geographic metrics, y otherwise.
+    :param backend: "condensed", "haversine" or "tiled".
+    :param memoryLimit: The budget in bytes.
+    :return: A backend supporting len() and [cityA, cityB] lookups.
+    """
+    if metric == "haversine":
+        return build_distance_backend(first, second, backend, memoryLimit)
+    if backend == "condensed":
+        return condensed_distances(metric, first, second)
+    if backend not in ("haversine", "tiled"):
+        raise ValueError(f"Unknown distance backend '{backend}'.")
+    if metric in PLANAR_METRICS:
+        x, y = (np.ascontiguousarray(values) for values in prepare(metric, first, second))
+        return PlanarDistance(x, y, PLANAR_METRICS.index(metric))
+    if metric == "geo":
+        lat, lng = (np.ascontiguousarray(values) for values in prepare(metric, first, second))
+        return GeoDistance(lat, lng)
+    n = len(first)
+    condensedBytes = n * (n - 1) // 2 * 4
+    raise ValueError(f"The {metric} metric needs the dense or condensed backend, since it is not computed on the fly. "
+                     f"The condensed distances of {n} cities need {condensedBytes / 1024**2:,.0f} MB, "
+                     f"and the memory limit is {memoryLimit / 1024**2:,.0f} MB.")
+
+def distance_rows(distanceMap, start, end):
+    """
+    Copy rows start to end of any backend into a float64 array.
+    :return: An (end - start, n) float64 array.
+    """
+    if isinstance(distanceMap, np.ndarray):
+        return np.array(distanceMap[start:end], dtype=np.float64)
+    return distanceMap.rows(start, end)
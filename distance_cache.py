@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+# coding=utf-8
+
+import hashlib
+import os
+import numpy as np
+from temp_files import create_temp_file
+
+"""
+Persist dense distance matrices to disk so repeated runs on the same cities skip the build.
+Files are keyed by a hash of the parsed coordinates, the metric and the dtype, and loaded with
+np.load(mmap_mode='r') so concurrent workers share one copy through the page cache.
+"""
+
+# Bump when the way matrices are computed changes, so stale files are never loaded.
+CACHE_VERSION = 1
+
+def default_cache_dir():
+    """
+    The cache directory: $TSP_DISTANCE_CACHE if set, otherwise ~/.cache/tsp_distances.
+    """
+    return os.environ.get("TSP_DISTANCE_CACHE", os.path.join(os.path.expanduser("~"), ".cache", "tsp_distances"))
+
+def cache_key(latitudes, longitudes, metric, dtype):
+    """
+    Hash the inputs that determine a distance matrix.
+    :param latitudes: An array of latitudes in degrees.
+    :param longitudes: An array of longitudes in degrees.
+    :param metric: The name of the distance metric.
+    :param dtype: The float type of the matrix.
+    :return: A hex digest.
+    """
+    digest = hashlib.sha256()
+    digest.update(f"v{CACHE_VERSION}:{metric}:{np.dtype(dtype).str}:{len(latitudes)}:".encode())
+    digest.update(np.ascontiguousarray(latitudes, dtype=np.float64).tobytes())
+    digest.update(np.ascontiguousarray(longitudes, dtype=np.float64).tobytes())
+    return digest.hexdigest()
+
+def cache_path(cacheDir, latitudes, longitudes, metric, dtype):
+    key = cache_key(latitudes, longitudes, metric, dtype)
+    return os.path.join(cacheDir, f"{metric}_{len(latitudes)}_{np.dtype(dtype).name}_{key[:24]}.npy")
+
+def load_or_build(latitudes, longitudes, build, cacheDir, metric="haversine", dtype=np.float64):
+    """
+    Load a cached distance matrix, or build it and write it to the cache.
+    The file is written to a temporary name and renamed, so readers never see a partial matrix.
+    :param latitudes: An array of latitudes in degrees.
+    :param longitudes: An array of longitudes in degrees.
+    :param build: A function build(latitudes, longitudes, dtype) returning the matrix.
+    :param cacheDir: The cache directory. Created if missing.
+    :param metric: The name of the distance metric, part of the cache key.
+    :param dtype: The float type of the matrix.
+    :return: A read-only memory-mapped matrix.
+    """
+    path = cache_path(cacheDir, latitudes, longitudes, metric, dtype)
+    if os.path.exists(path):
+        try:
+            return np.load(path, mmap_mode='r')
+        except (ValueError, OSError):
+            pass # Unreadable file, rebuild it below
+
+    distanceMap = build(latitudes, longitudes, dtype)
+    tempPath = None
+    try:
+        os.makedirs(cacheDir, exist_ok=True)
+        fd, tempPath = create_temp_file(cacheDir, suffix=".npy.tmp")
+        with os.fdopen(fd, mode='wb') as outfile:
+            np.save(outfile, distanceMap)
+        os.replace(tempPath, path)
+    except OSError:
+        if tempPath is not None and os.path.exists(tempPath):
+            os.remove(tempPath)
+        return distanceMap # The cache is an optimization, a read-only disk must not fail the run
+    del distanceMap
+    return np.load(path, mmap_mode='r')
@@ -0,0 +1,277 @@
+#!/usr/bin/env python3
+# coding=utf-8
+
+import numpy as np
+
+"""
+A registry of distance metrics between points given as two coordinate arrays.
+Each metric prepares its coordinates once, e.g. to radians and latitude cosines, and then evaluates
+a vectorized kernel(prepared, a, b) for any broadcastable index arrays a and b: a block of matrix rows,
+or a list of candidate pairs.
+
+- haversine: great circle distance in km on a sphere of radius 6373 km. Coordinates are latitude, longitude in degrees.
+- vincenty: geodesic distance in km on the WGS-84 ellipsoid. Vincenty's iteration is accurate to a millimeter where it
+  converges. Nearly antipodal pairs, where it does not, are measured with Karney's algorithm from geographiclib instead.
+  Same coordinates.
+- equirectangular: a flat projection of the sphere, no arcsin and no per pair trig on the latitudes. Close to haversine
+  for nearby cities, and used to screen candidates for both the spherical and ellipsoidal metrics.
+- euclidean: straight line distance between x, y coordinates.
+- euc_2d, geo and att: the TSPLIB EUC_2D, GEO and ATT rounding rules, so benchmark optima match the published ones.
+
+Geographic metrics prepare (lat, lng, cosLat, ...) in radians, so their approximation takes the same prepared arrays.
+"""
+
+# approximate radius of earth in km, same as tsp.haversine
+R = 6373.0
+
+# The WGS-84 ellipsoid in meters.
+WGS84_A = 6378137.0
+WGS84_F = 1 / 298.257223563
+WGS84_B = (1 - WGS84_F) * WGS84_A
+
+# Vincenty iterations stop once the longitude on the auxiliary sphere moves less than this. Nearly antipodal
+# points may not converge, or converge past pi, and fall back to geographiclib.
+VINCENTY_TOLERANCE = 1e-12
+VINCENTY_ITERATIONS = 200
+
+# TSPLIB constants for GEO distances.
+GEO_PI = 3.141592
+GEO_RADIUS = 6378.388
+
+class DistanceMetric:
+    """
+    A named distance: prepare(first, second) turns coordinate arrays into the arrays kernel(prepared, a, b) reads.
+    """
+
+    def __init__(self, name, prepare, kernel, approximation=None):
+        """
+        :param name: The registry key.
+        :param prepare: A function prepare(first, second) of float64 coordinate arrays returning a tuple of arrays.
+        :param kernel: A function kernel(prepared, a, b) returning the distances between the points indexed by a and b.
+        :param approximation: The name of a cheaper metric that reads the same prepared arrays, for screening.
+        """
+        self.name = name
+        self.prepare = prepare
+        self.kernel = kernel
+        self.approximation = approximation
+
+METRICS = {}
+
+def register_metric(metric):
+    """
+    Add a metric to the registry, replacing any metric of the same name.
+    :return: The metric.
+    """
+    METRICS[metric.name] = metric
+    return metric
+
+def get_metric(name):
+    if name not in METRICS:
+        raise ValueError(f"Unknown distance metric '{name}', expected one of {', '.join(METRICS)}.")
+    return METRICS[name]
+
+def prepare(name, first, second):
+    """
+    Prepare coordinates for a metric.
+    :param first: Latitudes in degrees for geographic metrics, x otherwise.
+    :param second: Longitudes in degrees for geographic metrics, y otherwise.
+    """
+    return get_metric(name).prepare(np.asarray(first, dtype=np.float64), np.asarray(second, dtype=np.float64))
+
+def distance_matrix(name, first, second, dtype=np.float64, chunkSize=1024):
+    """
+    The distance between every pair of points, computed in blocks of rows so the temporaries stay small.
+    :param dtype: The float type of the matrix, np.float64 or np.float32.
+    :param chunkSize: The number of rows to compute at once.
+    :return: A contiguous (n, n) matrix with a zero diagonal.
+    """
+    metric = get_metric(name)
+    prepared = prepare(name, first, second)
+    n = len(prepared[0])
+    columns = np.arange(n)[np.newaxis, :]
+    distanceMap = np.empty((n, n), dtype=dtype)
+    for start in range(0, n, chunkSize):
+        end = min(start + chunkSize, n)
+        distanceMap[start:end] = metric.kernel(prepared, np.arange(start, end)[:, np.newaxis], columns)
+    np.fill_diagonal(distanceMap, 0.0)
+    return distanceMap
+
+def distance_between(name, firstA, secondA, firstB, secondB):
+    """
+    The distance between two points, e.g. distance_between("vincenty", latA, lngA, latB, lngB).
+    """
+    prepared = prepare(name, [firstA, firstB], [secondA, secondB])
+    return float(get_metric(name).kernel(prepared, np.array([0]), np.array([1]))[0])
+
+def screened_neighbors(name, prepared, k=10, oversample=3, chunkSize=1024):
+    """
+    The k nearest neighbors of every city, screened with the metric's approximation and confirmed with the metric.
+    Every pair is only measured with the cheap metric. The k * oversample nearest by it are measured exactly
+    and the k nearest of those kept, which matches the exact lists unless the approximation is off by more than that margin.
+    :param prepared: The metric's prepared coordinates.
+    :return: An (n, k) array where neighbors[city] lists the closest cities, nearest first.
+    """
+    metric = get_metric(name)
+    screen = get_metric(metric.approximation or name)
+    n = len(prepared[0])
+    k = max(1, min(k, n - 1))
+    candidates = min(k * oversample, n - 1)
+    columns = np.arange(n)[np.newaxis, :]
+    neighbors = np.empty((n, k), dtype=np.int64)
+    for start in range(0, n, chunkSize):
+        end = min(start + chunkSize, n)
+        cities = np.arange(start, end)[:, np.newaxis]
+        rows = np.arange(end - start)[:, np.newaxis]
+        block = screen.kernel(prepared, cities, columns)
+        block[rows[:, 0], cities[:, 0]] = np.inf # A city is not its own neighbor
+        nearest = np.argpartition(block, candidates - 1, axis=1)[:, :candidates]
+        exact = metric.kernel(prepared, cities, nearest)
+        order = np.argsort(exact, axis=1, kind="stable")[:, :k]
+        neighbors[start:end] = nearest[rows, order]
+    return neighbors
+
+def _spherical(lat, lng):
+    lat = np.deg2rad(lat)
+    return lat, np.deg2rad(lng), np.cos(lat)
+
+def haversine_kernel(prepared, a, b):
+    lat, lng, cosLat = prepared[:3]
+    d = np.sin((lat[b] - lat[a])/2)**2 + \
+        cosLat[a] * cosLat[b] * \
+        np.sin((lng[b] - lng[a])/2)**2
+    np.clip(d, 0.0, 1.0, out=d) # Guard arcsin against rounding error
+    return 2 * R * np.arcsin(np.sqrt(d))
+
+def equirectangular_kernel(prepared, a, b):
+    lat, lng, cosLat = prepared[:3]
+    # In place on one block, since this metric exists to be cheaper than haversine.
+    x = np.abs(lng[b] - lng[a])
+    np.minimum(x, 2 * np.pi - x, out=x) # The short way around
+    x *= 0.5 * (cosLat[a] + cosLat[b])
+    x *= x
+    y = lat[b] - lat[a]
+    y *= y
+    x += y
+    np.sqrt(x, out=x)
+    x *= R
+    return x
+
+def _ellipsoidal(lat, lng):
+    lat, lng, cosLat = _spherical(lat, lng)
+    reduced = np.arctan((1 - WGS84_F) * np.tan(lat))
+    return lat, lng, cosLat, np.sin(reduced), np.cos(reduced)
+
+def vincenty_kernel(prepared, a, b):
+    """
+    Vincenty's inverse formula on the WGS-84 ellipsoid. Each iteration only updates the pairs that have not converged yet.
+    Pairs that never converge, or whose longitude on the auxiliary sphere ends beyond pi, are nearly antipodal,
+    where the iteration is unreliable, so they are measured with geodesic_distances instead.
+    """
+    lat, lng, _, sinU, cosU = prepared
+    shape = np.broadcast_shapes(np.shape(a), np.shape(b))
+    sinU1, cosU1, sinU2, cosU2, L = (np.broadcast_to(x, shape).ravel()
+                                     for x in (sinU[a], cosU[a], sinU[b], cosU[b], lng[b] - lng[a]))
+    lam = L.copy()
+    sinSigma = np.empty_like(L)
+    cosSigma = np.empty_like(L)
+    sigma = np.empty_like(L)
+    cos2Alpha = np.empty_like(L)
+    cos2SigmaM = np.empty_like(L)
+    active = np.arange(len(L))
+    with np.errstate(invalid="ignore", divide="ignore"):
+        for _ in range(VINCENTY_ITERATIONS):
+            s1, c1, s2, c2 = sinU1[active], cosU1[active], sinU2[active], cosU2[active]
+            sinLam = np.sin(lam[active])
+            cosLam = np.cos(lam[active])
+            sinS = np.sqrt((c2 * sinLam)**2 + (c1 * s2 - s1 * c2 * cosLam)**2)
+            cosS = s1 * s2 + c1 * c2 * cosLam
+            sig = np.arctan2(sinS, cosS)
+            sinAlpha = np.where(sinS == 0.0, 0.0, c1 * c2 * sinLam / sinS)
+            cosA = 1.0 - sinAlpha**2
+            # Both points on the equator: cos2Alpha is 0 and the term vanishes
+            cosM = np.where(cosA == 0.0, 0.0, cosS - 2.0 * s1 * s2 / cosA)
+            C = WGS84_F / 16.0 * cosA * (4.0 + WGS84_F * (4.0 - 3.0 * cosA))
+            updated = L[active] + (1.0 - C) * WGS84_F * sinAlpha * \
+                (sig + C * sinS * (cosM + C * cosS * (-1.0 + 2.0 * cosM**2)))
+            sinSigma[active], cosSigma[active], sigma[active], cos2Alpha[active], cos2SigmaM[active] = sinS, cosS, sig, cosA, cosM
+            converged = np.abs(updated - lam[active]) < VINCENTY_TOLERANCE
+            lam[active] = updated
+            active = active[~converged]
+            if len(active) == 0:
+                break
+    u2 = cos2Alpha * (WGS84_A**2 - WGS84_B**2) / WGS84_B**2
+    A = 1.0 + u2 / 16384.0 * (4096.0 + u2 * (-768.0 + u2 * (320.0 - 175.0 * u2)))
+    B = u2 / 1024.0 * (256.0 + u2 * (-128.0 + u2 * (74.0 - 47.0 * u2)))
+    deltaSigma = B * sinSigma * (cos2SigmaM + B / 4.0 * (cosSigma * (-1.0 + 2.0 * cos2SigmaM**2) -
+                                                       B / 6.0 * cos2SigmaM * (-3.0 + 4.0 * sinSigma**2) * (-3.0 + 4.0 * cos2SigmaM**2)))
+    distances = WGS84_B * A * (sigma - deltaSigma) / 1000.0
+    failed = np.union1d(active, np.flatnonzero(np.abs(lam) > np.pi))
+    if len(failed):
+        first = np.broadcast_to(a, shape).ravel()[failed]
+        second = np.broadcast_to(b, shape).ravel()[failed]
+        distances[failed] = geodesic_distances(lat[first], lng[first], lat[second], lng[second])
+    return distances.reshape(shape)
+
+def geodesic_distances(latA, lngA, latB, lngB):
+    """
+    Karney's geodesic distance in km on the WGS-84 ellipsoid, which converges for every pair of points, one pair at a time.
+    Too slow for whole matrices, so only the pairs Vincenty's iteration cannot handle come here.
+    :param latA, lngA, latB, lngB: Arrays of coordinates in radians.
+    """
+    from geographiclib.geodesic import Geodesic
+
+    geodesic = Geodesic(WGS84_A, WGS84_F)
+    return np.array([geodesic.Inverse(*np.rad2deg(pair), outmask=Geodesic.DISTANCE)["s12"] / 1000.0
+                     for pair in zip(latA, lngA, latB, lngB)], dtype=np.float64)
+
+def _planar(x, y):
+    return x, y
+
+def euclidean_kernel(prepared, a, b):
+    x, y = prepared
+    return np.hypot(x[b] - x[a], y[b] - y[a])
+
+def euc_2d_kernel(prepared, a, b):
+    return np.floor(euclidean_kernel(prepared, a, b) + 0.5)
+
+def att_kernel(prepared, a, b):
+    """
+    TSPLIB ATT pseudo-Euclidean distance: sqrt of a tenth of the squared distance, rounded up unless it is whole.
+    """
+    x, y = prepared
+    r = np.sqrt(((x[b] - x[a])**2 + (y[b] - y[a])**2) / 10.0)
+    t = np.floor(r + 0.5)
+    return np.where(t < r, t + 1.0, t)
+
+def geo_radians(values):
+    """
+    Convert TSPLIB DDD.MM coordinates (degrees and minutes) to radians.
+    """
+    degrees = np.trunc(values)
+    minutes = values - degrees
+    return GEO_PI * (degrees + 5.0 * minutes / 3.0) / 180.0
+
+def _tsplib_geographic(lat, lng):
+    return geo_radians(lat), geo_radians(lng)
+
+def geo_kernel(prepared, a, b):
+    """
+    TSPLIB GEO distance: great circle distance in km on TSPLIB's idealized sphere, truncated to an integer.
+    """
+    lat, lng = prepared
+    q1 = np.cos(lng[a] - lng[b])
+    q2 = np.cos(lat[a] - lat[b])
+    q3 = np.cos(lat[a] + lat[b])
+    arc = np.arccos(np.clip(0.5 * ((1.0 + q1) * q2 - (1.0 - q1) * q3), -1.0, 1.0))
+    return np.trunc(GEO_RADIUS * arc + 1.0)
+
+register_metric(DistanceMetric("haversine", _spherical, haversine_kernel, approximation="equirectangular"))
+register_metric(DistanceMetric("vincenty", _ellipsoidal, vincenty_kernel, approximation="equirectangular"))
+register_metric(DistanceMetric("equirectangular", _spherical, equirectangular_kernel))
+register_metric(DistanceMetric("euclidean", _planar, euclidean_kernel))
+register_metric(DistanceMetric("euc_2d", _planar, euc_2d_kernel, approximation="euclidean"))
+register_metric(DistanceMetric("att", _planar, att_kernel, approximation="euclidean"))
+register_metric(DistanceMetric("geo", _tsplib_geographic, geo_kernel))
+
+# Metrics for city files of longitude and latitude in degrees.
+GEOGRAPHIC_METRICS = ("haversine", "vincenty", "equirectangular")
@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+# coding=utf-8
+
+from time import time
+import numpy as np
+from numba import njit, prange
+from distance_backends import TiledDistance
+from tsp import seed_random, total_distance, EVALUATIONS, ACCEPTED, NUM_COUNTERS
+
+"""
+A genetic algorithm for the traveling salesman problem that works on a whole population at once.
+The population is one 2-D int32 array with a tour per row. Every generation the random draws are
+made in one serial pass, so a seeded run is reproducible, and then fitness, crossover and mutation
+run over all rows in parallel compiled loops.
+
+Children come from two tournament-selected parents by order crossover (OX) or edge recombination (ERX),
+then a random 2-opt segment reversal mutates some of them. The best tours survive unchanged (elitism).
+"""
+
+CROSSOVERS = ("order", "edge")
+
+# Codes for the crossover names inside the compiled kernels.
+ORDER_CROSSOVER = 0
+EDGE_CROSSOVER = 1
+
+@njit(cache=True, parallel=True)
+def population_distances(population, distanceMap, fitness):
+    """
+    Evaluate the total distance of every tour of the population into fitness, rows in parallel.
+    """
+    popSize, n = population.shape
+    for p in prange(popSize):
+        tour = population[p]
+        total = distanceMap[tour[n - 1], tour[0]]
+        for k in range(n - 1):
+            total += distanceMap[tour[k], tour[k + 1]]
+        fitness[p] = total
+
+@njit(cache=True)
+def random_population(population, first):
+    """
+    Fill the population with first and random shuffles of it.
+    """
+    population[0] = first
+    for p in range(1, population.shape[0]):
+        population[p] = first
+        np.random.shuffle(population[p])
+
+@njit(cache=True)
+def plan_generation(fitness, n, tournamentSize, mutationRate, parents, cuts, mutations):
+    """
+    Make every random draw of a generation: tournament-selected parents, crossover cut points
+    and mutation segments (-1 for children that are not mutated).
+    :param n: The number of cities.
+    :param parents: A (children, 2) output array of population rows.
+    :param cuts: A (children, 2) output array of sorted positions.
+    :param mutations: A (children, 2) output array of sorted positions.
+    """
+    popSize = len(fitness)
+    for c in range(parents.shape[0]):
+        for side in range(2):
+            best = np.random.randint(popSize)
+            for _ in range(tournamentSize - 1):
+                other = np.random.randint(popSize)
+                if fitness[other] < fitness[best]:
+                    best = other
+            parents[c, side] = best
+    for c in range(cuts.shape[0]):
+        i = np.random.randint(n)
+        j = np.random.randint(n)
+        cuts[c, 0] = min(i, j)
+        cuts[c, 1] = max(i, j) + 1
+        if np.random.random() < mutationRate:
+            i = np.random.randint(n)
+            j = np.random.randint(n)
+            mutations[c, 0] = min(i, j)
+            mutations[c, 1] = max(i, j)
+        else:
+            mutations[c, 0] = -1
+            mutations[c, 1] = -1
+
+@njit(cache=True)
+def order_crossover(parentA, parentB, lo, hi, child, used):
+    """
+    Copy parentA[lo:hi] into the child, then fill the other positions with the remaining cities in parentB's order,
+    starting after hi.
+    :param used: A scratch bool array with a slot per city.
+    """
+    n = len(parentA)
+    used[:] = False
+    for k in range(lo, hi):
+        child[k] = parentA[k]
+        used[parentA[k]] = True
+    position = hi % n
+    for k in range(n):
+        city = parentB[(hi + k) % n]
+        if not used[city]:
+            child[position] = city
+            position = position + 1 if position < n - 1 else 0
+
+@njit(cache=True)
+def edge_recombination(parentA, parentB, start, child, used, adjacency, counts):
+    """
+    Build a child from the union of both parents' edges, always moving to the unvisited neighbor
+    with the fewest unvisited neighbors of its own. Dead ends continue at the next unvisited city in parentA.
+    :param start: The first city of the child.
+    :param used: A scratch bool array with a slot per city.
+    :param adjacency: A scratch (n, 4) array for the edge lists.
+    :param counts: A scratch array with a slot per city.
+    """
+    n = len(parentA)
+    used[:] = False
+    counts[:] = 0
+    for parent in (parentA, parentB):
+        for k in range(n):
+            city = parent[k]
+            for other in (parent[k - 1], parent[(k + 1) % n]):
+                known = False
+                for e in range(counts[city]):
+                    if adjacency[city, e] == other:
+                        known = True
+                if not known:
+                    adjacency[city, counts[city]] = other
+                    counts[city] += 1
+    cursor = 0
+    city = start
+    for position in range(n):
+        child[position] = city
+        used[city] = True
+        following = -1
+        fewest = 5
+        for e in range(counts[city]):
+            other = adjacency[city, e]
+            if used[other]:
+                continue
+            remaining = 0
+            for f in range(counts[other]):
+                if not used[adjacency[other, f]]:
+                    remaining += 1
+            if remaining < fewest:
+                fewest = remaining
+                following = other
+        if following < 0 and position < n - 1:
+            while used[parentA[cursor]]:
+                cursor += 1
+            following = parentA[cursor]
+        city = following
+
+@njit(cache=True, parallel=True)
+def breed(population, parents, cuts, mutations, crossover, children, used, adjacency, counts):
+    """
+    Fill every row of children by crossover of its two parents, then apply its mutation, rows in parallel.
+    :param used, adjacency, counts: Scratch arrays with a row per child.
+    """
+    for c in prange(children.shape[0]):
+        parentA = population[parents[c, 0]]
+        parentB = population[parents[c, 1]]
+        child = children[c]
+        if crossover == ORDER_CROSSOVER:
+            order_crossover(parentA, parentB, cuts[c, 0], cuts[c, 1], child, used[c])
+        else:
+            edge_recombination(parentA, parentB, parentA[cuts[c, 0]], child, used[c], adjacency[c], counts[c])
+        i = mutations[c, 0]
+        j = mutations[c, 1]
+        while 0 <= i < j: # 2-opt mutation: reverse child[i..j]
+            child[i], child[j] = child[j], child[i]
+            i += 1
+            j -= 1
+
+def genetic(solution, distanceMap, timeLimit=None, maxGenerations=None, populationSize=100, crossover="order",
+            mutationRate=0.3, tournamentSize=3, elite=2, seed=None, policy=None):
+    """
+    Evolve a population seeded with one tour until the time or generation budget runs out.
+    :param solution: A list of cities in some order, the first member of the population. Modified in place.
+    :param distanceMap: The distance matrix or backend. The tiled backend is not thread safe and is refused.
+    :param timeLimit: The wall-clock budget in seconds.
+    :param maxGenerations: The generation budget. Defaults to 1000 when there is no time limit.
+    :param populationSize: The number of tours in the population.
+    :param crossover: One of CROSSOVERS.
+    :param mutationRate: The chance that a child gets a random 2-opt segment reversal.
+    :param tournamentSize: The number of random tours each parent is the best of.
+    :param elite: The number of best tours copied unchanged into the next generation.
+    :param seed: Seed the compiled random generator first.
+    :param policy: A stopping.StoppingPolicy checked after every generation, counting each evaluated tour as one restart.
+    :return: The best tour found, its distance, the tsp.EVALUATIONS / ACCEPTED counters (tours evaluated
+             and children that joined the population), and the policy's stop reason (None without a policy
+             or if the budget ran out first).
+    """
+    if crossover not in CROSSOVERS:
+        raise ValueError(f"Unknown crossover '{crossover}', expected one of {', '.join(CROSSOVERS)}.")
+    if isinstance(distanceMap, TiledDistance):
+        raise ValueError("The genetic algorithm evaluates tours in parallel and cannot share the tiled backend's row cache.")
+    if not 0 <= elite < populationSize:
+        raise ValueError("elite must be at least 0 and less than populationSize.")
+    startTime = time()
+    if seed is not None:
+        seed_random(seed)
+    if timeLimit is None and maxGenerations is None:
+        maxGenerations = 1000
+    n = len(solution)
+    childCount = populationSize - elite
+    population = np.empty((populationSize, n), dtype=np.int32)
+    children = np.empty((populationSize, n), dtype=np.int32)
+    random_population(population, solution.astype(np.int32))
+    fitness = np.empty(populationSize, dtype=np.float64)
+    population_distances(population, distanceMap, fitness)
+    counters = np.zeros(NUM_COUNTERS, dtype=np.int64)
+    counters[EVALUATIONS] = populationSize
+    running = None if policy is None else policy.start(startTime, best=fitness.min())
+
+    parents = np.empty((childCount, 2), dtype=np.int64)
+    cuts = np.empty((childCount, 2), dtype=np.int64)
+    mutations = np.empty((childCount, 2), dtype=np.int64)
+    used = np.empty((childCount, n), dtype=np.bool_)
+    adjacency = np.empty((childCount, n, 4) if crossover == "edge" else (childCount, 0, 4), dtype=np.int32)
+    counts = np.empty((childCount, n) if crossover == "edge" else (childCount, 0), dtype=np.int64)
+    crossoverCode = ORDER_CROSSOVER if crossover == "order" else EDGE_CROSSOVER
+    generation = 0
+    while (maxGenerations is None or generation < maxGenerations) and (timeLimit is None or time() - startTime < timeLimit):
+        plan_generation(fitness, n, tournamentSize, mutationRate, parents, cuts, mutations)
+        ranked = np.argsort(fitness, kind="stable")
+        children[childCount:] = population[ranked[:elite]]
+        breed(population, parents, cuts, mutations, crossoverCode, children[:childCount], used, adjacency, counts)
+        population, children = children, population
+        population_distances(population, distanceMap, fitness)
+        counters[EVALUATIONS] += populationSize
+        counters[ACCEPTED] += childCount
+        generation += 1
+        if running is not None and running.update(fitness.min(), populationSize):
+            break
+
+    solution[:] = population[np.argmin(fitness)]
+    return solution, total_distance(solution, distanceMap), counters, None if running is None else running.reason
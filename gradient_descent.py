@@ -5,55 +5,98 @@ import sys
 from time import time
 import numpy as np
 from numba import njit
-from matplotlib import pyplot as plt
 from io_manager import IOManager
-from tsp import build_cities_index, build_distance_map, random_solution, total_distance
+from distance_cache import default_cache_dir
+from restarts import RestartExecutor
+from convergence import ConvergenceRecorder, plot_convergence, render
+from tsp import build_cities_index, build_distance_map, total_distance, swap_delta, EVALUATIONS, ACCEPTED, NUM_COUNTERS
 
-@njit
+# The number of sampled swaps per step by default.
+DEFAULT_LIMIT = 500
+
+def sample_limit(n, fraction=None):
+    """
+    Turn a sample size given as a fraction of the city count into a limit for find_best_neighbor.
+    :param n: The number of cities.
+    :param fraction: The share of n to sample, e.g. 0.5. None gives DEFAULT_LIMIT.
+    :return: The number of swaps to sample, at least 1.
+    """
+    if fraction is None:
+        return DEFAULT_LIMIT
+    if fraction <= 0:
+        raise ValueError("The sample fraction must be positive.")
+    return max(1, int(round(fraction * n)))
+
+@njit(cache=True)
+def sample_best_swap(solution, distanceMap, limit):
+    """
+    Score a batch of random swaps and find the best one.
+    All pairs are drawn up front in one batch. The second position is a random nonzero offset from the first,
+    so every pair of distinct positions, including the last, is equally likely.
+    :return: The best change in distance and the two positions of that swap.
+    """
+    n = len(solution)
+    first = np.random.randint(0, n, limit)
+    offsets = np.random.randint(1, n, limit)
+    bestDelta = np.inf
+    bestI = 0
+    bestJ = 0
+    for k in range(limit):
+        i = first[k]
+        j = i + offsets[k]
+        if j >= n:
+            j -= n
+        delta = swap_delta(solution, distanceMap, i, j)
+        if delta < bestDelta:
+            bestDelta = delta
+            bestI = i
+            bestJ = j
+    return bestDelta, bestI, bestJ
+
+@njit(cache=True)
 def find_best_neighbor(solution, distanceMap, limit=None):
     """
-    Create all possible neighbors by switching 1 pair of cities.
-    Also checks to see if this new distance is better than the current distance.
-    :param solution: A list of cities in random order.
-    :param distanceMap: The dictionary lookup tool required to pass into total_distance function.
-    :param limit: The number of times to swap cities.
-    :return: The best neighbor and best distance out of all possible neighbors.
+    Try all possible neighbors by switching 1 pair of cities.
+    Each swap is scored by its change in distance, then the best swap is applied in place.
+    :param solution: A list of cities in random order. Modified in place.
+    :param distanceMap: The distance matrix required to evaluate each swap.
+    :param limit: The number of random swaps to sample instead of trying them all, see sample_limit.
+    :return: The best neighbor and best distance out of all possible neighbors, and the tsp.EVALUATIONS / ACCEPTED counters.
     """
-    bestDist = sys.maxsize
-    bestNeighbor = None
+    counters = np.zeros(NUM_COUNTERS, dtype=np.int64)
+    currentDistance = total_distance(solution, distanceMap)
+    bestDelta = np.inf
+    bestI = 0
+    bestJ = 0
 
-    # No limit, find every neighbor by swapping two cities.
+    # No limit, score every neighbor by swapping two cities.
     if limit is None:
+        counters[EVALUATIONS] = len(solution) * (len(solution) - 1) // 2
         for i in range(len(solution)):
             for j in range(i + 1, len(solution)):
-                neighbor = solution.copy()
-                neighbor[i], neighbor[j] = solution[j], solution[i]
-                dist = total_distance(neighbor, distanceMap)
-                if dist < bestDist:
-                    bestDist = dist
-                    bestNeighbor = neighbor
-        return bestNeighbor, bestDist
+                delta = swap_delta(solution, distanceMap, i, j)
+                if delta < bestDelta:
+                    bestDelta = delta
+                    bestI = i
+                    bestJ = j
 
     # Set a limit of swaps.
-    else:
-        for _ in range(limit):
-            # Make a pair of unique, random numbers
-            pickTwo = np.random.choice((len(solution)-1), 2, replace=False)
-            j = pickTwo[0]
-            k = pickTwo[1]
-            neighbor = solution.copy()
-            neighbor[j], neighbor[k] = solution[k], solution[j]
-            dist = total_distance(neighbor, distanceMap)
-            if dist < bestDist:
-                bestDist = dist
-                bestNeighbor = neighbor
-        return bestNeighbor, bestDist
+    elif len(solution) > 1:
+        counters[EVALUATIONS] = limit
+        bestDelta, bestI, bestJ = sample_best_swap(solution, distanceMap, limit)
+
+    if bestDelta == np.inf:
+        return solution, currentDistance, counters
+    solution[bestI], solution[bestJ] = solution[bestJ], solution[bestI]
+    counters[ACCEPTED] = 1
+    return solution, currentDistance + bestDelta, counters
 
 def main():
     """
     Initialize user prompt, parse the input file, and run the search algorithm.
     Plot the results.
     """
+    from matplotlib import pyplot as plt # Only the interactive drivers need matplotlib
     ioManager = IOManager()
     filename, iterations, rounds = ioManager.prompt_input()
     cities = ioManager.read_file(filename)
@@ -62,47 +105,48 @@ def main():
     startTime = time()
     citiesIdx = build_cities_index(cities)
 
-    distanceMap, citiesMap = build_distance_map(cities, citiesIdx)
+    distanceMap, citiesMap = build_distance_map(cities, citiesIdx, cacheDir=default_cache_dir())
 
     plt.style.use("ggplot")
     fig, ax = plt.subplots(figsize=(8,6))
 
+    # Restarts are independent, so spread each round over every core.
+    executor = RestartExecutor(find_best_neighbor, citiesIdx, distanceMap, limit=DEFAULT_LIMIT)
+
     absBestDistance = sys.maxsize
     absBestSolution = None
+    recorder = ConvergenceRecorder()
+    evaluations = 0
     for r in range(rounds):
         t1 = time()
-        distList = []
-        iterList = []
-        bestDist = sys.maxsize
-        bestSolution = None
-        for i in range(iterations):
-            solution = random_solution(citiesIdx)
-            bestNeighbor, shortestDist = find_best_neighbor(solution, distanceMap, limit=500)
-            if shortestDist < bestDist:
-                bestDist = int(shortestDist)
-                bestSolution = bestNeighbor
-            distList.append(bestDist)
-            iterList.append(i + (r * iterations))
+        bestSolution, bestDist, trace = executor.run(iterations)
+        bestDist = int(bestDist)
+        recorder.record_trace(trace, r * iterations)
 
         # Track the absolute best solution and distance
         if bestDist < absBestDistance:
             absBestDistance = bestDist
             absBestSolution = bestSolution
 
-        ax.plot(iterList, distList)
         t2 = time()
         duration = round(t2-t1, 3)
         print(f"Best distance in round {r}: {bestDist} km\t Time taken: {duration} sec")
+        print(f"Evaluations/sec: {int((executor.counters[EVALUATIONS] - evaluations) / max(t2 - t1, 1e-9))}")
+        evaluations = executor.counters[EVALUATIONS]
+    executor.close()
     print(f"Total run time: {round(time() - startTime, 3)} sec")
 
     ioManager.write_file("gradient_descent", filename, absBestDistance, absBestSolution, citiesMap)
     
+    # Save the plot in the background while the window is open.
+    render(recorder, ioManager.output_path("gradient_descent", filename, "convergence.png"), "Gradient Descent Search Algorithm",
+           f"Rounds: {rounds}     Iterations: {iterations}")
+    plot_convergence(ax, recorder)
     plt.suptitle("Gradient Descent Search Algorithm", fontsize=24)
     ax.set_title(f"Rounds: {rounds}     Iterations: {iterations}", fontsize=12)
     plt.xlabel("Iterations", fontsize=16)
     plt.ylabel("Shortest Distance (km)", fontsize=16)
     plt.tick_params(axis="both", which="major", labelsize=12)
-    plt.xticks(np.arange(0, (rounds*iterations), 1000), rotation=40)
 
     plt.autoscale()
     plt.tight_layout()
@@ -5,86 +5,139 @@ import sys
 from time import time
 import numpy as np
 from numba import njit
-from matplotlib import pyplot as plt
 from io_manager import IOManager
-from tsp import build_cities_index, build_distance_map, random_solution, total_distance
+from distance_cache import default_cache_dir
+from restarts import RestartExecutor
+from convergence import ConvergenceRecorder, plot_convergence, render
+from tsp import build_cities_index, build_distance_map, total_distance, swap_delta, IMPROVEMENT_EPSILON, \
+    EVALUATIONS, ACCEPTED, NUM_COUNTERS
 
-@njit
+@njit(cache=True)
 def find_best_neighbor(solution, distanceMap):
     """
-    Create all possible neighbors by switching 1 pair of cities.
-    Returns a better neighbor as soon as one is found.
-    :param solution: A list of cities in random order.
-    :param distanceMap: The dictionary lookup tool required to pass into total_distance function.
-    :return: The a better neighbor as soon as one is found.
+    Try all possible neighbors by switching 1 pair of cities.
+    Applies the first better swap in place as soon as one is found.
+    :param solution: A list of cities in random order. Modified in place.
+    :param distanceMap: The distance matrix required to evaluate each swap.
+    :return: The a better neighbor as soon as one is found, its distance, and the tsp.EVALUATIONS / ACCEPTED counters.
     """
+    counters = np.zeros(NUM_COUNTERS, dtype=np.int64)
     currentDistance = total_distance(solution, distanceMap)
+    evaluations = 0
     for i in range(len(solution)):
         for j in range(i + 1, len(solution)):
-            neighbor = solution.copy()
-            neighbor[i], neighbor[j] = solution[j], solution[i]
-            dist = total_distance(neighbor, distanceMap)
-            if dist < currentDistance:
-                return neighbor, dist # Better solution is automatically selected
-    return solution, currentDistance
+            evaluations += 1
+            delta = swap_delta(solution, distanceMap, i, j)
+            if delta < -IMPROVEMENT_EPSILON:
+                solution[i], solution[j] = solution[j], solution[i]
+                counters[EVALUATIONS] = evaluations
+                counters[ACCEPTED] = 1
+                return solution, currentDistance + delta, counters # Better solution is automatically selected
+    counters[EVALUATIONS] = evaluations
+    return solution, currentDistance, counters
 
-def main():
+# Default cap on the improving swaps applied by one climb_to_local_optimum call.
+MAX_CLIMB_STEPS = 100000
+
+@njit(cache=True)
+def climb_to_local_optimum(solution, distanceMap, maxSteps=MAX_CLIMB_STEPS):
+    """
+    Keep applying improving swaps in place until no swap improves the tour, or maxSteps swaps were made.
+    The scan resumes where the last swap was found instead of starting over from the first city,
+    and stops once every position has been checked without an improvement.
+    :param solution: A list of cities in random order. Modified in place.
+    :param distanceMap: The distance matrix required to evaluate each swap.
+    :param maxSteps: The most swaps to apply.
+    :return: The improved solution, its distance, and the tsp.EVALUATIONS / ACCEPTED counters.
+             ACCEPTED is the number of swaps applied, the steps to convergence.
+    """
+    n = len(solution)
+    evaluations = 0
+    steps = 0
+    unchanged = 0 # Positions scanned in a row without an improvement
+    i = 0
+    while unchanged < n and steps < maxSteps:
+        improved = False
+        for j in range(n):
+            evaluations += 1
+            delta = swap_delta(solution, distanceMap, i, j)
+            if delta < -IMPROVEMENT_EPSILON:
+                solution[i], solution[j] = solution[j], solution[i]
+                improved = True
+                steps += 1
+                if steps >= maxSteps:
+                    break
+        unchanged = 0 if improved else unchanged + 1
+        i = (i + 1) % n
+    counters = np.zeros(NUM_COUNTERS, dtype=np.int64)
+    counters[EVALUATIONS] = evaluations
+    counters[ACCEPTED] = steps
+    return solution, total_distance(solution, distanceMap), counters
+
+def main(toOptimum=False):
     """
     Initialize user prompt, parse the input file, and run the search algorithm.
     Plot the results.
+    :param toOptimum: Climb every restart to a local optimum instead of stopping after the first improving swap.
     """
+    from matplotlib import pyplot as plt # Only the interactive drivers need matplotlib
     ioManager = IOManager()
     filename, iterations, rounds = ioManager.prompt_input()
     cities = ioManager.read_file(filename)
     
-    print("\nStarting simple hill climbing search")
+    print(f"\nStarting simple hill climbing search{' to local optima' if toOptimum else ''}")
     startTime = time()
     citiesIdx = build_cities_index(cities)
-    distanceMap, citiesMap = build_distance_map(cities, citiesIdx)
+    distanceMap, citiesMap = build_distance_map(cities, citiesIdx, cacheDir=default_cache_dir())
 
     plt.style.use("ggplot")
     fig, ax = plt.subplots(figsize=(8,6))
 
+    # Restarts are independent, so spread each round over every core.
+    climb = climb_to_local_optimum if toOptimum else find_best_neighbor
+    executor = RestartExecutor(climb, citiesIdx, distanceMap, recordSteps=toOptimum)
+
     absBestDistance = sys.maxsize
     absBestSolution = None
+    recorder = ConvergenceRecorder()
+    evaluations = 0
     for r in range(rounds):
         t1 = time()
-        distList = []
-        iterList = []
-        bestDist = sys.maxsize
-        bestSolution = None
-        for i in range(iterations):
-            solution = random_solution(citiesIdx)
-            bestNeighbor, shortestDist = find_best_neighbor(solution, distanceMap)
-            if shortestDist < bestDist:
-                bestDist = int(shortestDist)
-                bestSolution = bestNeighbor
-            distList.append(bestDist)
-            iterList.append(i + (r * iterations))
+        bestSolution, bestDist, trace = executor.run(iterations)
+        bestDist = int(bestDist)
+        recorder.record_trace(trace, r * iterations)
 
         # Track the absolute best solution and distance
         if bestDist < absBestDistance:
             absBestDistance = bestDist
             absBestSolution = bestSolution
         
-        ax.plot(iterList, distList)
         t2 = time()
         duration = round(t2-t1, 3)
         print(f"Best distance in round {r}: {bestDist} km\t Time taken: {duration} sec")
+        print(f"Evaluations/sec: {int((executor.counters[EVALUATIONS] - evaluations) / max(t2 - t1, 1e-9))}")
+        evaluations = executor.counters[EVALUATIONS]
+        if toOptimum:
+            steps = executor.steps
+            print(f"Steps to convergence: mean {round(steps.mean(), 1)}, max {steps.max()}")
+    executor.close()
     print(f"Total run time: {round(time() - startTime, 3)} sec")
 
     ioManager.write_file("hill_climbing", filename, absBestDistance, absBestSolution, citiesMap)
     
+    # Save the plot in the background while the window is open.
+    render(recorder, ioManager.output_path("hill_climbing", filename, "convergence.png"), "Simple Hill Climbing Search Algorithm",
+           f"Rounds: {rounds}     Iterations: {iterations}")
+    plot_convergence(ax, recorder)
     plt.suptitle("Simple Hill Climbing Search Algorithm", fontsize=24)
     ax.set_title(f"Rounds: {rounds}     Iterations: {iterations}", fontsize=12)
     plt.xlabel("Iterations", fontsize=16)
     plt.ylabel("Shortest Distance (km)", fontsize=16)
     plt.tick_params(axis="both", which="major", labelsize=12)
-    plt.xticks(np.arange(0, (rounds*iterations), 1000), rotation=40)
 
     plt.autoscale()
     plt.tight_layout()
     plt.show()
 
 if __name__ == "__main__":
-    main()
+    main(toOptimum="--to-optimum" in sys.argv[1:])
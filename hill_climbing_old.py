@@ -1,6 +1,6 @@
 import os
 from random import choice
-from geopy.distance import distance
+from distance_metrics import distance_between
 import itertools
 import sys
 from time import time
@@ -117,7 +117,7 @@ class HillClimbing:
             coordA = (cityA[2], cityA[1])
             coordB = (cityB[2], cityB[1])
 
-            dist = distance(coordA, coordB).km
+            dist = distance_between("vincenty", float(coordA[0]), float(coordA[1]), float(coordB[0]), float(coordB[1]))
             distanceMap[each] = int(dist) # Remember to use this tuple (cityA, cityB) when doing lookup.
         self.distanceMap = distanceMap
 
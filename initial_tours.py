@@ -0,0 +1,256 @@
+#!/usr/bin/env python3
+# coding=utf-8
+
+import numpy as np
+from numba import njit
+from spatial_index import KDTree, remove_city, query_nearest
+from tsp import shuffle_into
+
+"""
+Constructive starting tours, so restarts begin near a good tour instead of a random shuffle.
+All three are O(n log n) through spatial_index.KDTree and need city positions, not the distance matrix:
+
+- nearest_neighbor: from a start city, always go to the nearest unvisited city.
+- greedy: add the shortest candidate edges that keep every city at degree two without closing a cycle.
+- space_filling_curve: visit cities in the order of their 3-D Hilbert curve index.
+
+The randomized variants draw from the compiled random generator, so every restart of a seeded
+run gets a different, reproducible tour.
+"""
+
+START_TOURS = ("random", "nearest_neighbor", "greedy", "space_filling_curve")
+
+# Bits per axis of the Hilbert curve grid. 3 * 20 bits fit in an int64.
+HILBERT_BITS = 20
+
+@njit(cache=True)
+def nearest_neighbor_tour(points, order, dims, remaining, positionOf, start, noise, tour):
+    """
+    Build a nearest neighbor tour into tour.
+    :param start: The first city, or -1 for a random one.
+    :param noise: The chance of going to the second nearest unvisited city instead of the nearest.
+    """
+    n = len(points)
+    if start < 0:
+        start = np.random.randint(n)
+    remaining = remaining.copy()
+    alive = np.ones(n, dtype=np.bool_)
+    nearest = np.empty(2, dtype=np.int64)
+    distances = np.empty(2, dtype=np.float64)
+    city = start
+    for position in range(n):
+        tour[position] = city
+        remove_city(city, positionOf, remaining, alive)
+        if position == n - 1:
+            break
+        found = query_nearest(points, order, dims, remaining, alive, points[city], -1, nearest, distances)
+        city = nearest[1] if found > 1 and noise > 0.0 and np.random.random() < noise else nearest[0]
+    return tour
+
+@njit(cache=True)
+def _find(parent, city):
+    while parent[city] != city:
+        parent[city] = parent[parent[city]] # Path halving
+        city = parent[city]
+    return city
+
+@njit(cache=True)
+def _contains(values, value):
+    for v in values:
+        if v == value:
+            return True
+    return False
+
+@njit(cache=True)
+def greedy_tour(points, order, dims, remaining, positionOf, candidates, noise, tour):
+    """
+    Build a greedy edge tour into tour.
+    Only edges to each city's candidate neighbors are considered. The fragments left over are chained
+    from the end of one to the nearest end of another.
+    :param candidates: The (n, k) nearest neighbor lists from KDTree.neighbor_lists.
+    :param noise: Scale each edge length by a random factor in [1, 1 + noise) before sorting.
+    """
+    n = len(points)
+    k = candidates.shape[1]
+    edgeA = np.empty(n * k, dtype=np.int64)
+    edgeB = np.empty(n * k, dtype=np.int64)
+    lengths = np.empty(n * k, dtype=np.float64)
+    count = 0
+    for a in range(n):
+        for b in candidates[a]:
+            if a < b or not _contains(candidates[b], a): # Each edge once
+                length = 0.0
+                for dim in range(3):
+                    diff = points[a, dim] - points[b, dim]
+                    length += diff * diff
+                edgeA[count] = a
+                edgeB[count] = b
+                lengths[count] = np.sqrt(length)
+                if noise > 0.0:
+                    lengths[count] *= 1.0 + noise * np.random.random()
+                count += 1
+
+    degree = np.zeros(n, dtype=np.int64)
+    links = np.full((n, 2), -1, dtype=np.int64)
+    parent = np.arange(n)
+    for e in np.argsort(lengths[:count]):
+        a = edgeA[e]
+        b = edgeB[e]
+        if degree[a] == 2 or degree[b] == 2:
+            continue
+        rootA = _find(parent, a)
+        rootB = _find(parent, b)
+        if rootA == rootB:
+            continue # Would close a cycle
+        parent[rootA] = rootB
+        links[a, degree[a]] = b
+        links[b, degree[b]] = a
+        degree[a] += 1
+        degree[b] += 1
+
+    # Walk the fragments, jumping from the end of each to the nearest end of an unvisited fragment.
+    remaining = remaining.copy()
+    alive = np.ones(n, dtype=np.bool_)
+    for city in range(n):
+        if degree[city] == 2:
+            remove_city(city, positionOf, remaining, alive)
+    nearest = np.empty(1, dtype=np.int64)
+    distances = np.empty(1, dtype=np.float64)
+    city = np.argmin(degree) # The fragments are paths, so some city is an end
+    position = 0
+    while True:
+        # city is an end of an unvisited fragment. Walk to its other end.
+        previous = -1
+        while True:
+            tour[position] = city
+            position += 1
+            if alive[city]:
+                remove_city(city, positionOf, remaining, alive)
+            following = links[city, 0] if links[city, 0] != previous else links[city, 1]
+            if following < 0:
+                break
+            previous = city
+            city = following
+        if position == n:
+            break
+        query_nearest(points, order, dims, remaining, alive, points[city], -1, nearest, distances)
+        city = nearest[0]
+    return tour
+
+@njit(cache=True)
+def hilbert_index(x, y, z, bits):
+    """
+    The position of a grid cell along the 3-D Hilbert curve, by Skilling's transpose algorithm.
+    :param x, y, z: Integer cell coordinates in [0, 2**bits).
+    """
+    axes = np.array((x, y, z), dtype=np.int64)
+    q = np.int64(1) << (bits - 1)
+    while q > 1:
+        p = q - 1
+        for i in range(3):
+            if axes[i] & q:
+                axes[0] ^= p
+            else:
+                t = (axes[0] ^ axes[i]) & p
+                axes[0] ^= t
+                axes[i] ^= t
+        q >>= 1
+    for i in range(1, 3):
+        axes[i] ^= axes[i - 1]
+    t = np.int64(0)
+    q = np.int64(1) << (bits - 1)
+    while q > 1:
+        if axes[2] & q:
+            t ^= q - 1
+        q >>= 1
+    for i in range(3):
+        axes[i] ^= t
+    index = np.int64(0)
+    for b in range(bits - 1, -1, -1):
+        for i in range(3):
+            index = (index << 1) | ((axes[i] >> b) & 1)
+    return index
+
+@njit(cache=True)
+def random_rotation():
+    """
+    A uniformly random 3-D rotation matrix, from a random unit quaternion.
+    """
+    u1 = np.random.random()
+    u2 = 2.0 * np.pi * np.random.random()
+    u3 = 2.0 * np.pi * np.random.random()
+    a = np.sqrt(1.0 - u1) * np.sin(u2)
+    b = np.sqrt(1.0 - u1) * np.cos(u2)
+    c = np.sqrt(u1) * np.sin(u3)
+    d = np.sqrt(u1) * np.cos(u3)
+    return np.array(((1 - 2 * (c * c + d * d), 2 * (b * c - a * d), 2 * (b * d + a * c)),
+                     (2 * (b * c + a * d), 1 - 2 * (b * b + d * d), 2 * (c * d - a * b)),
+                     (2 * (b * d - a * c), 2 * (c * d + a * b), 1 - 2 * (b * b + c * c))))
+
+@njit(cache=True)
+def space_filling_curve_tour(points, rotate, tour):
+    """
+    Build a tour in Hilbert curve order into tour.
+    :param rotate: Randomly rotate the points first, which gives a different curve through the same cities.
+    """
+    n = len(points)
+    rotated = points.copy()
+    if rotate:
+        rotation = random_rotation()
+        for city in range(n):
+            for dim in range(3):
+                rotated[city, dim] = rotation[dim, 0] * points[city, 0] + rotation[dim, 1] * points[city, 1] + rotation[dim, 2] * points[city, 2]
+    lows = np.empty(3)
+    scales = np.empty(3)
+    for dim in range(3):
+        lows[dim] = rotated[:, dim].min()
+        spread = rotated[:, dim].max() - lows[dim]
+        scales[dim] = ((1 << HILBERT_BITS) - 1) / spread if spread > 0.0 else 0.0
+    keys = np.empty(n, dtype=np.int64)
+    for city in range(n):
+        keys[city] = hilbert_index(np.int64((rotated[city, 0] - lows[0]) * scales[0]),
+                                   np.int64((rotated[city, 1] - lows[1]) * scales[1]),
+                                   np.int64((rotated[city, 2] - lows[2]) * scales[2]), HILBERT_BITS)
+    tour[:] = np.argsort(keys)
+    return tour
+
+class StartTour:
+    """
+    Fills restart tours with one of the START_TOURS heuristics. Pass it as RestartExecutor(start=...).
+    The KD-tree and greedy candidate edges are built once, when the object is created.
+    """
+
+    def __init__(self, kind, points, randomize=True, noise=0.1, candidates=8):
+        """
+        :param kind: One of START_TOURS.
+        :param points: The (n, 3) city positions from spatial_index.sphere_points or plane_points,
+                       indexed the same way as the distance matrix.
+        :param randomize: Use the randomized variant, so restarts differ. Otherwise every call gives the same tour.
+        :param noise: How far the randomized nearest neighbor and greedy variants stray from the plain ones.
+        :param candidates: The neighbors per city the greedy heuristic considers.
+        """
+        if kind not in START_TOURS:
+            raise ValueError(f"Unknown start tour '{kind}', expected one of {', '.join(START_TOURS)}.")
+        self.kind = kind
+        self.randomize = randomize
+        self.noise = noise if randomize else 0.0
+        self.tree = KDTree(points) if kind != "random" else None
+        self.candidates = self.tree.neighbor_lists(candidates) if kind == "greedy" else None
+
+    def __call__(self, solution, citiesIdx):
+        """
+        Overwrite solution with a new starting tour, in place.
+        :param solution: The tour buffer. Modified in place.
+        :param citiesIdx: A list of cities labeled as integers, the same length as solution.
+        :return: The solution buffer.
+        """
+        tree = self.tree
+        if self.kind == "random":
+            return shuffle_into(solution, citiesIdx)
+        if self.kind == "nearest_neighbor":
+            return nearest_neighbor_tour(tree.points, tree.order, tree.dims, tree.remaining, tree.positionOf,
+                                         -1 if self.randomize else 0, self.noise, solution)
+        if self.kind == "greedy":
+            return greedy_tour(tree.points, tree.order, tree.dims, tree.remaining, tree.positionOf,
+                               self.candidates, self.noise, solution)
+        return space_filling_curve_tour(tree.points, self.randomize, solution)
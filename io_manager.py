@@ -3,6 +3,8 @@
 
 import os
 import sys
+from itertools import islice
+import numpy as np
 
 class IOManager:
     """
@@ -98,6 +100,52 @@ class IOManager:
                 cities.append((arr[0], arr[1], arr[2]))
             return cities
     
+    def read_coordinates(self, filepath, chunkSize=65536):
+        """
+        Read the input file straight into coordinate arrays, a chunk of lines at a time.
+        Faster than read_file for large files because the coordinates are never kept as strings.
+        :param filepath: The input file to read
+        :param chunkSize: The number of lines to parse at once
+        :return: A list of city names, and contiguous float64 arrays of longitudes and latitudes
+        """
+        names = []
+        longitudeChunks = []
+        latitudeChunks = []
+        with open(filepath) as data:
+            data.readline() # Remove the first line
+            while True:
+                lines = list(islice(data, chunkSize))
+                if not lines:
+                    break
+                longitudes = []
+                latitudes = []
+                for line in lines:
+                    line = line.rstrip()
+                    if not line:
+                        continue
+                    rest, _, latitude = line.rpartition(',') # Split from the right so names may contain commas
+                    name, _, longitude = rest.rpartition(',')
+                    names.append(name)
+                    longitudes.append(longitude)
+                    latitudes.append(latitude)
+                longitudeChunks.append(np.array(longitudes, dtype=np.float64))
+                latitudeChunks.append(np.array(latitudes, dtype=np.float64))
+        if not names:
+            return names, np.empty(0), np.empty(0)
+        return names, np.concatenate(longitudeChunks), np.concatenate(latitudeChunks)
+
+    def output_path(self, algo, filename, suffix):
+        """
+        The path of an output file for a run, e.g. hill_climbing_49_cities_best_solution.txt.
+        :param algo: The type of algorithm used
+        :param filename: The chosen input file
+        :param suffix: The end of the file name, including the extension
+        """
+        pathSplit = os.path.split(filename) # split up absolute file path
+        tail = pathSplit[1] # get the tail
+        baseName = tail.split('.')[0] # split the period and get the base name
+        return f"{self.cwd}/{algo}_{baseName}_{suffix}"
+
     def write_file(self, algo, filename, absBestDistance, absBestSolution, citiesMap):
         """
         Write the absolute best solution to disk.
@@ -107,10 +155,7 @@ class IOManager:
         :param absBestSolution: The absolute best arangement of cities for the TSP
         :param citiesMap: The int --> cities dictionary required for conversion 
         """
-        pathSplit = os.path.split(filename) # split up absolute file path
-        tail = pathSplit[1] # get the tail
-        baseName = tail.split('.')[0] # split the period and get the base name
-        outfile = open(f"{self.cwd}/{algo}_{baseName}_best_solution.txt", mode='w')
+        outfile = open(self.output_path(algo, filename, "best_solution.txt"), mode='w')
         outfile.write(f"Shortest path found: {absBestDistance} km\n")
         for eachCity in absBestSolution[:-1]: # Write each line and remove parenthesis
             cityTuple = citiesMap[int(eachCity)]
@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+# coding=utf-8
+
+import os
+import multiprocessing
+import queue
+from multiprocessing import shared_memory
+from time import time
+import numpy as np
+from numba import njit
+from tsp import seed_random, shuffle_into, NUM_COUNTERS
+
+"""
+An island model: one search process per core, each improving its own best tour by iterated local search
+(a double-bridge kick followed by a climb), with the best tours migrating between islands.
+The distance matrix and the elite pool live in multiprocessing.shared_memory, so every island reads
+the same pages and nothing but small results is ever pickled. Each island loads the compiled kernels itself,
+so the parent never starts numba's threads before it forks.
+
+The elite pool holds each island's best tour. Every migrationInterval epochs an island publishes its best
+tour there and adopts the tour of the island before it in the ring if that one is shorter.
+"""
+
+# Epochs between migrations by default.
+MIGRATION_INTERVAL = 10
+
+@njit(cache=True)
+def double_bridge(tour, kicked):
+    """
+    Write the tour with a random double-bridge move applied into kicked: A B C D -> A C B D.
+    2-opt and Or-opt cannot undo it in one move, so it moves a local optimum into a new basin.
+    """
+    n = len(tour)
+    if n < 8:
+        kicked[:] = tour
+        np.random.shuffle(kicked)
+        return kicked
+    a = np.random.randint(1, n)
+    b = a
+    while b == a:
+        b = np.random.randint(1, n)
+    c = a
+    while c == a or c == b:
+        c = np.random.randint(1, n)
+    a, b, c = sorted((a, b, c))
+    kicked[:a] = tour[:a]
+    kicked[a:a + c - b] = tour[b:c]
+    kicked[a + c - b:c] = tour[a:b]
+    kicked[c:] = tour[c:]
+    return kicked
+
+def _shared_array(shape, dtype, source=None):
+    """
+    :return: A new shared memory block and an array over it, filled from source if given.
+    """
+    size = max(int(np.prod(shape)) * np.dtype(dtype).itemsize, 1)
+    block = shared_memory.SharedMemory(create=True, size=size)
+    array = np.ndarray(shape, dtype=dtype, buffer=block.buf)
+    if source is not None:
+        array[...] = source
+    return block, array
+
+def _attach(name, shape, dtype):
+    block = shared_memory.SharedMemory(name=name)
+    return block, np.ndarray(shape, dtype=dtype, buffer=block.buf)
+
+def _run_island(index, islands, specs, climb, climbArgs, start, citiesIdx, epochs, deadline, interval, seed, locks, results):
+    """
+    Run one island until its epochs or the deadline run out, then put its results on the queue.
+    :param specs: The (name, shape, dtype) of the shared distance matrix, pool tours and pool distances.
+    """
+    blocks = []
+    arrays = []
+    for name, shape, dtype in specs:
+        block, array = _attach(name, shape, dtype)
+        blocks.append(block)
+        arrays.append(array)
+    distanceMap, poolTours, poolDists = arrays
+
+    seed_random(seed)
+    counters = np.zeros(NUM_COUNTERS, dtype=np.int64)
+    best = np.empty_like(citiesIdx)
+    (start or shuffle_into)(best, citiesIdx)
+    result = climb(best, distanceMap, **climbArgs)
+    bestDist = result[1]
+    if len(result) > 2:
+        counters += result[2][:NUM_COUNTERS]
+    trace = [bestDist]
+    kicked = np.empty_like(best)
+    done = 0
+    migrations = 0
+    while done < epochs and (deadline is None or time() < deadline):
+        double_bridge(best, kicked)
+        result = climb(kicked, distanceMap, **climbArgs)
+        if len(result) > 2:
+            counters += result[2][:NUM_COUNTERS]
+        if result[1] < bestDist:
+            bestDist = result[1]
+            best[:] = result[0]
+        done += 1
+        if done % interval == 0 and islands > 1:
+            with locks[index]:
+                poolTours[index] = best
+                poolDists[index] = bestDist
+            source = (index - 1) % islands
+            with locks[source]:
+                if poolDists[source] < bestDist:
+                    bestDist = poolDists[source]
+                    best[:] = poolTours[source]
+                    migrations += 1
+        trace.append(bestDist)
+    results.put((index, best, float(bestDist), np.array(trace), counters, migrations))
+    del distanceMap, poolTours, poolDists, arrays
+    for block in blocks:
+        block.close()
+
+class IslandModel:
+    """
+    Islands of iterated local search sharing one distance matrix and an elite pool through shared memory.
+    Use as a context manager, or call close() when done, to free the shared memory.
+    """
+
+    def __init__(self, climb, citiesIdx, distanceMap, islands=None, migrationInterval=MIGRATION_INTERVAL, start=None, **climbArgs):
+        """
+        :param climb: A function climb(solution, distanceMap, **climbArgs) returning (solution, distance, ...),
+                      like the RestartExecutor climbs. Local search makes the strongest islands.
+        :param citiesIdx: A list of cities labeled as integers.
+        :param distanceMap: A dense distance matrix. It is copied into shared memory once.
+        :param islands: The number of island processes. Defaults to every core.
+        :param migrationInterval: Epochs between migrations.
+        :param start: A function start(solution, citiesIdx) for each island's first tour, like initial_tours.StartTour.
+        :param climbArgs: Extra keyword arguments passed to every climb call.
+        """
+        if not isinstance(distanceMap, np.ndarray):
+            raise ValueError("The island model shares a dense distance matrix, not a distance backend.")
+        self.climb = climb
+        self.citiesIdx = citiesIdx
+        self.islands = islands or os.cpu_count() or 1
+        self.migrationInterval = max(1, migrationInterval)
+        self.start = start
+        self.climbArgs = climbArgs
+        self.counters = np.zeros(NUM_COUNTERS, dtype=np.int64)
+        self.migrations = 0
+        self.traces = []
+        self.islandDistances = []
+        n = len(citiesIdx)
+        matrix = np.ascontiguousarray(distanceMap)
+        self.blocks = []
+        self.specs = []
+        try:
+            for shape, dtype, source in ((matrix.shape, matrix.dtype, matrix), ((self.islands, n), citiesIdx.dtype, None),
+                                         ((self.islands,), np.float64, np.inf)):
+                block, _ = _shared_array(shape, dtype, source)
+                self.blocks.append(block)
+                self.specs.append((block.name, shape, np.dtype(dtype).str))
+        except BaseException:
+            self.close() # Unlink the blocks created so far, nothing else will
+            raise
+
+    def run(self, epochs, seed=None, timeLimit=None):
+        """
+        Run every island for a number of epochs, or until the time limit.
+        :param epochs: The kicks and climbs per island.
+        :param seed: The seed for the run. None picks a fresh random seed.
+        :param timeLimit: Stop every island after this many seconds.
+        Migrations depend on how fast each island runs, so only runs of a single island repeat exactly for a seed.
+        If the run fails, every island is stopped and the shared memory freed before the error propagates.
+        :return: The best solution and its distance. Each island's best-so-far distance after every epoch
+                 is kept in self.traces, its final best in self.islandDistances, and the climb counters
+                 summed into self.counters.
+        """
+        islandSeeds = [int(s.generate_state(1)[0]) for s in np.random.SeedSequence(seed).spawn(self.islands)]
+        deadline = None if timeLimit is None else time() + timeLimit
+        methods = multiprocessing.get_all_start_methods()
+        context = multiprocessing.get_context("fork" if "fork" in methods else None)
+        locks = [context.Lock() for _ in range(self.islands)]
+        results = context.Queue()
+        processes = [context.Process(target=_run_island,
+                                     args=(index, self.islands, self.specs, self.climb, self.climbArgs, self.start, self.citiesIdx,
+                                           epochs, deadline, self.migrationInterval, islandSeeds[index], locks, results))
+                     for index in range(self.islands)]
+        try:
+            for process in processes:
+                process.start()
+            # Drain the queue before joining, so no island blocks on a full pipe.
+            finished = []
+            while len(finished) < len(processes):
+                try:
+                    finished.append(results.get(timeout=1.0))
+                except queue.Empty:
+                    if any(process.exitcode not in (None, 0) for process in processes):
+                        raise RuntimeError("An island process failed.")
+            finished.sort(key=lambda item: item[0])
+        except BaseException:
+            for process in processes:
+                if process.is_alive():
+                    process.terminate()
+            self.close()
+            raise
+        finally:
+            for process in processes:
+                if process.pid is not None:
+                    process.join()
+
+        bestDist = np.inf
+        bestSolution = None
+        self.traces = []
+        self.islandDistances = []
+        for _, solution, dist, trace, counters, migrations in finished:
+            self.traces.append(trace)
+            self.islandDistances.append(dist)
+            self.counters += counters
+            self.migrations += migrations
+            if dist < bestDist:
+                bestDist = dist
+                bestSolution = solution
+        return bestSolution, bestDist
+
+    def close(self):
+        for block in self.blocks:
+            block.close()
+            block.unlink()
+        self.blocks = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
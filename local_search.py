@@ -0,0 +1,279 @@
+#!/usr/bin/env python3
+# coding=utf-8
+
+import sys
+from time import time
+import numpy as np
+from numba import njit
+from io_manager import IOManager
+from distance_cache import default_cache_dir
+from restarts import RestartExecutor
+from convergence import ConvergenceRecorder, plot_convergence, render
+from distance_backends import distance_rows, HaversineDistance, TiledDistance, PlanarDistance, GeoDistance, PLANAR_METRICS
+from distance_metrics import screened_neighbors
+from array_tour import build_positions, reverse_segment, flip
+from tsp import build_cities_index, build_distance_map, total_distance, IMPROVEMENT_EPSILON, EVALUATIONS, ACCEPTED, NUM_COUNTERS
+
+"""
+2-opt and Or-opt local search for the traveling salesman problem.
+Moves are restricted to each city's k nearest neighbors and converged cities are
+skipped with don't-look bits, so one descent costs far fewer evaluations than a swap scan.
+The moves assume a symmetric distance matrix.
+"""
+
+def build_neighbor_lists(distanceMap, k=10, chunkSize=1024):
+    """
+    Find the k nearest neighbors of every city, sorted from nearest to farthest.
+    Rows are processed in chunks so only a slice of the matrix is copied at a time.
+    :param distanceMap: The distance matrix or backend built by tsp.build_distance_map.
+    :param k: The number of neighbors to keep per city.
+    :param chunkSize: The number of rows to process at once.
+    :return: An (n, k) array where neighbors[city] lists the closest cities.
+    """
+    if isinstance(distanceMap, (HaversineDistance, TiledDistance)):
+        # Nothing is stored to scan, so screen every pair with the cheaper equirectangular metric instead of haversine.
+        return screened_neighbors("haversine", (distanceMap.lat, distanceMap.lng, distanceMap.cosLat), k, chunkSize=chunkSize)
+    if isinstance(distanceMap, PlanarDistance):
+        return screened_neighbors(PLANAR_METRICS[distanceMap.kind], (distanceMap.x, distanceMap.y), k, chunkSize=chunkSize)
+    if isinstance(distanceMap, GeoDistance):
+        return screened_neighbors("geo", (distanceMap.lat, distanceMap.lng), k, chunkSize=chunkSize)
+    n = len(distanceMap)
+    k = max(1, min(k, n - 1))
+    neighbors = np.empty((n, k), dtype=np.int64)
+    for start in range(0, n, chunkSize):
+        end = min(start + chunkSize, n)
+        block = distance_rows(distanceMap, start, end)
+        rows = np.arange(end - start)
+        block[rows, rows + start] = np.inf # A city is not its own neighbor
+        nearest = np.argpartition(block, k - 1, axis=1)[:, :k]
+        order = np.argsort(block[rows[:, np.newaxis], nearest], axis=1)
+        neighbors[start:end] = nearest[rows[:, np.newaxis], order]
+    return neighbors
+
+@njit(cache=True)
+def move_segment(solution, positions, i, length, x, reverse):
+    """
+    Move the segment of the given length starting at position i to sit between city x and its successor.
+    Done as three reversals over whichever side of the tour is shorter.
+    :param solution: A list of cities. Modified in place.
+    :param positions: The position of every city in the solution. Kept in sync.
+    :param i: The first position of the segment.
+    :param length: The number of cities in the segment.
+    :param x: The city that the segment is inserted after. Must not be in the segment.
+    :param reverse: Insert the segment in reverse order.
+    """
+    n = len(solution)
+    e = (i + length - 1) % n
+    posX = positions[x]
+    after = (posX - e) % n # Cities between the segment end and x, inclusive of x
+    before = n - length - after # Cities between the successor of x and the segment start
+    if after <= before:
+        # p [S] q..x y  ->  p q..x [S] y
+        reverse_segment(solution, positions, i, posX)
+        reverse_segment(solution, positions, i, (i + after - 1) % n)
+        if not reverse:
+            reverse_segment(solution, positions, (i + after) % n, posX)
+    else:
+        # x y..p [S] q  ->  x [S] y..p q
+        posY = (posX + 1) % n
+        reverse_segment(solution, positions, posY, e)
+        reverse_segment(solution, positions, (posY + length) % n, e)
+        if not reverse:
+            reverse_segment(solution, positions, posY, (posY + length - 1) % n)
+
+@njit(cache=True)
+def improve_city(solution, positions, distanceMap, neighbors, a, orOpt, maxSegment, touched, counters):
+    """
+    Look for the first improving 2-opt or Or-opt move around city a and apply it.
+    :param solution: A list of cities. Modified in place.
+    :param positions: The position of every city in the solution. Kept in sync.
+    :param distanceMap: The distance matrix lookup tool.
+    :param neighbors: The candidate neighbor lists from build_neighbor_lists.
+    :param a: The city to improve around.
+    :param orOpt: Also try Or-opt segment moves.
+    :param maxSegment: The longest segment Or-opt will move.
+    :param touched: A buffer of 6 cities, filled with the cities whose edges changed (-1 if unused).
+    :param counters: The tsp.EVALUATIONS / ACCEPTED counter array. Evaluations are incremented in place.
+    :return: The change in distance, 0.0 if no improving move was found.
+    """
+    n = len(solution)
+    touched[:] = -1
+    i = positions[a]
+
+    # 2-opt: replace (a, succ a) and (c, succ c) with (a, c) and (succ a, succ c),
+    # then the same with predecessors.
+    for direction in (1, -1):
+        b = solution[(i + direction) % n]
+        dAB = distanceMap[a, b]
+        for c in neighbors[a]:
+            dAC = distanceMap[a, c]
+            if dAC >= dAB:
+                break # No remaining neighbor can pay for the new edge
+            j = positions[c]
+            d = solution[(j + direction) % n]
+            if c == b or d == a:
+                continue
+            counters[EVALUATIONS] += 1
+            delta = dAC + distanceMap[b, d] - dAB - distanceMap[c, d]
+            if delta < -IMPROVEMENT_EPSILON:
+                if direction == 1:
+                    flip(solution, positions, b, c)
+                else:
+                    flip(solution, positions, a, d)
+                touched[0] = a
+                touched[1] = b
+                touched[2] = c
+                touched[3] = d
+                return delta
+
+    if not orOpt:
+        return 0.0
+
+    # Or-opt: move a segment of 1 to maxSegment cities starting at a next to one of its end points' neighbors.
+    for length in range(1, min(maxSegment, n - 3) + 1):
+        e = (i + length - 1) % n
+        first = a
+        last = solution[e]
+        p = solution[(i - 1) % n]
+        q = solution[(e + 1) % n]
+        removeGain = distanceMap[p, first] + distanceMap[last, q] - distanceMap[p, q]
+        for end in range(2):
+            endCity = first if end == 0 else last
+            for c in neighbors[endCity]:
+                if distanceMap[endCity, c] >= removeGain:
+                    break # Gain criterion: the new edge alone costs more than removing the segment saves
+                if (positions[c] - i) % n < length:
+                    continue # c is inside the segment
+                for side in range(2):
+                    # Insert between x and y = succ x, with c on one side of the segment.
+                    x = c if side == 0 else solution[(positions[c] - 1) % n]
+                    y = solution[(positions[x] + 1) % n]
+                    if (positions[x] - i) % n < length or (positions[y] - i) % n < length:
+                        continue
+                    # c touches endCity: decide which end faces x.
+                    reverse = (side == 0) == (end == 1)
+                    if reverse:
+                        addCost = distanceMap[x, last] + distanceMap[first, y]
+                    else:
+                        addCost = distanceMap[x, first] + distanceMap[last, y]
+                    counters[EVALUATIONS] += 1
+                    delta = addCost - distanceMap[x, y] - removeGain
+                    if delta < -IMPROVEMENT_EPSILON:
+                        move_segment(solution, positions, i, length, x, reverse)
+                        touched[0] = p
+                        touched[1] = q
+                        touched[2] = first
+                        touched[3] = last
+                        touched[4] = x
+                        touched[5] = y
+                        return delta
+    return 0.0
+
+@njit(cache=True)
+def local_search(solution, distanceMap, neighbors, orOpt=True, maxSegment=3):
+    """
+    Apply improving 2-opt and Or-opt moves until no candidate move shortens the tour.
+    Each city keeps a don't-look bit: it is only revisited after one of its edges changes.
+    :param solution: A list of cities in some order. Modified in place.
+    :param distanceMap: The distance matrix lookup tool.
+    :param neighbors: The candidate neighbor lists from build_neighbor_lists.
+    :param orOpt: Also try Or-opt segment moves.
+    :param maxSegment: The longest segment Or-opt will move.
+    :return: The locally optimal solution, its distance, and the tsp.EVALUATIONS / ACCEPTED counters.
+    """
+    n = len(solution)
+    currentDistance = total_distance(solution, distanceMap)
+    counters = np.zeros(NUM_COUNTERS, dtype=np.int64)
+    if n < 5:
+        return solution, currentDistance, counters
+
+    positions = build_positions(solution)
+
+    # All don't-look bits start off, so every city is queued once.
+    queue = solution.copy()
+    inQueue = np.ones(n, dtype=np.bool_)
+    touched = np.empty(6, dtype=np.int64)
+    head = 0
+    tail = 0
+    size = n
+    while size > 0:
+        a = queue[head]
+        head = (head + 1) % n
+        inQueue[a] = False
+        size -= 1
+
+        delta = improve_city(solution, positions, distanceMap, neighbors, a, orOpt, maxSegment, touched, counters)
+        if delta < 0.0:
+            currentDistance += delta
+            counters[ACCEPTED] += 1
+            for city in touched:
+                if city >= 0 and not inQueue[city]: # Clear the don't-look bit
+                    inQueue[city] = True
+                    queue[tail] = city
+                    tail = (tail + 1) % n
+                    size += 1
+    return solution, currentDistance, counters
+
+def main():
+    """
+    Initialize user prompt, parse the input file, and run the search algorithm.
+    Plot the results.
+    """
+    from matplotlib import pyplot as plt # Only the interactive drivers need matplotlib
+    ioManager = IOManager()
+    filename, iterations, rounds = ioManager.prompt_input()
+    cities = ioManager.read_file(filename)
+
+    print("\nStarting 2-opt / Or-opt local search")
+    startTime = time()
+    citiesIdx = build_cities_index(cities)
+    distanceMap, citiesMap = build_distance_map(cities, citiesIdx, cacheDir=default_cache_dir())
+    neighbors = build_neighbor_lists(distanceMap)
+
+    plt.style.use("ggplot")
+    fig, ax = plt.subplots(figsize=(8,6))
+
+    # Restarts are independent, so spread each round over every core.
+    executor = RestartExecutor(local_search, citiesIdx, distanceMap, neighbors=neighbors)
+
+    absBestDistance = sys.maxsize
+    absBestSolution = None
+    recorder = ConvergenceRecorder()
+    evaluations = 0
+    for r in range(rounds):
+        t1 = time()
+        bestSolution, bestDist, trace = executor.run(iterations)
+        bestDist = int(bestDist)
+        recorder.record_trace(trace, r * iterations)
+
+        # Track the absolute best solution and distance
+        if bestDist < absBestDistance:
+            absBestDistance = bestDist
+            absBestSolution = bestSolution
+
+        t2 = time()
+        duration = round(t2-t1, 3)
+        print(f"Best distance in round {r}: {bestDist} km\t Time taken: {duration} sec")
+        print(f"Evaluations/sec: {int((executor.counters[EVALUATIONS] - evaluations) / max(t2 - t1, 1e-9))}")
+        evaluations = executor.counters[EVALUATIONS]
+    executor.close()
+    print(f"Total run time: {round(time() - startTime, 3)} sec")
+
+    ioManager.write_file("local_search", filename, absBestDistance, absBestSolution, citiesMap)
+
+    # Save the plot in the background while the window is open.
+    render(recorder, ioManager.output_path("local_search", filename, "convergence.png"), "2-opt / Or-opt Local Search Algorithm",
+           f"Rounds: {rounds}     Iterations: {iterations}")
+    plot_convergence(ax, recorder)
+    plt.suptitle("2-opt / Or-opt Local Search Algorithm", fontsize=24)
+    ax.set_title(f"Rounds: {rounds}     Iterations: {iterations}", fontsize=12)
+    plt.xlabel("Iterations", fontsize=16)
+    plt.ylabel("Shortest Distance (km)", fontsize=16)
+    plt.tick_params(axis="both", which="major", labelsize=12)
+
+    plt.autoscale()
+    plt.tight_layout()
+    plt.show()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+# coding=utf-8
+
+import numpy as np
+from numba import njit
+
+"""
+Lower bounds on the shortest tour, to report how far a solution can be from optimal.
+A 1-tree is a minimum spanning tree over every city but one, plus that city's two cheapest edges.
+Every tour is a 1-tree, so the cheapest 1-tree is a lower bound. Held-Karp tightens it by adding a penalty
+pi[i] to every edge at city i: tours keep their order, since each city has exactly two edges, while the
+1-tree is pushed towards degree 2 everywhere. Subgradient steps on pi raise the bound, usually to within
+a percent or two of the optimum. Each step is one Prim's pass over the dense matrix, O(n^2).
+"""
+
+# Subgradient steps by default.
+HELD_KARP_ITERATIONS = 1000
+
+@njit(cache=True)
+def one_tree(distanceMap, pi, degrees, parent, key, inTree):
+    """
+    The cheapest 1-tree under the penalized distances distanceMap[i, j] + pi[i] + pi[j], with city 0 as the special city.
+    Prim's algorithm over the dense matrix: O(n^2) time and no heap.
+    :param degrees: An output array of each city's degree in the 1-tree.
+    :param parent, key, inTree: Scratch arrays with a slot per city.
+    :return: The penalized length of the 1-tree.
+    """
+    n = len(pi)
+    degrees[:] = 0
+    inTree[:] = False
+    key[:] = np.inf
+    total = 0.0
+    current = 1
+    inTree[1] = True
+    for _ in range(n - 2):
+        following = -1
+        nearest = np.inf
+        for j in range(1, n):
+            if inTree[j]:
+                continue
+            weight = distanceMap[current, j] + pi[current] + pi[j]
+            if weight < key[j]:
+                key[j] = weight
+                parent[j] = current
+            if key[j] < nearest:
+                nearest = key[j]
+                following = j
+        inTree[following] = True
+        total += nearest
+        degrees[following] += 1
+        degrees[parent[following]] += 1
+        current = following
+    first = np.inf
+    second = np.inf
+    a = -1
+    b = -1
+    for j in range(1, n):
+        weight = distanceMap[0, j] + pi[0] + pi[j]
+        if weight < first:
+            second, b = first, a
+            first, a = weight, j
+        elif weight < second:
+            second, b = weight, j
+    degrees[0] = 2
+    degrees[a] += 1
+    degrees[b] += 1
+    return total + first + second
+
+@njit(cache=True)
+def nearest_neighbor_length(distanceMap):
+    """
+    The length of the nearest neighbor tour from city 0, an upper bound for the subgradient step size.
+    """
+    n = len(distanceMap)
+    visited = np.zeros(n, dtype=np.bool_)
+    visited[0] = True
+    current = 0
+    total = 0.0
+    for _ in range(n - 1):
+        following = -1
+        nearest = np.inf
+        for j in range(n):
+            if not visited[j] and distanceMap[current, j] < nearest:
+                nearest = distanceMap[current, j]
+                following = j
+        visited[following] = True
+        total += nearest
+        current = following
+    return total + distanceMap[current, 0]
+
+@njit(cache=True)
+def held_karp(distanceMap, upperBound, maxIterations, pi):
+    """
+    Raise the 1-tree bound by subgradient steps on the penalties pi.
+    The step is alpha * (upperBound - bound) / |degrees - 2|^2, and alpha halves whenever the bound
+    has not improved for a while.
+    :param upperBound: The length of any tour, e.g. the best found so far.
+    :param pi: The starting penalties, usually zeros. Left holding the penalties of the best bound.
+    :return: The best lower bound found.
+    """
+    n = len(pi)
+    degrees = np.empty(n, dtype=np.int64)
+    parent = np.empty(n, dtype=np.int64)
+    key = np.empty(n, dtype=np.float64)
+    inTree = np.empty(n, dtype=np.bool_)
+    bestPi = pi.copy()
+    best = -np.inf
+    alpha = 2.0
+    period = 30 # Steps without a better bound before alpha halves
+    stale = 0
+    for _ in range(maxIterations):
+        bound = one_tree(distanceMap, pi, degrees, parent, key, inTree) - 2.0 * pi.sum()
+        if bound > best:
+            best = bound
+            bestPi[:] = pi
+            stale = 0
+        else:
+            stale += 1
+            if stale >= period:
+                alpha /= 2.0
+                stale = 0
+                if alpha < 1e-4:
+                    break
+        norm = 0.0
+        for i in range(n):
+            norm += (degrees[i] - 2) ** 2
+        if norm == 0.0: # The 1-tree is a tour, so it is an optimal one
+            break
+        step = alpha * (upperBound - bound) / norm
+        if step <= 0.0:
+            break
+        for i in range(n):
+            pi[i] += step * (degrees[i] - 2)
+    pi[:] = bestPi
+    return best
+
+def lower_bound(distanceMap, upperBound=None, maxIterations=HELD_KARP_ITERATIONS):
+    """
+    The Held-Karp lower bound on the shortest tour. maxIterations=1 gives the plain 1-tree bound.
+    :param distanceMap: A dense, symmetric distance matrix.
+    :param upperBound: The length of a known tour, which sizes the subgradient steps. Defaults to a nearest neighbor tour.
+    :param maxIterations: The most subgradient steps.
+    :return: A distance no tour can be shorter than.
+    """
+    if not isinstance(distanceMap, np.ndarray):
+        raise ValueError("The lower bound runs Prim's algorithm over a dense distance matrix, not a distance backend.")
+    n = len(distanceMap)
+    if n < 4: # Every tour of three or fewer cities has the same length
+        return float(sum(distanceMap[k, (k + 1) % n] for k in range(n))) if n > 1 else 0.0
+    if upperBound is None:
+        upperBound = nearest_neighbor_length(distanceMap)
+    return float(held_karp(distanceMap, float(upperBound), maxIterations, np.zeros(n, dtype=np.float64)))
+
+def optimality_gap(distance, bound):
+    """
+    How much longer a tour is than the lower bound, relative to the bound, e.g. 0.02 for 2%. The optimum is at least as close.
+    """
+    return float(distance / bound - 1.0) if bound > 0 else 0.0
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+# coding=utf-8
+
+import json
+import re
+from contextlib import contextmanager
+from time import perf_counter
+from numba.core import event
+
+"""
+Counters and timers for one run, exported as a JSON report or in the Prometheus text format.
+The compiled kernels count their own work in the small counter arrays they return (see tsp.EVALUATIONS),
+and the drivers add those up here together with wall-clock timers, so the hot loops never call back into Python.
+"""
+
+def _escape_label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+class Metrics:
+    """
+    Named counters, timers (seconds) and gauges collected over one run.
+    """
+
+    def __init__(self, prefix="tsp"):
+        """
+        :param prefix: Prepended to every name in the Prometheus output.
+        """
+        self.prefix = prefix
+        self.counters = {}
+        self.timers = {}
+        self.gauges = {}
+
+    def count(self, name, value=1):
+        self.counters[name] = self.counters.get(name, 0) + int(value)
+
+    def set(self, name, value):
+        self.gauges[name] = float(value)
+
+    @contextmanager
+    def timer(self, name):
+        """
+        Add the wall-clock time spent inside the with block to a timer.
+        """
+        t1 = perf_counter()
+        try:
+            yield
+        finally:
+            self.timers[name] = self.timers.get(name, 0.0) + perf_counter() - t1
+
+    @contextmanager
+    def compile_timer(self, name="jit_compile"):
+        """
+        Add the time numba spends compiling kernels inside the with block to a timer. Loads from the disk cache are not compiles.
+        Nested compiles of callee kernels are only counted once. Compiles inside worker processes are not seen.
+        """
+        self.timers.setdefault(name, 0.0)
+        def record(duration):
+            self.timers[name] += duration
+        with event.install_timer("numba:compile", record):
+            yield
+
+    def rate(self, name, counter, timer):
+        """
+        Set a gauge to a counter divided by a timer, e.g. evaluations per second of search.
+        """
+        seconds = self.timers.get(timer, 0.0)
+        self.set(name, self.counters.get(counter, 0) / seconds if seconds > 0 else 0.0)
+
+    def report(self):
+        """
+        :return: A JSON serializable dictionary of every counter, timer and gauge.
+        """
+        return {
+            "counters": dict(self.counters),
+            "timers": {name: round(seconds, 6) for name, seconds in self.timers.items()},
+            "gauges": dict(self.gauges),
+        }
+
+    def write_json(self, filepath):
+        with open(filepath, mode='w') as outfile:
+            json.dump(self.report(), outfile, indent=2)
+
+    def prometheus(self, labels=None):
+        """
+        Format every metric in the Prometheus text exposition format, for a node exporter textfile or a pushgateway.
+        Counters get a _total suffix and timers a _seconds suffix.
+        :param labels: A dictionary of labels added to every sample, e.g. {"algorithm": "local_search"}.
+        :return: The exposition text.
+        """
+        labelText = ""
+        if labels:
+            labelText = "{" + ",".join(f'{key}="{_escape_label(value)}"' for key, value in labels.items()) + "}"
+        lines = []
+        for kind, suffix, values in (("counter", "_total", self.counters), ("gauge", "_seconds", self.timers), ("gauge", "", self.gauges)):
+            for name, value in values.items():
+                metric = re.sub(r"[^a-zA-Z0-9_]", "_", f"{self.prefix}_{name}{suffix}")
+                lines.append(f"# TYPE {metric} {kind}")
+                lines.append(f"{metric}{labelText} {value}")
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, filepath, labels=None):
+        with open(filepath, mode='w') as outfile:
+            outfile.write(self.prometheus(labels))
@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+# coding=utf-8
+
+import os
+import multiprocessing
+from time import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from tsp import random_solution, seed_random, shuffle_into, NUM_COUNTERS, ACCEPTED
+
+"""
+Run independent random restarts on every core.
+Each worker runs a contiguous chunk of restarts with its own seeded random stream,
+so a run is reproducible for a given seed and worker count.
+"""
+
+# Read-only search state for the current process. Set once per worker by the pool initializer.
+_workerState = {}
+
+def _init_worker(climb, citiesIdx, distanceMap, climbArgs, start=None, recordSteps=False):
+    _workerState["climb"] = climb
+    _workerState["recordSteps"] = recordSteps
+    _workerState["start"] = start
+    _workerState["citiesIdx"] = citiesIdx
+    _workerState["distanceMap"] = distanceMap
+    _workerState["climbArgs"] = climbArgs
+
+def _run_chunk(workerSeed, count, deadline=None, policy=None):
+    """
+    Run a chunk of restarts inside a worker.
+    :param workerSeed: The seed for this worker's random stream.
+    :param count: The number of restarts to run.
+    :param deadline: A time() after which no new restart is started. The first restart always runs.
+    :param policy: A running stopping.StoppingPolicy for this worker, updated after every restart.
+    :return: The best distance, the best solution, the distance found by every completed restart,
+             the sum of the counter arrays the climbs returned as their third value,
+             the ACCEPTED count of every completed restart (None unless the executor records steps),
+             and why the chunk stopped early (None if it ran every restart).
+    """
+    climb = _workerState["climb"]
+    citiesIdx = _workerState["citiesIdx"]
+    distanceMap = _workerState["distanceMap"]
+    climbArgs = _workerState["climbArgs"]
+    start = _workerState["start"] or shuffle_into
+
+    seed_random(workerSeed)
+    dists = np.empty(count, dtype=np.float64)
+    # Only totals leave the worker, so memory per restart is the trace entry and, when recorded, its step count.
+    counters = np.zeros(NUM_COUNTERS, dtype=np.int64)
+    steps = np.zeros(count, dtype=np.int64) if _workerState["recordSteps"] else None
+    bestDist = np.inf
+    bestSolution = None
+    # Every restart climbs in place on one buffer. Only a new best tour is copied out.
+    solution = np.empty_like(citiesIdx)
+    for k in range(count):
+        if k > 0 and deadline is not None and time() >= deadline:
+            return bestDist, bestSolution, dists[:k], counters, None if steps is None else steps[:k], "time_limit"
+        if k > 0 and policy is not None and policy.should_stop():
+            return bestDist, bestSolution, dists[:k], counters, None if steps is None else steps[:k], policy.reason
+        start(solution, citiesIdx)
+        result = climb(solution, distanceMap, **climbArgs)
+        neighbor, dist = result[0], result[1]
+        dists[k] = dist
+        if len(result) > 2:
+            counters += result[2][:NUM_COUNTERS]
+            if steps is not None:
+                steps[k] = result[2][ACCEPTED]
+        if dist < bestDist:
+            bestDist = dist
+            bestSolution = neighbor.copy()
+        if policy is not None:
+            policy.update(dist)
+    return bestDist, bestSolution, dists, counters, steps, None
+
+class RestartExecutor:
+    """
+    A pool of worker processes that run restarts of one climb function, from random or constructed starting tours.
+    The distance matrix is handed to the workers once when they start. On platforms that fork
+    it is shared copy-on-write and never pickled.
+    Use as a context manager, or call close() when done.
+    """
+
+    def __init__(self, climb, citiesIdx, distanceMap, workers=None, warmUpArgs=None, start=None, recordSteps=False, **climbArgs):
+        """
+        :param climb: A function climb(solution, distanceMap, **climbArgs) returning (solution, distance, ...).
+        :param citiesIdx: A list of cities labeled as integers.
+        :param distanceMap: The distance matrix lookup tool.
+        :param workers: The number of worker processes. Defaults to every core.
+        :param warmUpArgs: Keyword arguments that override climbArgs for the warm-up call,
+                           so time-budgeted climbs can compile without spending their budget.
+        :param start: A function start(solution, citiesIdx) that fills the solution buffer with a starting tour
+                      in place, like initial_tours.StartTour. Defaults to a random shuffle.
+        :param recordSteps: Keep the ACCEPTED count of every restart of the last run in self.steps,
+                            e.g. the swaps climb_to_local_optimum took to converge.
+        :param climbArgs: Extra keyword arguments passed to every climb call.
+        """
+        self.workers = workers or os.cpu_count() or 1
+        self.pool = None
+        self.recordSteps = recordSteps
+        self.steps = np.empty(0, dtype=np.int64)
+        self.counters = np.zeros(NUM_COUNTERS, dtype=np.int64)
+        self.stopReasons = []
+        _init_worker(climb, citiesIdx, distanceMap, climbArgs, start, recordSteps)
+        # Compile the kernels before forking so the workers inherit the machine code.
+        seed_random(0)
+        solution = random_solution(citiesIdx)
+        if start is not None:
+            start(solution, citiesIdx)
+        climb(solution, distanceMap, **{**climbArgs, **(warmUpArgs or {})})
+        if self.workers > 1:
+            methods = multiprocessing.get_all_start_methods()
+            context = multiprocessing.get_context("fork" if "fork" in methods else None)
+            self.pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=context,
+                                            initializer=_init_worker,
+                                            initargs=(climb, citiesIdx, distanceMap, climbArgs, start, recordSteps))
+
+    def run(self, iterations, seed=None, deadline=None, policy=None):
+        """
+        Run a number of random restarts spread evenly over the workers.
+        :param iterations: The total number of restarts.
+        :param seed: The seed for the run. None picks a fresh random seed.
+        :param deadline: A time() after which workers stop starting new restarts.
+        :param policy: A running stopping.StoppingPolicy. Every worker checks its own copy after each restart,
+                       so patience is counted per worker, against the best distance from before this run.
+                       The run is recorded in the policy afterwards as one batch. If every worker stalled,
+                       its reason is set to "stalled".
+        :return: The best solution, its distance, and the best-so-far distance after each completed restart.
+                 The counter arrays the climbs returned (see tsp.EVALUATIONS) are summed into self.counters
+                 over every run, and with recordSteps each restart's ACCEPTED count is kept in self.steps in trace order.
+        """
+        workerSeeds = [int(s.generate_state(1)[0]) for s in np.random.SeedSequence(seed).spawn(self.workers)]
+        counts = [len(chunk) for chunk in np.array_split(np.arange(iterations), self.workers)]
+        if policy is not None and policy.deadline is not None:
+            deadline = policy.deadline if deadline is None else min(deadline, policy.deadline)
+        policies = [None if policy is None else policy.start(deadline=deadline, best=policy.best) for _ in range(self.workers)]
+        if self.pool is None:
+            results = [_run_chunk(workerSeeds[w], counts[w], deadline, policies[w]) for w in range(self.workers)]
+        else:
+            results = list(self.pool.map(_run_chunk, workerSeeds, counts, [deadline] * self.workers, policies))
+
+        # Reduce in worker order so the trace does not depend on which process finished first.
+        bestDist = np.inf
+        bestSolution = None
+        for dist, solution, _, _, _, _ in results:
+            if dist < bestDist:
+                bestDist = dist
+                bestSolution = solution
+        dists = np.concatenate([dists for _, _, dists, _, _, _ in results])
+        for _, _, _, counters, _, _ in results:
+            self.counters += counters
+        if self.recordSteps:
+            self.steps = np.concatenate([steps for _, _, _, _, steps, _ in results])
+        self.stopReasons = [reason for _, _, _, _, _, reason in results]
+        if policy is not None:
+            policy.update(dists.min(), len(dists))
+            reasons = [reason for reason, count in zip(self.stopReasons, counts) if count > 0]
+            if all(reason == "stalled" for reason in reasons):
+                policy.reason = "stalled"
+        trace = np.minimum.accumulate(dists)
+        return bestSolution, bestDist, trace
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.shutdown()
+            self.pool = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,421 @@
+#!/usr/bin/env python3
+# coding=utf-8
+
+import argparse
+import functools
+import itertools
+import json
+import multiprocessing
+import os
+import socketserver
+import sys
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeout
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from multiprocessing.sharedctypes import RawArray
+from time import time
+import numpy as np
+from distance_cache import default_cache_dir
+from metrics import Metrics
+from solver import load_instance, solve_instance
+from warmup import warm_up
+
+"""
+A long-running solver service, so many independent instances can be solved without starting
+a process, importing numba and compiling the kernels for each one.
+The kernels are compiled (or loaded from the numba disk cache) once in the service process,
+then a pool of forked workers inherits them and runs one job at a time each. The parallel genetic
+kernels are the exception: each worker loads them after the fork.
+
+Requests are JSON objects, one per line over stdin or a Unix socket, or over HTTP on localhost:
+
+    {"op": "submit", "job": {"cities": "cities_full.txt", "algorithm": "local_search", "time_limit": 5}}
+    {"op": "submit", "jobs": [{...}, {...}]}
+    {"op": "status", "id": 1}
+    {"op": "result", "id": 1, "wait": 30}
+    {"op": "cancel", "id": 1}
+    {"op": "list"}
+
+Finished jobs are forgotten once their result is fetched, or after a retention period if it never is.
+A job takes the solver.solve() options listed in JOB_OPTIONS, with cities as a file path
+or a list of [name, longitude, latitude] rows, and an optional distance metric for city files. Every reply has "ok", and "error" when it is false.
+"""
+
+JOB_OPTIONS = ("algorithm", "iterations", "rounds", "seed", "time_limit", "max_steps", "max_restarts",
+               "patience", "min_improvement", "start", "sample_fraction", "report_gap", "target_gap")
+
+# Finished jobs whose results are never fetched are forgotten after this many seconds,
+# and the oldest are forgotten early once there are more than MAX_FINISHED_JOBS of them.
+FINISHED_JOB_RETENTION = 3600.0
+MAX_FINISHED_JOBS = 1000
+
+# Cancel flags are slots in shared memory, indexed by job id modulo this. A slot holds the id of the
+# last job cancelled in it, so a slot is never mistaken for a later job that reuses it.
+CANCEL_SLOTS = 4096
+
+# Set in the service process before the workers fork, so every worker shares them.
+_cancelFlags = None
+_cacheDir = None
+
+class _Cancelled:
+    """
+    The cancelled check for one job, read from the shared flags. Picklable, unlike a closure.
+    """
+
+    def __init__(self, jobId):
+        self.jobId = jobId
+
+    def __call__(self):
+        return _cancelFlags[self.jobId % CANCEL_SLOTS] == self.jobId
+
+def _ready(_):
+    return os.getpid()
+
+def _run_job(jobId, job):
+    """
+    Solve one job inside a worker. Distances are memory-mapped from the disk cache when the instance was seen before.
+    :return: The solve_instance() result, or None if the job was cancelled before it started.
+    """
+    if _Cancelled(jobId)():
+        return None
+    startTime = time()
+    metrics = Metrics()
+    with metrics.compile_timer(), metrics.timer("distance_build"):
+        names, distanceMap, _, points = load_instance(job["cities"], _cacheDir, job.get("metric", "haversine"))
+    options = {key: job[key] for key in JOB_OPTIONS if key in job}
+    return solve_instance(names, distanceMap, workers=1, startTime=startTime, metrics=metrics, points=points,
+                          cancelled=_Cancelled(jobId), **options)
+
+class SolveService:
+    """
+    A job queue in front of a pool of warm worker processes.
+    Jobs run in submission order, one per worker. Use as a context manager, or call close() when done.
+    """
+
+    def __init__(self, workers=None, cacheDir=None, defaultTimeLimit=None, retention=FINISHED_JOB_RETENTION,
+                 maxFinished=MAX_FINISHED_JOBS):
+        """
+        :param workers: The number of jobs solved at once. Defaults to every core.
+        :param cacheDir: The distance cache directory shared by every job, see distance_cache. None always builds.
+        :param defaultTimeLimit: The time_limit of jobs that do not set one. None lets them run every restart.
+        :param retention: Seconds a finished job is kept for its result to be fetched. None keeps it until then.
+        :param maxFinished: The most finished jobs kept. The oldest beyond it are forgotten. None keeps every one.
+        """
+        global _cancelFlags, _cacheDir
+        self.workers = workers or os.cpu_count() or 1
+        self.defaultTimeLimit = defaultTimeLimit
+        self.retention = retention
+        self.maxFinished = maxFinished
+        self.jobs = {}
+        self.finished = {} # Job id to when it finished, in finishing order
+        self.lock = threading.Lock()
+        self.ids = itertools.count(1)
+        _cancelFlags = np.frombuffer(RawArray("q", CANCEL_SLOTS), dtype=np.int64)
+        _cacheDir = cacheDir
+        # Compile before forking so the workers inherit the machine code. The parallel kernels
+        # would start threads that cannot survive the fork, so each worker loads those itself.
+        warm_up(parallel=False)
+        methods = multiprocessing.get_all_start_methods()
+        context = multiprocessing.get_context("fork" if "fork" in methods else None)
+        self.pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=context, initializer=warm_up)
+        # Start every worker now, before any server threads exist.
+        list(self.pool.map(_ready, range(self.workers)))
+
+    @staticmethod
+    def check_job(job):
+        """
+        Raise a ValueError if a job is not a dictionary with cities and only JOB_OPTIONS.
+        """
+        if not isinstance(job, dict) or "cities" not in job:
+            raise ValueError("A job needs cities, a file path or a list of [name, longitude, latitude] rows.")
+        unknown = set(job) - set(JOB_OPTIONS) - {"cities", "metric"}
+        if unknown:
+            raise ValueError(f"Unknown job options: {', '.join(sorted(unknown))}.")
+
+    def submit(self, job):
+        """
+        Queue one job.
+        :param job: A dictionary with cities and any of JOB_OPTIONS.
+        :return: The job id.
+        """
+        self.check_job(job)
+        job = dict(job)
+        if job.get("time_limit") is None and self.defaultTimeLimit is not None:
+            job["time_limit"] = self.defaultTimeLimit
+        with self.lock:
+            jobId = next(self.ids)
+            future = self.jobs[jobId] = self.pool.submit(_run_job, jobId, job)
+        # Outside the lock, since the callback runs at once in this thread if the job already finished.
+        future.add_done_callback(functools.partial(self._finished, jobId))
+        return jobId
+
+    def _finished(self, jobId, _):
+        with self.lock:
+            if jobId in self.jobs:
+                self.finished[jobId] = time()
+            self._expire()
+
+    def _expire(self):
+        """
+        Forget finished jobs past the retention period or beyond maxFinished. The caller holds the lock.
+        """
+        expiry = None if self.retention is None else time() - self.retention
+        while self.finished:
+            jobId, finishedAt = next(iter(self.finished.items()))
+            tooMany = self.maxFinished is not None and len(self.finished) > self.maxFinished
+            if not tooMany and (expiry is None or finishedAt > expiry):
+                break
+            del self.finished[jobId]
+            self.jobs.pop(jobId, None)
+
+    def submit_batch(self, jobs):
+        """
+        Queue several jobs at once. Every job is checked before any is queued.
+        :return: The job ids, in the same order.
+        """
+        for job in jobs:
+            self.check_job(job)
+        return [self.submit(job) for job in jobs]
+
+    def _future(self, jobId):
+        future = self.jobs.get(jobId)
+        if future is None:
+            raise KeyError(f"Unknown job {jobId}.")
+        return future
+
+    def status(self, jobId):
+        """
+        :return: queued, running, done, failed or cancelled.
+        """
+        return self._status(self._future(jobId))
+
+    @staticmethod
+    def _status(future):
+        if future.cancelled():
+            return "cancelled"
+        if not future.done():
+            return "running" if future.running() else "queued"
+        if future.exception() is not None:
+            return "failed"
+        result = future.result()
+        return "cancelled" if result is None or result["stop_reason"] == "cancelled" else "done"
+
+    def result(self, jobId, wait=None):
+        """
+        Get a job's result and forget the job once it is finished.
+        :param wait: Seconds to wait for the job to finish. None returns at once.
+        :return: A dictionary with the status, and the result or error once the job finished.
+        """
+        future = self._future(jobId)
+        try:
+            future.exception(timeout=wait or 0)
+        except FutureTimeout:
+            return {"id": jobId, "status": self._status(future)}
+        except Exception: # Cancelled while queued
+            pass
+        reply = {"id": jobId, "status": self._status(future)}
+        if not future.cancelled():
+            if future.exception() is not None:
+                reply["error"] = str(future.exception())
+            elif future.result() is not None:
+                reply["result"] = future.result()
+        with self.lock:
+            self.jobs.pop(jobId, None)
+            self.finished.pop(jobId, None)
+        return reply
+
+    def cancel(self, jobId):
+        """
+        Cancel a job. A queued job never starts. A running job stops after its current restart
+        and keeps the best tour found so far.
+        :return: The job's status after the request.
+        """
+        future = self._future(jobId)
+        if not future.cancel():
+            _cancelFlags[jobId % CANCEL_SLOTS] = jobId
+        return self._status(future)
+
+    def list(self):
+        # Snapshot under the lock, since result() may forget jobs from another thread meanwhile.
+        with self.lock:
+            self._expire()
+            jobs = sorted(self.jobs.items())
+        return [{"id": jobId, "status": self._status(future)} for jobId, future in jobs]
+
+    def handle(self, request):
+        """
+        Answer one protocol request.
+        :param request: A decoded JSON request.
+        :return: A JSON serializable reply.
+        """
+        try:
+            op = request.get("op")
+            if op == "submit" and "jobs" in request:
+                return {"ok": True, "ids": self.submit_batch(request["jobs"])}
+            if op == "submit":
+                return {"ok": True, "id": self.submit(request.get("job"))}
+            if op == "status":
+                return {"ok": True, "id": request["id"], "status": self.status(request["id"])}
+            if op == "result":
+                return {"ok": True, **self.result(request["id"], request.get("wait"))}
+            if op == "cancel":
+                return {"ok": True, "id": request["id"], "status": self.cancel(request["id"])}
+            if op == "list":
+                return {"ok": True, "jobs": self.list()}
+            raise ValueError(f"Unknown op '{op}', expected submit, status, result, cancel or list.")
+        except (KeyError, ValueError, TypeError, AttributeError) as error:
+            message = error.args[0] if isinstance(error, KeyError) and error.args else str(error)
+            return {"ok": False, "error": message}
+
+    def handle_line(self, line):
+        """
+        Answer one JSON-lines request.
+        :return: The reply as one line of JSON, or None for a blank line.
+        """
+        if not line.strip():
+            return None
+        try:
+            request = json.loads(line)
+        except json.JSONDecodeError as error:
+            return json.dumps({"ok": False, "error": f"Invalid JSON: {error}"})
+        if not isinstance(request, dict):
+            return json.dumps({"ok": False, "error": "A request must be a JSON object."})
+        return json.dumps(self.handle(request))
+
+    def close(self):
+        with self.lock:
+            jobIds = list(self.jobs)
+        for jobId in jobIds:
+            self.cancel(jobId)
+        self.pool.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def serve_stdio(service, infile=sys.stdin, outfile=sys.stdout):
+    """
+    Answer JSON-lines requests from infile until it closes.
+    """
+    for line in infile:
+        reply = service.handle_line(line)
+        if reply is not None:
+            outfile.write(reply + "\n")
+            outfile.flush()
+
+def serve_unix(service, path):
+    """
+    Answer JSON-lines requests on a Unix socket, one thread per connection.
+    """
+    class Handler(socketserver.StreamRequestHandler):
+        def handle(self):
+            for line in self.rfile:
+                reply = service.handle_line(line.decode("utf-8"))
+                if reply is not None:
+                    self.wfile.write(reply.encode("utf-8") + b"\n")
+
+    if os.path.exists(path):
+        os.unlink(path)
+    with socketserver.ThreadingUnixStreamServer(path, Handler) as server:
+        server.daemon_threads = True
+        server.serve_forever()
+
+def serve_http(service, port, host="127.0.0.1"):
+    """
+    Answer requests over HTTP:
+    POST /jobs with a job, or {"jobs": [...]} for a batch; GET /jobs; GET /jobs/<id>?wait=<seconds>; DELETE /jobs/<id>.
+    """
+    class Handler(BaseHTTPRequestHandler):
+        def reply(self, reply):
+            body = json.dumps(reply).encode("utf-8")
+            self.send_response(200 if reply["ok"] else 400)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def job_id(self):
+            path, _, query = self.path.partition("?")
+            parts = path.strip("/").split("/")
+            params = dict(pair.partition("=")[::2] for pair in query.split("&") if pair)
+            if len(parts) == 2 and parts[0] == "jobs" and parts[1].isdigit():
+                return int(parts[1]), params
+            return None, params
+
+        def do_POST(self):
+            if self.path.rstrip("/") != "/jobs":
+                return self.reply({"ok": False, "error": "Submit jobs to /jobs."})
+            try:
+                length = int(self.headers.get("Content-Length", 0))
+            except ValueError:
+                length = -1
+            if length < 0:
+                self.close_connection = True # The body cannot be skipped without a length
+                return self.reply({"ok": False, "error": "Content-Length must be a non-negative integer."})
+            try:
+                body = json.loads(self.rfile.read(length) or b"{}")
+            except (json.JSONDecodeError, UnicodeDecodeError) as error:
+                return self.reply({"ok": False, "error": f"Invalid JSON: {error}"})
+            if isinstance(body, dict) and "jobs" in body:
+                return self.reply(service.handle({"op": "submit", "jobs": body["jobs"]}))
+            self.reply(service.handle({"op": "submit", "job": body}))
+
+        def do_GET(self):
+            if self.path.rstrip("/") == "/jobs":
+                return self.reply(service.handle({"op": "list"}))
+            jobId, params = self.job_id()
+            if jobId is None:
+                return self.reply({"ok": False, "error": "Get /jobs or /jobs/<id>."})
+            try:
+                wait = float(params["wait"]) if "wait" in params else None
+            except ValueError:
+                wait = -1.0
+            if wait is not None and not 0.0 <= wait < float("inf"):
+                return self.reply({"ok": False, "error": "wait must be a non-negative number of seconds."})
+            self.reply(service.handle({"op": "result", "id": jobId, "wait": wait}))
+
+        def do_DELETE(self):
+            jobId, _ = self.job_id()
+            if jobId is None:
+                return self.reply({"ok": False, "error": "Cancel jobs at /jobs/<id>."})
+            self.reply(service.handle({"op": "cancel", "id": jobId}))
+
+        def log_message(self, *args):
+            pass
+
+    with ThreadingHTTPServer((host, port), Handler) as server:
+        server.daemon_threads = True
+        server.serve_forever()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve TSP solves from a pool of warm worker processes.")
+    transport = parser.add_mutually_exclusive_group()
+    transport.add_argument("--socket", default=None, metavar="PATH", help="Serve JSON lines on a Unix socket instead of stdin.")
+    transport.add_argument("--port", type=int, default=None, help="Serve HTTP on localhost at this port instead of stdin.")
+    parser.add_argument("-w", "--workers", type=int, default=None, help="Jobs solved at once (default every core).")
+    parser.add_argument("-t", "--time-limit", type=float, default=None, help="Time limit of jobs that do not set one.")
+    parser.add_argument("--no-cache", action="store_true", help="Always rebuild distance matrices instead of using the on-disk cache.")
+    parser.add_argument("--cache-dir", default=None, help="Distance matrix cache directory (default $TSP_DISTANCE_CACHE or ~/.cache/tsp_distances).")
+    parser.add_argument("--retention", type=float, default=FINISHED_JOB_RETENTION,
+                        help=f"Seconds to keep a finished job whose result is not fetched (default {FINISHED_JOB_RETENTION:g}).")
+    parser.add_argument("--max-finished", type=int, default=MAX_FINISHED_JOBS,
+                        help=f"Most finished jobs kept before the oldest are forgotten (default {MAX_FINISHED_JOBS}).")
+    args = parser.parse_args(argv)
+
+    cacheDir = None if args.no_cache else (args.cache_dir or default_cache_dir())
+    with SolveService(args.workers, cacheDir, args.time_limit, args.retention, args.max_finished) as service:
+        print(f"Serving with {service.workers} workers", file=sys.stderr)
+        try:
+            if args.socket is not None:
+                serve_unix(service, args.socket)
+            elif args.port is not None:
+                serve_http(service, args.port)
+            else:
+                serve_stdio(service)
+        except KeyboardInterrupt:
+            pass
+
+if __name__ == "__main__":
+    main()
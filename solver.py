@@ -0,0 +1,561 @@
+#!/usr/bin/env python3
+# coding=utf-8
+
+import argparse
+import hashlib
+import json
+import math
+import os
+import sys
+from time import time
+import numpy as np
+from io_manager import IOManager
+from distance_cache import default_cache_dir
+from distance_backends import distance_rows
+from distance_metrics import GEOGRAPHIC_METRICS
+from checkpoint import Checkpointer, read_checkpoint, settings_string
+from convergence import ConvergenceRecorder, plot_convergence, render
+from hill_climbing import MAX_CLIMB_STEPS
+from initial_tours import START_TOURS, StartTour
+from islands import IslandModel, MIGRATION_INTERVAL
+from lower_bound import lower_bound, optimality_gap
+from metrics import Metrics
+from restarts import RestartExecutor
+from spatial_index import sphere_points, plane_points
+from stopping import StoppingPolicy
+from tsp import build_distance_data, EVALUATIONS, ACCEPTED
+from tsplib import read_tsplib, build_tsplib_distance_map, geo_radians
+
+"""
+Headless entry point for running solves from scripts, benchmarks and job schedulers.
+Use solve() from Python, or run `python solver.py --help` for the command line.
+matplotlib is only imported when a plot is requested.
+"""
+
+ALGORITHMS = ("hill_climbing", "gradient_descent", "local_search", "annealing", "late_acceptance", "genetic")
+
+# Engines that improve one tour for a time or move budget instead of climbing to a local optimum.
+BUDGETED_ALGORITHMS = ("annealing", "late_acceptance", "genetic")
+
+def _climb_for(algorithm, distanceMap, restartTime=None, maxSteps=None, sampleFraction=None):
+    """
+    Look up the climb function and its extra arguments for an algorithm name.
+    :param algorithm: One of ALGORITHMS.
+    :param distanceMap: The distance matrix, needed to build local search neighbor lists.
+    :param restartTime: The seconds each restart of a budgeted engine may run. None uses its default move budget.
+    :param maxSteps: Climb each hill climbing restart to a local optimum, applying at most this many swaps.
+                     None stops after the first improving swap.
+    :param sampleFraction: The share of the cities gradient descent samples swaps for per step. None samples 500.
+    :return: The climb function and a dictionary of keyword arguments for it.
+    """
+    if algorithm == "hill_climbing" and maxSteps is not None:
+        from hill_climbing import climb_to_local_optimum
+        return climb_to_local_optimum, {"maxSteps": maxSteps}
+    if maxSteps is not None:
+        raise ValueError("Climbing to a local optimum is only supported by hill_climbing.")
+    if sampleFraction is not None and algorithm != "gradient_descent":
+        raise ValueError("Sampling a fraction of the swaps is only supported by gradient_descent.")
+    if algorithm == "hill_climbing":
+        from hill_climbing import find_best_neighbor
+        return find_best_neighbor, {}
+    if algorithm == "gradient_descent":
+        from gradient_descent import find_best_neighbor, sample_limit
+        return find_best_neighbor, {"limit": sample_limit(len(distanceMap), sampleFraction)}
+    if algorithm == "local_search":
+        from local_search import build_neighbor_lists, local_search
+        return local_search, {"neighbors": build_neighbor_lists(distanceMap)}
+    if algorithm == "genetic":
+        from genetic import genetic
+        return genetic, {"timeLimit": restartTime}
+    if algorithm in BUDGETED_ALGORITHMS:
+        from annealing import anneal, late_acceptance
+        from local_search import build_neighbor_lists
+        climb = anneal if algorithm == "annealing" else late_acceptance
+        return climb, {"neighbors": build_neighbor_lists(distanceMap), "timeLimit": restartTime}
+    raise ValueError(f"Unknown algorithm '{algorithm}', expected one of {', '.join(ALGORITHMS)}.")
+
+def _is_tsplib(source):
+    return isinstance(source, str) and source.lower().endswith(".tsp")
+
+def load_instance(source, cacheDir=None, metric="haversine"):
+    """
+    Load cities and build their distances from any supported input.
+    :param source: A list of city tuples composed of (cityname, longitude, latitude), a path to a city file,
+                   or a path to a TSPLIB .tsp file.
+    :param cacheDir: Reuse distance matrices saved in this directory, see distance_cache. None always builds.
+    :param metric: The distance metric for city files, one of distance_metrics.GEOGRAPHIC_METRICS.
+                   TSPLIB files always use the metric their EDGE_WEIGHT_TYPE names.
+    :return: A list of city names, the distance matrix or backend, an (n, 2) coordinate array,
+             and the (n, 3) city positions for spatial_index (both None for explicit matrices).
+    """
+    if _is_tsplib(source):
+        problem = read_tsplib(source)
+        coordinates = problem.coordinates
+        if coordinates is None:
+            points = None
+        elif problem.edgeWeightType == "GEO":
+            points = sphere_points(np.rad2deg(geo_radians(coordinates[:, 0])), np.rad2deg(geo_radians(coordinates[:, 1])))
+        else:
+            points = plane_points(coordinates[:, 0], coordinates[:, 1])
+        return problem.names, build_tsplib_distance_map(problem), coordinates, points
+    if isinstance(source, str):
+        names, longitudes, latitudes = IOManager().read_coordinates(source)
+    else:
+        names = [city[0] for city in source]
+        longitudes = np.array([float(city[1]) for city in source], dtype=np.float64)
+        latitudes = np.array([float(city[2]) for city in source], dtype=np.float64)
+    distanceMap = build_distance_data(latitudes, longitudes, cacheDir=cacheDir, metric=metric)
+    return names, distanceMap, np.column_stack((longitudes, latitudes)), sphere_points(latitudes, longitudes)
+
+def solve(cities, algorithm="hill_climbing", iterations=2000, rounds=5, seed=None, time_limit=None, workers=None, cache_dir=None,
+          max_steps=None, max_restarts=None, patience=None, min_improvement=0.0, start="random", sample_fraction=None,
+          islands=None, migration_interval=MIGRATION_INTERVAL, checkpoint=None, checkpoint_interval=60.0, checkpoint_block=None,
+          resume=False, report_gap=False, target_gap=None, metric="haversine"):
+    """
+    Run restart search on a set of cities without any prompts or plots.
+    :param cities: A list of city tuples composed of (cityname, longitude, latitude), a path to a city file,
+                   or a path to a TSPLIB .tsp file.
+    :param algorithm: One of ALGORITHMS.
+    :param iterations: The number of restarts per round.
+    :param rounds: The number of rounds.
+    :param seed: The seed for the whole run. None picks a fresh seed, which is reported in the result.
+    :param time_limit: Stop starting new restarts after this many seconds. At least one restart always runs.
+                       Annealing and late acceptance split it evenly over the restarts each worker runs.
+    :param workers: The number of worker processes. Defaults to every core. Genetic restarts always run in this
+                    process, since each one already uses every core.
+    :param cache_dir: Reuse distance matrices saved in this directory, see distance_cache. None always builds.
+    :param max_steps: Climb every hill climbing restart to a local optimum, applying at most this many swaps.
+                      None stops each restart after its first improving swap.
+    :param max_restarts: Stop after this many restarts in total.
+    :param patience: Stop once this many restarts in a row have not improved the best distance.
+                     Each worker counts its own restarts, so a stalled round runs at most workers * patience.
+    :param min_improvement: The relative improvement that counts as progress for patience, e.g. 0.001 for 0.1%.
+    :param start: How each restart's tour is built, one of initial_tours.START_TOURS. Every heuristic but random
+                  needs city coordinates, so explicit TSPLIB matrices only support random.
+    :param sample_fraction: Gradient descent samples this share of the city count in random swaps per step,
+                            e.g. 0.5 for n / 2. None samples 500.
+    :param islands: Run this many islands of iterated local search instead of independent restarts, sharing the best tours
+                    every migration_interval kicks, see islands.IslandModel. The iterations * rounds climbs are split
+                    over the islands and round_distances holds each island's best. Needs a dense distance matrix.
+    :param checkpoint: Save the search state to this file every checkpoint_interval seconds and when it ends.
+                       Each round then runs in blocks of checkpoint_block restarts, see checkpoint. Every block has its
+                       own seed, so a seed gives a different tour with a checkpoint than without one.
+    :param checkpoint_interval: The least seconds between checkpoints.
+    :param checkpoint_block: Restarts per block, the most work a crash loses between checkpoints.
+                             Defaults to a hundredth of a round rounded up to a multiple of the workers.
+    :param resume: Continue from the checkpoint file if it exists. The run must use the same cities and settings,
+                   and ends with the same result as if it had never stopped, unless a time limit cut it short.
+    :param report_gap: Compute the Held-Karp lower bound before the search and report it as lower_bound, with the
+                       best tour's gap above it as gap. Needs a dense distance matrix, see lower_bound.
+    :param target_gap: Stop once the best tour is within this gap of the lower bound, e.g. 0.02 for 2%,
+                       with stop_reason "target_reached". Implies report_gap.
+    :param metric: The distance metric for city files, one of distance_metrics.GEOGRAPHIC_METRICS.
+    :return: A JSON serializable dictionary describing the best tour and how it was found.
+             stop_reason says which budget, stall or target ended the run early, or is None if every restart ran.
+             metrics holds the counters, timers and throughput of the run, see metrics.Metrics.report().
+    """
+    startTime = time()
+    metrics = Metrics()
+    with metrics.compile_timer(), metrics.timer("distance_build"):
+        names, distanceMap, _, points = load_instance(cities, cache_dir, metric)
+    return solve_instance(names, distanceMap, algorithm, iterations, rounds, seed, time_limit, workers, startTime, max_steps,
+                          max_restarts, patience, min_improvement, metrics, start, points, sample_fraction, None, islands,
+                          migration_interval, checkpoint, checkpoint_interval, checkpoint_block, resume, report_gap, target_gap,
+                          None if _is_tsplib(cities) else metric)
+
+def solve_instance(names, distanceMap, algorithm="hill_climbing", iterations=2000, rounds=5, seed=None, time_limit=None, workers=None,
+                   startTime=None, max_steps=None, max_restarts=None, patience=None, min_improvement=0.0, metrics=None,
+                   start="random", points=None, sample_fraction=None, cancelled=None, islands=None, migration_interval=MIGRATION_INTERVAL,
+                   checkpoint=None, checkpoint_interval=60.0, checkpoint_block=None, resume=False, report_gap=False, target_gap=None,
+                   metric=None):
+    """
+    Run restart search on cities that are already loaded. Takes the same options as solve().
+    :param names: A list of city names.
+    :param distanceMap: The distance matrix or backend.
+    :param startTime: When the solve started, for the run time and time limit. Defaults to now.
+    :param metrics: A metrics.Metrics to add this run to, e.g. one that already timed the distance build.
+    :param points: The (n, 3) city positions from load_instance(), needed by every start but random.
+    :param cancelled: A function returning True to abandon the search after the current restarts,
+                      see stopping.StoppingPolicy. The best tour so far is returned with stop_reason "cancelled".
+    :param metric: The metric the distances were built with, only recorded in checkpoints so a resume must match it.
+    :return: A JSON serializable dictionary describing the best tour and how it was found.
+    """
+    startTime = time() if startTime is None else startTime
+    metrics = Metrics() if metrics is None else metrics
+    with metrics.compile_timer():
+        result = _search(names, distanceMap, algorithm, iterations, rounds, seed, time_limit, workers, startTime,
+                         max_steps, max_restarts, patience, min_improvement, metrics, start, points, sample_fraction, cancelled,
+                         islands, migration_interval, checkpoint, checkpoint_interval, checkpoint_block, resume, report_gap,
+                         target_gap, metric)
+    metrics.rate("restarts_per_second", "restarts", "search")
+    metrics.rate("evaluations_per_second", "evaluations", "search")
+    result["metrics"] = metrics.report()
+    result["run_time"] = round(time() - startTime, 3)
+    return result
+
+def _search(names, distanceMap, algorithm, iterations, rounds, seed, time_limit, workers, startTime,
+            max_steps, max_restarts, patience, min_improvement, metrics, start, points, sample_fraction, cancelled,
+            islands, migration_interval, checkpoint, checkpoint_interval, checkpoint_block, resume, report_gap, target_gap, metric):
+    """
+    The rounds of restarts behind solve_instance(), counted into metrics.
+    """
+    if start not in START_TOURS:
+        raise ValueError(f"Unknown start tour '{start}', expected one of {', '.join(START_TOURS)}.")
+    if start != "random" and points is None:
+        raise ValueError(f"The {start} start tour needs city coordinates, which explicit distance matrices do not have.")
+    if islands is not None and patience is not None:
+        raise ValueError("The island model stops on time or evaluations, not patience.")
+    if islands is not None and checkpoint is not None:
+        raise ValueError("Checkpoints are only supported by restart search, not the island model.")
+    citiesIdx = np.arange(len(names))
+    workers = workers or os.cpu_count() or 1
+    if algorithm == "genetic" and islands is None:
+        # The genetic kernels already run on every core in threads, and a process that forks after starting them
+        # hangs at exit, so its restarts run one after another in this process instead of in a worker pool.
+        workers = 1
+    saved = None
+    if checkpoint is not None:
+        # The first and last rows of distances catch any other difference in how the distances were built,
+        # e.g. two TSPLIB files with the same city count.
+        fingerprint = hashlib.sha256(distance_rows(distanceMap, 0, 1).tobytes() +
+                                     distance_rows(distanceMap, len(names) - 1, len(names)).tobytes()).hexdigest()
+        settings = settings_string(cities=len(names), names=hashlib.sha256("\n".join(names).encode()).hexdigest(),
+                                   algorithm=algorithm, iterations=iterations, rounds=rounds, start=start, workers=workers,
+                                   max_steps=max_steps, sample_fraction=sample_fraction, metric=metric,
+                                   backend=type(distanceMap).__name__, dtype=str(getattr(distanceMap, "dtype", None)),
+                                   distances=fingerprint)
+        if resume and os.path.exists(checkpoint):
+            saved = read_checkpoint(checkpoint)
+            if str(saved["settings"]) != settings:
+                raise ValueError(f"{checkpoint} was saved by a run with other cities or settings.")
+            if seed is not None and int(str(saved["seed"])) != seed:
+                raise ValueError(f"{checkpoint} was saved by a run with seed {saved['seed']}.")
+            seed = int(str(saved["seed"]))
+            startTime -= float(saved["elapsed"])
+            checkpoint_block = int(saved["block"])
+        elif checkpoint_block is None:
+            checkpoint_block = math.ceil(math.ceil(iterations / 100) / workers) * workers
+    bound = None
+    if report_gap or target_gap is not None:
+        with metrics.timer("lower_bound"):
+            bound = lower_bound(distanceMap)
+    target = None if target_gap is None else bound * (1.0 + target_gap)
+    policy = StoppingPolicy(time_limit, max_restarts, patience, min_improvement, cancelled, target).start(startTime)
+
+    epochs = None if islands is None else max(1, math.ceil(policy.remaining_restarts(iterations * rounds) / islands))
+    restartTime = None
+    if time_limit is not None and algorithm in BUDGETED_ALGORITHMS:
+        restartTime = time_limit / (epochs or rounds * math.ceil(iterations / workers))
+    with metrics.timer("setup"):
+        climb, climbArgs = _climb_for(algorithm, distanceMap, restartTime, max_steps, sample_fraction)
+        startTour = None if start == "random" else StartTour(start, points)
+    # Budgeted engines compile on a single move or generation instead of spending a whole restart budget.
+    warmUpArgs = None
+    if algorithm == "genetic":
+        warmUpArgs = {"timeLimit": None, "maxGenerations": 1}
+    elif algorithm in BUDGETED_ALGORITHMS:
+        warmUpArgs = {"timeLimit": None, "maxMoves": 1}
+
+    seedSequence = np.random.SeedSequence(seed)
+    roundSeeds = seedSequence.generate_state(rounds)
+
+    absBestDistance = np.inf
+    absBestSolution = None
+    roundDistances = []
+    recorder = ConvergenceRecorder()
+    restarts = 0
+    roundRestarts = []
+    steps = []
+    if islands is not None:
+        # Each island loads its kernels after the fork, so there is no warm-up here.
+        with metrics.timer("setup"):
+            model = IslandModel(climb, citiesIdx, distanceMap, islands, migration_interval, start=startTour, **climbArgs)
+        with model, metrics.timer("search"):
+            timeLeft = None if policy.deadline is None else max(policy.deadline - time(), 0.0)
+            absBestSolution, absBestDistance = model.run(epochs, seed=int(roundSeeds[0]), timeLimit=timeLeft)
+        for trace in model.traces:
+            roundDistances.append(float(trace[-1]))
+            roundRestarts.append(len(trace))
+            recorder.record_trace(trace)
+            restarts += len(trace)
+        policy.update(absBestDistance, restarts)
+        metrics.count("evaluations", model.counters[EVALUATIONS])
+        metrics.count("accepted_moves", model.counters[ACCEPTED])
+        metrics.count("migrations", model.migrations)
+        return _result(names, algorithm, start, iterations, rounds, seedSequence, restarts, absBestDistance, absBestSolution,
+                       roundDistances, roundRestarts, recorder, policy, metrics, bound)
+
+    with metrics.timer("warm_up"):
+        executor = RestartExecutor(climb, citiesIdx, distanceMap, workers=workers, warmUpArgs=warmUpArgs, start=startTour,
+                                   recordSteps=max_steps is not None, **climbArgs)
+    # The round in progress: its restart count (None between rounds), restarts done, trace and best tour.
+    r = 0
+    count = None
+    done = 0
+    traces = []
+    roundBestDist = np.inf
+    roundBestSolution = None
+    finished = False
+    if saved is not None:
+        r = int(saved["round"])
+        count = None if int(saved["count"]) < 0 else int(saved["count"])
+        done = int(saved["done"])
+        traces = [saved["round_trace"]]
+        roundBestDist = float(saved["round_best_distance"])
+        roundBestSolution = saved["round_best_tour"] if len(saved["round_best_tour"]) else None
+        absBestDistance = float(saved["best_distance"])
+        absBestSolution = saved["best_tour"] if len(saved["best_tour"]) else None
+        roundDistances = saved["round_distances"].tolist()
+        roundRestarts = saved["round_restarts"].tolist()
+        restarts = int(saved["restarts"])
+        if max_steps is not None:
+            steps = [saved["steps"]]
+        executor.counters += saved["counters"]
+        recorder = ConvergenceRecorder.from_dict({"iterations": saved["convergence_iterations"],
+                                                  "distances": saved["convergence_distances"],
+                                                  "round_starts": saved["convergence_round_starts"].tolist()},
+                                                 capacity=recorder.capacity)
+        policy.restarts = int(saved["policy_restarts"])
+        policy.lastImprovement = int(saved["last_improvement"])
+        policy.best = float(saved["policy_best"])
+        policy.reason = str(saved["reason"]) or None
+        finished = bool(saved["finished"])
+
+    def snapshot():
+        state = {
+            "settings": settings, "seed": str(seedSequence.entropy), "block": checkpoint_block, "elapsed": time() - startTime,
+            "round": r, "count": -1 if count is None else count, "done": done,
+            "round_trace": np.concatenate(traces) if traces else np.empty(0),
+            "round_best_distance": roundBestDist,
+            "round_best_tour": np.empty(0, dtype=np.int64) if roundBestSolution is None else roundBestSolution,
+            "best_distance": absBestDistance,
+            "best_tour": np.empty(0, dtype=np.int64) if absBestSolution is None else absBestSolution,
+            "round_distances": np.array(roundDistances, dtype=np.float64),
+            "round_restarts": np.array(roundRestarts, dtype=np.int64),
+            "restarts": restarts, "counters": executor.counters.copy(),
+            "convergence_iterations": recorder.iterations[:recorder.size].copy(),
+            "convergence_distances": recorder.distances[:recorder.size].copy(),
+            "convergence_round_starts": np.array(recorder.roundStarts, dtype=np.int64),
+            "policy_restarts": policy.restarts, "last_improvement": policy.lastImprovement, "policy_best": policy.best,
+            "reason": policy.reason or "", "finished": finished,
+        }
+        if max_steps is not None:
+            state["steps"] = np.concatenate(steps) if steps else np.empty(0, dtype=np.int64)
+        return state
+
+    checkpointer = None if checkpoint is None else Checkpointer(checkpoint, checkpoint_interval)
+    # Compiles in the search timer are kernels the warm-up missed, which the jit_compile timer also shows.
+    with executor, metrics.timer("search"):
+        while r < rounds and not finished:
+            if count is None:
+                if r > 0 and policy.should_stop():
+                    break
+                # The first round always runs at least one restart, so there is always a tour to return.
+                count = max(1, policy.remaining_restarts(iterations))
+            if checkpointer is None:
+                size = count
+                blockSeed = int(roundSeeds[r])
+            else:
+                # Every block has its own seed, so a resumed round repeats the blocks it has not finished exactly.
+                size = min(checkpoint_block, count - done)
+                blockSeed = int(np.random.SeedSequence(int(roundSeeds[r]), spawn_key=(done // checkpoint_block,)).generate_state(1)[0])
+            bestSolution, bestDist, trace = executor.run(size, seed=blockSeed, policy=policy)
+            traces.append(trace)
+            done += len(trace)
+            if max_steps is not None:
+                steps.append(executor.steps)
+            if bestDist < roundBestDist:
+                roundBestDist = bestDist
+                roundBestSolution = bestSolution
+            if done >= count or len(trace) < size or policy.should_stop():
+                roundTrace = np.minimum.accumulate(np.concatenate(traces))
+                roundDistances.append(float(roundBestDist))
+                roundRestarts.append(len(roundTrace))
+                recorder.record_trace(roundTrace, restarts)
+                restarts += len(roundTrace)
+                # Track the absolute best solution and distance
+                if roundBestDist < absBestDistance:
+                    absBestDistance = roundBestDist
+                    absBestSolution = roundBestSolution
+                r += 1
+                count = None
+                done = 0
+                traces = []
+                roundBestDist = np.inf
+                roundBestSolution = None
+            if checkpointer is not None and checkpointer.due():
+                checkpointer.save(snapshot())
+        if checkpointer is not None:
+            finished = True
+            with checkpointer:
+                checkpointer.save(snapshot(), wait=True)
+            metrics.count("checkpoints", checkpointer.written)
+        metrics.count("evaluations", executor.counters[EVALUATIONS])
+        metrics.count("accepted_moves", executor.counters[ACCEPTED])
+
+    result = _result(names, algorithm, start, iterations, rounds, seedSequence, restarts, absBestDistance, absBestSolution,
+                     roundDistances, roundRestarts, recorder, policy, metrics, bound)
+    if max_steps is not None:
+        result["steps"] = [int(step) for chunk in steps for step in chunk] # Steps to convergence per restart, in trace order
+    return result
+
+def _result(names, algorithm, start, iterations, rounds, seedSequence, restarts, absBestDistance, absBestSolution,
+            roundDistances, roundRestarts, recorder, policy, metrics, bound=None):
+    """
+    The JSON serializable result dictionary shared by the restart and island searches.
+    """
+    metrics.count("restarts", restarts)
+    result = {
+        "algorithm": algorithm,
+        "start": start,
+        "iterations": iterations,
+        "rounds": rounds,
+        "seed": seedSequence.entropy,
+        "restarts": restarts,
+        "distance": float(absBestDistance),
+        "tour": [int(city) for city in absBestSolution],
+        "cities": [names[int(city)] for city in absBestSolution],
+        "round_distances": roundDistances,
+        "round_restarts": roundRestarts,
+        "convergence": recorder.to_dict(),
+        "stop_reason": policy.reason,
+    }
+    if bound is not None:
+        result["lower_bound"] = bound
+        result["gap"] = optimality_gap(float(absBestDistance), bound)
+    return result
+
+def plot_result(result, filepath=None, background=False):
+    """
+    Plot the best-so-far convergence of a solve result in the same style as the interactive drivers.
+    :param result: The dictionary returned by solve().
+    :param filepath: Save the figure to this file, as PNG, SVG or any format matplotlib knows. None opens a window instead.
+    :param background: Render the file in a separate process, see convergence.render.
+    :return: A Future when rendering in the background, otherwise None.
+    """
+    recorder = ConvergenceRecorder.from_dict(result["convergence"])
+    title = result["algorithm"].replace("_", " ").title()
+    subtitle = f"Rounds: {result['rounds']}     Iterations: {result['iterations']}"
+    if filepath is not None:
+        rendered = render(recorder, filepath, title, subtitle, background)
+        return rendered if background else None
+
+    from matplotlib import pyplot as plt
+    plt.style.use("ggplot")
+    fig, ax = plt.subplots(figsize=(8,6))
+    plot_convergence(ax, recorder)
+    plt.suptitle(title, fontsize=24)
+    ax.set_title(subtitle, fontsize=12)
+    plt.xlabel("Iterations", fontsize=16)
+    plt.ylabel("Shortest Distance (km)", fontsize=16)
+    plt.tick_params(axis="both", which="major", labelsize=12)
+    plt.autoscale()
+    plt.tight_layout()
+    plt.show()
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Solve the traveling salesman problem without prompts.")
+    parser.add_argument("file", help="City file with a header line, then cityname,longitude,latitude per line, or a TSPLIB .tsp file.")
+    parser.add_argument("-a", "--algorithm", choices=ALGORITHMS, default="hill_climbing")
+    parser.add_argument("-i", "--iterations", type=int, default=2000, help="Restarts per round (default 2000).")
+    parser.add_argument("-r", "--rounds", type=int, default=5, help="Number of rounds (default 5).")
+    parser.add_argument("-s", "--seed", type=int, default=None, help="Seed for a reproducible run.")
+    parser.add_argument("-t", "--time-limit", type=float, default=None, help="Stop starting new restarts after this many seconds.")
+    parser.add_argument("--max-restarts", type=int, default=None, help="Stop after this many restarts in total.")
+    parser.add_argument("--patience", type=int, default=None,
+                        help="Stop after this many restarts in a row without an improvement, counted per worker.")
+    parser.add_argument("--min-improvement", type=float, default=0.0, help="Relative improvement that resets --patience (default 0).")
+    parser.add_argument("--start", choices=START_TOURS, default="random",
+                        help="How each restart's tour is built (default random). The others need city coordinates.")
+    parser.add_argument("--to-optimum", action="store_true", help="Climb every hill climbing restart to a local optimum.")
+    parser.add_argument("--max-steps", type=int, default=MAX_CLIMB_STEPS, help=f"Cap on swaps per restart with --to-optimum (default {MAX_CLIMB_STEPS}).")
+    parser.add_argument("--sample-fraction", type=float, default=None,
+                        help="Swaps gradient descent samples per step, as a share of the city count (default 500 swaps).")
+    parser.add_argument("--islands", type=int, default=None,
+                        help="Run this many islands of iterated local search that share their best tours instead of independent restarts.")
+    parser.add_argument("--migration-interval", type=int, default=MIGRATION_INTERVAL,
+                        help=f"Kicks between migrations with --islands (default {MIGRATION_INTERVAL}).")
+    parser.add_argument("--checkpoint", default=None, metavar="PATH",
+                        help="Save the search state to PATH periodically and at the end. Restarts then run in separately "
+                             "seeded blocks, so a --seed gives a different tour than without --checkpoint.")
+    parser.add_argument("--checkpoint-interval", type=float, default=60.0, help="Least seconds between checkpoints (default 60).")
+    parser.add_argument("--resume", action="store_true", help="Continue from the --checkpoint file if it exists.")
+    parser.add_argument("--gap", action="store_true", help="Report the Held-Karp lower bound and the best tour's gap above it.")
+    parser.add_argument("--target-gap", type=float, default=None,
+                        help="Stop once the best tour is within this gap of the lower bound, e.g. 0.02 for 2%%.")
+    parser.add_argument("--metric", choices=GEOGRAPHIC_METRICS, default="haversine",
+                        help="Distance metric for city files (default haversine). TSPLIB files use their own.")
+    parser.add_argument("-w", "--workers", type=int, default=None, help="Worker processes (default every core, genetic always uses one).")
+    parser.add_argument("--no-cache", action="store_true", help="Always rebuild the distance matrix instead of using the on-disk cache.")
+    parser.add_argument("--cache-dir", default=None, help="Distance matrix cache directory (default $TSP_DISTANCE_CACHE or ~/.cache/tsp_distances).")
+    parser.add_argument("-o", "--output", default=None, help="Write the JSON result here instead of stdout.")
+    parser.add_argument("--write-solution", action="store_true", help="Also write the best tour like the interactive drivers do.")
+    parser.add_argument("--plot", default=None, metavar="PATH", help="Save a convergence plot to PATH.")
+    parser.add_argument("--show", action="store_true", help="Open the convergence plot in a window.")
+    parser.add_argument("--metrics", default=None, metavar="PATH", help="Write the counters and timers of the run to PATH as JSON.")
+    parser.add_argument("--prometheus", default=None, metavar="PATH", help="Write the counters and timers in the Prometheus text format to PATH.")
+    args = parser.parse_args(argv)
+    if args.iterations <= 0 or args.rounds <= 0:
+        parser.error("iterations and rounds must be positive integers.")
+    if args.to_optimum and args.algorithm != "hill_climbing":
+        parser.error("--to-optimum is only supported by hill_climbing.")
+    if args.max_steps <= 0:
+        parser.error("max-steps must be a positive integer.")
+    if args.sample_fraction is not None and args.algorithm != "gradient_descent":
+        parser.error("--sample-fraction is only supported by gradient_descent.")
+    if args.islands is not None and (args.islands <= 0 or args.migration_interval <= 0):
+        parser.error("islands and migration-interval must be positive integers.")
+    if args.target_gap is not None and args.target_gap < 0:
+        parser.error("target-gap must not be negative.")
+    if args.resume and args.checkpoint is None:
+        parser.error("--resume needs the --checkpoint file to continue from.")
+    if args.islands is not None and args.checkpoint is not None:
+        parser.error("--checkpoint is only supported by restart search, not --islands.")
+    if args.islands is not None and args.patience is not None:
+        parser.error("--islands stops on time or evaluations, not --patience.")
+    if args.sample_fraction is not None and args.sample_fraction <= 0:
+        parser.error("sample-fraction must be positive.")
+    return args
+
+def main(argv=None):
+    args = parse_args(argv)
+    startTime = time()
+    cacheDir = None if args.no_cache else (args.cache_dir or default_cache_dir())
+    metrics = Metrics()
+    with metrics.compile_timer(), metrics.timer("distance_build"):
+        names, distanceMap, coordinates, points = load_instance(args.file, cacheDir, args.metric)
+    result = solve_instance(names, distanceMap, algorithm=args.algorithm, iterations=args.iterations, rounds=args.rounds,
+                            seed=args.seed, time_limit=args.time_limit, workers=args.workers, startTime=startTime,
+                            max_steps=args.max_steps if args.to_optimum else None, max_restarts=args.max_restarts,
+                            patience=args.patience, min_improvement=args.min_improvement, metrics=metrics,
+                            start=args.start, points=points, sample_fraction=args.sample_fraction, islands=args.islands,
+                            migration_interval=args.migration_interval, checkpoint=args.checkpoint,
+                            checkpoint_interval=args.checkpoint_interval, resume=args.resume, report_gap=args.gap,
+                            target_gap=args.target_gap, metric=None if _is_tsplib(args.file) else args.metric)
+
+    if args.write_solution:
+        if coordinates is None:
+            citiesMap = {city: (names[city],) for city in result["tour"]}
+        else:
+            citiesMap = {city: (names[city], *coordinates[city]) for city in result["tour"]}
+        IOManager().write_file(args.algorithm, args.file, int(result["distance"]), result["tour"], citiesMap)
+    if args.metrics is not None:
+        metrics.write_json(args.metrics)
+    if args.prometheus is not None:
+        metrics.write_prometheus(args.prometheus, {"algorithm": args.algorithm, "instance": os.path.basename(args.file)})
+    # The plot file renders in the background while the result is written.
+    rendering = None if args.plot is None else plot_result(result, args.plot, background=True)
+    if args.show:
+        plot_result(result)
+
+    if args.output is None:
+        json.dump(result, sys.stdout)
+        sys.stdout.write("\n")
+    else:
+        with open(args.output, mode='w') as outfile:
+            json.dump(result, outfile)
+    if rendering is not None:
+        rendering.result()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+# coding=utf-8
+
+import numpy as np
+from numba import njit
+
+"""
+A compiled KD-tree over city positions embedded in 3-D, for nearest-city queries without a distance matrix.
+Geographic cities are placed on the unit sphere, where straight-line (chord) distance grows with
+great-circle distance, so the nearest point in 3-D is also the nearest city on the globe.
+
+The tree is implicit: the node covering positions [lo, hi) of order holds the city at mid = (lo + hi) // 2,
+split on dims[mid], with its children covering [lo, mid) and [mid + 1, hi). remaining[mid] counts the cities
+of the node that have not been removed, so queries for the nearest unvisited city skip emptied subtrees.
+"""
+
+# Deep enough for any tree that fits in memory. The depth of a balanced tree of n cities is log2(n) + 1.
+STACK_SIZE = 128
+
+def sphere_points(latitudes, longitudes):
+    """
+    Place cities on the unit sphere.
+    :param latitudes: An array of latitudes in degrees.
+    :param longitudes: An array of longitudes in degrees.
+    :return: An (n, 3) float64 array.
+    """
+    lat = np.deg2rad(np.asarray(latitudes, dtype=np.float64))
+    lng = np.deg2rad(np.asarray(longitudes, dtype=np.float64))
+    cosLat = np.cos(lat)
+    return np.ascontiguousarray(np.column_stack((cosLat * np.cos(lng), cosLat * np.sin(lng), np.sin(lat))))
+
+def plane_points(x, y):
+    """
+    Place cities with planar coordinates, like TSPLIB EUC_2D, in the z = 0 plane.
+    :return: An (n, 3) float64 array.
+    """
+    x = np.asarray(x, dtype=np.float64)
+    return np.ascontiguousarray(np.column_stack((x, np.asarray(y, dtype=np.float64), np.zeros_like(x))))
+
+@njit(cache=True)
+def build_kdtree(points):
+    """
+    Build the tree by splitting every node at the median of its widest axis.
+    :param points: An (n, 3) array of positions.
+    :return: order, the cities in tree order; dims, the split axis of each node; positionOf, the inverse of order;
+             and remaining, the number of cities under each node.
+    """
+    n = len(points)
+    order = np.arange(n)
+    dims = np.zeros(n, dtype=np.int64)
+    remaining = np.zeros(n, dtype=np.int64)
+    stack = [(0, n)]
+    while len(stack) > 0:
+        lo, hi = stack.pop()
+        if hi <= lo:
+            continue
+        mid = (lo + hi) // 2
+        remaining[mid] = hi - lo
+        cities = order[lo:hi]
+        best = 0
+        widest = -1.0
+        for dim in range(3):
+            values = points[cities, dim]
+            spread = values.max() - values.min()
+            if spread > widest:
+                widest = spread
+                best = dim
+        order[lo:hi] = cities[np.argsort(points[cities, best])]
+        dims[mid] = best
+        stack.append((lo, mid))
+        stack.append((mid + 1, hi))
+    positionOf = np.empty(n, dtype=np.int64)
+    positionOf[order] = np.arange(n)
+    return order, dims, positionOf, remaining
+
+@njit(cache=True)
+def remove_city(city, positionOf, remaining, alive):
+    """
+    Mark a city as visited so queries that skip removed cities no longer return it. O(log n).
+    """
+    position = positionOf[city]
+    lo = 0
+    hi = len(positionOf)
+    while hi > lo:
+        mid = (lo + hi) // 2
+        remaining[mid] -= 1
+        if position == mid:
+            break
+        if position < mid:
+            hi = mid
+        else:
+            lo = mid + 1
+    alive[city] = False
+
+@njit(cache=True)
+def query_nearest(points, order, dims, remaining, alive, query, exclude, nearest, distances):
+    """
+    Find the cities closest to a position among those still alive.
+    :param query: The (3,) position to search around.
+    :param exclude: A city never returned, usually the query city itself. -1 for none.
+    :param nearest: The output array of cities, nearest first. Its length is the number of cities wanted.
+                    Unfilled slots are -1.
+    :param distances: The output array of squared straight-line distances, the same length as nearest.
+    :return: The number of cities found.
+    """
+    k = len(nearest)
+    nearest[:] = -1
+    distances[:] = np.inf
+    found = 0
+    stackLo = np.empty(STACK_SIZE, dtype=np.int64)
+    stackHi = np.empty(STACK_SIZE, dtype=np.int64)
+    stackBound = np.empty(STACK_SIZE, dtype=np.float64)
+    stackLo[0] = 0
+    stackHi[0] = len(order)
+    stackBound[0] = 0.0
+    size = 1
+    while size > 0:
+        size -= 1
+        lo = stackLo[size]
+        hi = stackHi[size]
+        bound = stackBound[size] # No city under the node is closer than this
+        if hi <= lo or bound >= distances[k - 1]:
+            continue
+        mid = (lo + hi) // 2
+        if remaining[mid] == 0:
+            continue
+        city = order[mid]
+        if alive[city] and city != exclude:
+            d = 0.0
+            for dim in range(3):
+                diff = query[dim] - points[city, dim]
+                d += diff * diff
+            if d < distances[k - 1]:
+                # Insert into the sorted result
+                slot = k - 1
+                while slot > 0 and distances[slot - 1] > d:
+                    distances[slot] = distances[slot - 1]
+                    nearest[slot] = nearest[slot - 1]
+                    slot -= 1
+                distances[slot] = d
+                nearest[slot] = city
+                found = min(found + 1, k)
+        diff = query[dims[mid]] - points[city, dims[mid]]
+        # Push the far side first so the near side is searched first and tightens the bound.
+        if diff < 0.0:
+            stackLo[size] = mid + 1
+            stackHi[size] = hi
+            stackLo[size + 1] = lo
+            stackHi[size + 1] = mid
+        else:
+            stackLo[size] = lo
+            stackHi[size] = mid
+            stackLo[size + 1] = mid + 1
+            stackHi[size + 1] = hi
+        stackBound[size] = max(bound, diff * diff)
+        stackBound[size + 1] = bound
+        size += 2
+    return found
+
+@njit(cache=True)
+def nearest_neighbor_lists(points, order, dims, remaining, k):
+    """
+    Find the k nearest cities of every city, nearest first, in O(n log n).
+    :return: An (n, k) int64 array in the same format as local_search.build_neighbor_lists.
+    """
+    n = len(points)
+    alive = np.ones(n, dtype=np.bool_)
+    neighbors = np.empty((n, k), dtype=np.int64)
+    distances = np.empty(k, dtype=np.float64)
+    for city in range(n):
+        query_nearest(points, order, dims, remaining, alive, points[city], city, neighbors[city], distances)
+    return neighbors
+
+class KDTree:
+    """
+    The tree arrays for one set of points, built once and shared by every tour built from them.
+    """
+
+    def __init__(self, points):
+        self.points = np.ascontiguousarray(points, dtype=np.float64)
+        self.order, self.dims, self.positionOf, self.remaining = build_kdtree(self.points)
+
+    def __len__(self):
+        return len(self.points)
+
+    def neighbor_lists(self, k=10):
+        """
+        :return: An (n, k) array of every city's k nearest cities, nearest first.
+        """
+        k = max(1, min(k, len(self) - 1))
+        return nearest_neighbor_lists(self.points, self.order, self.dims, self.remaining, k)
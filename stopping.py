@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+# coding=utf-8
+
+import copy
+from time import time
+import numpy as np
+
+"""
+Stopping rules shared by the search loops, so a run returns its best-so-far tour as soon as
+a budget runs out or the search stalls instead of always finishing every restart.
+"""
+
+class StoppingPolicy:
+    """
+    When to stop a search: a wall-clock deadline, a cap on restarts, a stall, a good enough tour, or a cancel request.
+    The search has stalled when the last `patience` restarts did not improve the best distance
+    by at least `minImprovement` of itself.
+    The restarts are counted by the loop, not by the distance kernels, whose tsp.EVALUATIONS counter counts moves.
+    Annealing and genetic, which take a policy directly, count each move or each evaluated tour as one restart.
+
+    The policy itself only holds the settings. Call start() for a running copy, then update() it
+    after every restart or batch and stop once it returns True. reason says which rule fired.
+    Parallel runs give every worker its own running copy, and the copies share nothing while the workers run,
+    so patience counts each worker's own restarts: with N workers a stalled batch can run up to N * patience restarts
+    before every worker has given up. The batch is then recorded in the caller's copy.
+    """
+
+    def __init__(self, timeLimit=None, maxRestarts=None, patience=None, minImprovement=0.0, cancelled=None, target=None):
+        """
+        :param timeLimit: Stop after this many seconds.
+        :param maxRestarts: Stop after this many restarts.
+        :param patience: Stop after this many restarts in a row without an improvement.
+        :param minImprovement: The relative improvement that resets the patience count, e.g. 0.001 for 0.1%.
+        :param cancelled: A function returning True once the caller wants the search abandoned. It is called
+                          every time the rules are checked, so it must be cheap. Must be picklable for multi-worker runs.
+        :param target: Stop once the best distance is at most this, e.g. within a gap of a lower_bound.
+        """
+        self.timeLimit = timeLimit
+        self.maxRestarts = maxRestarts
+        self.patience = patience
+        self.minImprovement = minImprovement
+        self.cancelled = cancelled
+        self.target = target
+        self.deadline = None
+        self.restarts = 0
+        self.lastImprovement = 0
+        self.best = np.inf
+        self.reason = None
+
+    def start(self, startTime=None, deadline=None, best=np.inf):
+        """
+        Copy the policy and start its clock and counters.
+        :param startTime: When the search started, for the time limit. Defaults to now.
+        :param deadline: A time() to stop at, if sooner than the time limit.
+        :param best: The best distance found before this search, which improvements are measured against.
+        :return: The running copy.
+        """
+        running = copy.copy(self)
+        startTime = time() if startTime is None else startTime
+        deadlines = [d for d in (deadline, None if self.timeLimit is None else startTime + self.timeLimit) if d is not None]
+        running.deadline = min(deadlines) if deadlines else None
+        running.restarts = 0
+        running.lastImprovement = 0
+        running.best = best
+        running.reason = None
+        return running
+
+    def update(self, distance, restarts=1):
+        """
+        Record the best distance after some more restarts.
+        :param distance: The best distance found by the restarts.
+        :param restarts: How many restarts produced it.
+        :return: True if the search should stop.
+        """
+        self.restarts += restarts
+        if distance < self.best:
+            if distance <= self.best * (1.0 - self.minImprovement):
+                self.lastImprovement = self.restarts
+            self.best = distance
+        return self.should_stop()
+
+    def should_stop(self):
+        """
+        Check the rules without recording anything, and set reason when one fires.
+        :return: True if the search should stop.
+        """
+        if self.reason is not None:
+            return True
+        if self.cancelled is not None and self.cancelled():
+            self.reason = "cancelled"
+        elif self.target is not None and self.best <= self.target:
+            self.reason = "target_reached"
+        elif self.deadline is not None and time() >= self.deadline:
+            self.reason = "time_limit"
+        elif self.maxRestarts is not None and self.restarts >= self.maxRestarts:
+            self.reason = "max_restarts"
+        elif self.patience is not None and self.restarts - self.lastImprovement >= self.patience:
+            self.reason = "stalled"
+        return self.reason is not None
+
+    def remaining_restarts(self, default):
+        """
+        How many more restarts the budget allows, capped at default.
+        """
+        if self.maxRestarts is None:
+            return default
+        return max(0, min(default, self.maxRestarts - self.restarts))
@@ -0,0 +1,29 @@
+#!/usr/bin/env python3
+# coding=utf-8
+
+import os
+import secrets
+
+"""
+Temporary files for atomic writes: write to a unique name next to the target, then os.replace it over the target.
+Unlike tempfile.mkstemp, which always creates private 0600 files, the file gets the mode open() gives any new file,
+0666 less the process umask, so the renamed file is as readable as if it had been written in place.
+"""
+
+# Fresh names to try before giving up, as in tempfile.
+TEMP_ATTEMPTS = 10000
+
+def create_temp_file(directory, prefix="", suffix=".tmp"):
+    """
+    Create and open a new file with a unique name in a directory.
+    :param directory: Where to create the file, normally the target's directory so the rename is atomic.
+    :return: An open file descriptor for writing and the file's path.
+    """
+    flags = os.O_WRONLY | os.O_CREAT | os.O_EXCL | getattr(os, "O_BINARY", 0)
+    for _ in range(TEMP_ATTEMPTS):
+        path = os.path.join(directory, f"{prefix}{secrets.token_hex(8)}{suffix}")
+        try:
+            return os.open(path, flags, 0o666), path
+        except FileExistsError:
+            continue
+    raise FileExistsError(f"No unused temporary file name in {directory}.")
@@ -0,0 +1,28 @@
+#!/usr/bin/env python3
+# coding=utf-8
+
+import os
+import sys
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from distance_metrics import distance_between
+
+"""
+Vincenty distances against known WGS-84 geodesic lengths in km, including nearly antipodal pairs where
+Vincenty's iteration fails and the kernel falls back to Karney's algorithm.
+"""
+
+GEODESICS = [
+    ((-37.95103342, 144.42486789, -37.65282114, 143.92649554), 54.972270505), # Flinders Peak to Buninyong, Vincenty's example
+    ((40.6413, -73.7781, 51.4700, -0.4543), 5554.908790548), # JFK to Heathrow
+    ((0.0, 0.0, 0.0, 90.0), 10018.754171395), # A quarter of the equator
+    ((0.0, 0.0, 0.0, 180.0), 20003.931458625), # Antipodes on the equator, half a meridian
+    ((0.0, 0.0, 0.0, 179.5), 19980.861908891), # Equatorial points past (1 - f) * 180 degrees apart
+    ((0.0, 0.0, 0.5, 179.5), 19936.288578965),
+    ((10.0, 20.0, -10.0, -160.1), 20003.008421509),
+]
+
+@pytest.mark.parametrize("coordinates, expected", GEODESICS)
+def test_vincenty_matches_geodesic(coordinates, expected):
+    assert distance_between("vincenty", *coordinates) == pytest.approx(expected, abs=1e-6) # A millimeter
@@ -0,0 +1,18 @@
+#!/usr/bin/env python3
+# coding=utf-8
+
+import os
+import subprocess
+import sys
+
+"""
+The service must exit once stdin closes. Compiling a parallel kernel before forking the workers made it hang instead.
+"""
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def test_service_exits_after_stdin_closes():
+    finished = subprocess.run([sys.executable, "service.py", "--workers", "2"], cwd=ROOT, input='{"op": "list"}\n',
+                              capture_output=True, text=True, timeout=120)
+    assert finished.returncode == 0, finished.stderr
+    assert '"jobs": []' in finished.stdout
@@ -1,18 +1,26 @@
 #!/usr/bin/env python3
 # coding=utf-8
 
-import sys
-from numba import njit, types, typed
-from time import time
+from numba import njit
 import numpy as np
-from matplotlib import pyplot as plt
-from io_manager import IOManager
-import itertools
+from distance_backends import DEFAULT_MEMORY_LIMIT, select_backend, build_metric_backend
+from distance_cache import load_or_build
+from distance_metrics import distance_matrix
 
 """
 Shared functions for the traveling salesman problem.
 """
 
+# Moves must shorten the tour by more than this to count as an improvement.
+# Guards the search against cycling on floating point rounding noise.
+IMPROVEMENT_EPSILON = 1e-7
+
+# Every climb returns a counter array alongside its result, indexed by these.
+# EVALUATIONS counts scored moves and ACCEPTED counts moves applied to the tour.
+EVALUATIONS = 0
+ACCEPTED = 1
+NUM_COUNTERS = 2
+
 def build_cities_index(cities):
     """
     Index the cities into a numpy array so we can refer to cities as integers.
@@ -22,32 +30,66 @@ def build_cities_index(cities):
     citiesIdx = np.arange(0, len(cities))
     return citiesIdx
 
-def build_distance_map(cities, citiesIdx):
+def build_distance_map(cities, citiesIdx, dtype=np.float64, verbose=True, backend="auto", memoryLimit=DEFAULT_MEMORY_LIMIT, cacheDir=None,
+                       metric="haversine"):
     """
-    Calculate all pairwise distances between cities and put them in a dictionary.
+    Calculate all pairwise distances between cities and put them in a dense 2-D matrix.
+    Instances too large for the memory limit get a memory-bounded backend from distance_backends instead.
     Run this method one time before doing hill climbing iterations.
     :param cities: A list of city tuples composed of (cityname, longitude, latitude).
     :param citiesIdx: A list of cities labeled as integers.
-    :return: A dictionary of all pairwise distances between cities.
+    :param dtype: The float type of the dense matrix, np.float64 or np.float32.
+    :param verbose: Print a message when the build is done.
+    :param backend: "auto", "dense", "condensed", "haversine" or "tiled". "auto" picks by size.
+    :param memoryLimit: The budget in bytes for the distance data.
+    :param cacheDir: Load and save dense matrices in this directory, see distance_cache. None always builds.
+    :param metric: A geographic metric from distance_metrics, e.g. "haversine" or "vincenty". Only haversine is
+                   computed on the fly, so other metrics raise a ValueError when even the condensed backend exceeds memoryLimit.
+    :return: A matrix or backend where distanceMap[cityA, cityB] is the distance between two cities.
     """
     citiesMap = {}
     for i, idxNum in enumerate(citiesIdx):
         citiesMap[idxNum] = cities[i]
 
-    distanceMap = typed.Dict.empty(key_type=types.UniTuple(types.int64, 2), value_type=types.float64)
-    # Note: permutations take up 2x more memory, but the eventual lookup is 2x faster.
-    # This is because you don't need to stop, switch the tuple, and then lookup again.
-    allPermutations = itertools.permutations(citiesIdx, 2)
-    for i, each in enumerate(allPermutations):
-        cityA = each[0] # These are the numeric values of cities
-        cityB = each[1]
-
-        # Longitude then Latitude
-        distanceMap[each] = haversine(float(citiesMap[cityA][2]), float(citiesMap[cityA][1]), float(citiesMap[cityB][2]), float(citiesMap[cityB][1]))
-    print("SUCCESSFUL DISTANCE MAP BUILD")
+    # Parse the coordinates once instead of once per pair.
+    longitudes = np.array([float(cities[i][1]) for i in citiesIdx], dtype=np.float64)
+    latitudes = np.array([float(cities[i][2]) for i in citiesIdx], dtype=np.float64)
+    distanceMap = build_distance_data(latitudes, longitudes, dtype, backend, memoryLimit, cacheDir, metric)
+    if verbose:
+        print("SUCCESSFUL DISTANCE MAP BUILD")
     return distanceMap, citiesMap
 
-@njit # https://towardsdatascience.com/better-parallelization-with-numba-3a41ca69452e
+def build_distance_data(latitudes, longitudes, dtype=np.float64, backend="auto", memoryLimit=DEFAULT_MEMORY_LIMIT, cacheDir=None,
+                        metric="haversine"):
+    """
+    Build the distance matrix or backend straight from coordinate arrays, e.g. from IOManager.read_coordinates.
+    Takes the same options as build_distance_map.
+    :param latitudes: An array of latitudes in degrees.
+    :param longitudes: An array of longitudes in degrees.
+    :return: A matrix or backend where distanceMap[cityA, cityB] is the distance between two cities.
+    """
+    if backend == "auto":
+        backend = select_backend(len(latitudes), memoryLimit, np.dtype(dtype).itemsize)
+    build = lambda lat, lng, dtype: distance_matrix(metric, lat, lng, dtype)
+    if backend == "dense" and cacheDir is not None:
+        return load_or_build(latitudes, longitudes, build, cacheDir, metric, dtype)
+    if backend == "dense":
+        return build(latitudes, longitudes, dtype)
+    return build_metric_backend(metric, latitudes, longitudes, backend, memoryLimit)
+
+def haversine_matrix(latitudes, longitudes, dtype=np.float64, chunkSize=1024):
+    """
+    Calculate the haversine distance between every pair of coordinates with broadcasted passes.
+    Rows are computed in chunks so the float64 temporaries stay small next to the output matrix.
+    :param latitudes: An array of latitudes in degrees.
+    :param longitudes: An array of longitudes in degrees.
+    :param dtype: The float type of the matrix, np.float64 or np.float32.
+    :param chunkSize: The number of rows to compute at once.
+    :return: A contiguous (n, n) matrix of distances in km.
+    """
+    return distance_matrix("haversine", latitudes, longitudes, dtype, chunkSize)
+
+@njit(cache=True) # https://towardsdatascience.com/better-parallelization-with-numba-3a41ca69452e
 def haversine(s_lat, s_lng, e_lat, e_lng):
     # approximate radius of earth in km
     R = 6373.0
@@ -63,7 +105,16 @@ def haversine(s_lat, s_lng, e_lat, e_lng):
 
     return 2 * R * np.arcsin(np.sqrt(d))
 
-@njit
+@njit(cache=True)
+def seed_random(seed):
+    """
+    Seed the random number generator used inside compiled functions.
+    Numba keeps its own generator, so np.random.seed from plain Python does not affect it.
+    :param seed: An integer seed.
+    """
+    np.random.seed(seed)
+
+@njit(cache=True)
 def random_solution(citiesIdx):
     """
     Generate a random solution from a list of city indexes.
@@ -74,24 +125,63 @@ def random_solution(citiesIdx):
     np.random.shuffle(solution)
     return solution
 
-@njit
+@njit(cache=True)
+def shuffle_into(solution, citiesIdx):
+    """
+    Overwrite a preallocated tour with a random order of the cities, without allocating.
+    Draws the same random numbers as random_solution, so both give the same tour for the same seed.
+    :param solution: The tour buffer, the same length as citiesIdx. Modified in place.
+    :param citiesIdx: A list of city indexes.
+    :return: The solution buffer.
+    """
+    solution[:] = citiesIdx
+    np.random.shuffle(solution)
+    return solution
+
+@njit(cache=True)
 def total_distance(solution, distanceMap):
     """
     Calculate the total distance among a solution of cities.
-    Uses a dictionary to get lookup the each pairwise distance.
+    Uses the distance matrix to lookup each pairwise distance.
     :param solution: A list of cities in random order.
-    :distanceMap: The dictionary lookup tool.
+    :param distanceMap: The distance matrix lookup tool.
     :return: The total distance between all the cities.
     """
-    totalDistance = 0
-    for i, city in enumerate(solution[:-1]): # Stop at the second to last city.
-        cityA = city
-        cityB = solution[i + 1]
-        buildKey = (cityA, cityB)
-        totalDistance += distanceMap[buildKey]
-    # Build the key to return home
-    cityA = solution[-1]
-    cityB = solution[0]
-    goHome = (cityA, cityB)
-    totalDistance += distanceMap[goHome]
-    return totalDistance
\ No newline at end of file
+    totalDistance = 0.0
+    for i in range(len(solution) - 1): # Stop at the second to last city.
+        totalDistance += distanceMap[solution[i], solution[i + 1]]
+    # Return home
+    totalDistance += distanceMap[solution[-1], solution[0]]
+    return totalDistance
+
+@njit(cache=True)
+def swap_delta(solution, distanceMap, i, j):
+    """
+    Calculate the change in total distance from swapping the cities at positions i and j.
+    Only the edges touching the two positions are looked up, so this is O(1) instead of O(n).
+    :param solution: A list of cities in some order.
+    :param distanceMap: The distance matrix lookup tool.
+    :param i: The position of the first city to swap.
+    :param j: The position of the second city to swap.
+    :return: The new total distance minus the current total distance.
+    """
+    n = len(solution)
+    if i > j:
+        i, j = j, i
+    if i == j or n < 3:
+        return 0.0
+    a = solution[i]
+    b = solution[j]
+    prevA = solution[i - 1]
+    nextA = solution[(i + 1) % n]
+    prevB = solution[j - 1]
+    nextB = solution[(j + 1) % n]
+
+    if j - i == 1: # b directly follows a
+        return (distanceMap[prevA, b] + distanceMap[b, a] + distanceMap[a, nextB]) - \
+               (distanceMap[prevA, a] + distanceMap[a, b] + distanceMap[b, nextB])
+    if i == 0 and j == n - 1: # a directly follows b by wrapping around home
+        return (distanceMap[prevB, a] + distanceMap[a, b] + distanceMap[b, nextA]) - \
+               (distanceMap[prevB, b] + distanceMap[b, a] + distanceMap[a, nextA])
+    return (distanceMap[prevA, b] + distanceMap[b, nextA] + distanceMap[prevB, a] + distanceMap[a, nextB]) - \
+           (distanceMap[prevA, a] + distanceMap[a, nextA] + distanceMap[prevB, b] + distanceMap[b, nextB])
@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+# coding=utf-8
+
+import numpy as np
+from distance_backends import DEFAULT_MEMORY_LIMIT, select_backend, build_metric_backend
+from distance_metrics import distance_matrix, geo_radians
+
+"""
+Read TSPLIB .tsp files so the standard benchmark instances can be solved.
+Supports EUC_2D, GEO and ATT node coordinates and EXPLICIT edge weight matrices.
+Node coordinates are parsed with np.loadtxt straight into float64 arrays. Instances whose dense matrix
+exceeds the memory limit get a condensed backend instead, and ones too large for that compute distances on the fly.
+"""
+
+SUPPORTED_EDGE_WEIGHT_TYPES = ("EUC_2D", "GEO", "ATT", "EXPLICIT")
+
+# The distance_metrics metric behind each coordinate edge weight type.
+EDGE_WEIGHT_METRICS = {"EUC_2D": "euc_2d", "GEO": "geo", "ATT": "att"}
+
+class TSPLIBProblem:
+    """
+    The parts of a TSPLIB problem needed to solve it.
+    Either coordinates (for EUC_2D, GEO and ATT) or weights (for EXPLICIT) is set.
+    """
+
+    def __init__(self, name, dimension, edgeWeightType, names, coordinates=None, weights=None):
+        self.name = name
+        self.dimension = dimension
+        self.edgeWeightType = edgeWeightType
+        self.names = names
+        self.coordinates = coordinates
+        self.weights = weights
+
+def read_tsplib(filepath):
+    """
+    Parse a TSPLIB .tsp file.
+    :param filepath: The file to read.
+    :return: A TSPLIBProblem.
+    """
+    header = {}
+    with open(filepath) as data:
+        while True:
+            line = data.readline()
+            if not line:
+                raise ValueError(f"{filepath} ended before any data section.")
+            line = line.strip()
+            if not line:
+                continue
+            if line.startswith("NODE_COORD_SECTION") or line.startswith("EDGE_WEIGHT_SECTION"):
+                section = line.split()[0]
+                break
+            key, _, value = line.partition(":")
+            header[key.strip().upper()] = value.strip()
+
+        name = header.get("NAME", filepath)
+        dimension = int(header["DIMENSION"])
+        edgeWeightType = header.get("EDGE_WEIGHT_TYPE", "").upper()
+        if edgeWeightType not in SUPPORTED_EDGE_WEIGHT_TYPES:
+            raise ValueError(f"Unsupported EDGE_WEIGHT_TYPE '{edgeWeightType}', expected one of {', '.join(SUPPORTED_EDGE_WEIGHT_TYPES)}.")
+
+        if section == "NODE_COORD_SECTION":
+            nodes = np.loadtxt(data, max_rows=dimension, ndmin=2)
+            names = [str(int(node)) for node in nodes[:, 0]]
+            coordinates = np.ascontiguousarray(nodes[:, 1:3], dtype=np.float64)
+            return TSPLIBProblem(name, dimension, edgeWeightType, names, coordinates=coordinates)
+
+        weightFormat = header.get("EDGE_WEIGHT_FORMAT", "FULL_MATRIX").upper()
+        values = read_numbers(data, explicit_count(weightFormat, dimension))
+        weights = explicit_matrix(values, weightFormat, dimension)
+        names = [str(node + 1) for node in range(dimension)]
+        return TSPLIBProblem(name, dimension, edgeWeightType, names, weights=weights)
+
+def explicit_count(weightFormat, n):
+    """
+    The number of values in an EDGE_WEIGHT_SECTION of the given format.
+    """
+    if weightFormat == "FULL_MATRIX":
+        return n * n
+    if weightFormat in ("UPPER_ROW", "LOWER_ROW", "UPPER_COL", "LOWER_COL"):
+        return n * (n - 1) // 2
+    if weightFormat in ("UPPER_DIAG_ROW", "LOWER_DIAG_ROW", "UPPER_DIAG_COL", "LOWER_DIAG_COL"):
+        return n * (n + 1) // 2
+    raise ValueError(f"Unsupported EDGE_WEIGHT_FORMAT '{weightFormat}'.")
+
+def read_numbers(data, count):
+    """
+    Read a fixed count of whitespace separated numbers, however they are split across lines.
+    """
+    values = np.empty(count, dtype=np.float64)
+    filled = 0
+    while filled < count:
+        line = data.readline()
+        if not line:
+            raise ValueError(f"EDGE_WEIGHT_SECTION has {filled} values, expected {count}.")
+        row = np.array(line.split(), dtype=np.float64)
+        take = min(len(row), count - filled)
+        values[filled:filled + take] = row[:take]
+        filled += take
+    return values
+
+def explicit_matrix(values, weightFormat, n):
+    """
+    Expand an EDGE_WEIGHT_SECTION into a full symmetric (n, n) matrix.
+    A column-wise upper triangle lists the same values in the same order as a row-wise lower triangle, and vice versa.
+    """
+    if weightFormat == "FULL_MATRIX":
+        return values.reshape(n, n)
+    weights = np.zeros((n, n), dtype=np.float64)
+    if weightFormat in ("UPPER_ROW", "LOWER_COL"):
+        rows, cols = np.triu_indices(n, 1)
+    elif weightFormat in ("LOWER_ROW", "UPPER_COL"):
+        rows, cols = np.tril_indices(n, -1)
+    elif weightFormat in ("UPPER_DIAG_ROW", "LOWER_DIAG_COL"):
+        rows, cols = np.triu_indices(n, 0)
+    else: # LOWER_DIAG_ROW, UPPER_DIAG_COL
+        rows, cols = np.tril_indices(n, 0)
+    weights[rows, cols] = values
+    weights[cols, rows] = values
+    return weights
+
+def euc_2d_matrix(coordinates, chunkSize=1024):
+    """
+    TSPLIB EUC_2D distances: Euclidean distance rounded to the nearest integer.
+    """
+    return distance_matrix("euc_2d", coordinates[:, 0], coordinates[:, 1], chunkSize=chunkSize)
+
+def geo_matrix(coordinates, chunkSize=1024):
+    """
+    TSPLIB GEO distances: great circle distance in km on TSPLIB's idealized sphere, truncated to an integer.
+    The first coordinate is latitude and the second is longitude.
+    """
+    return distance_matrix("geo", coordinates[:, 0], coordinates[:, 1], chunkSize=chunkSize)
+
+def att_matrix(coordinates, chunkSize=1024):
+    """
+    TSPLIB ATT distances: pseudo-Euclidean distance, rounded up unless it is whole.
+    """
+    return distance_matrix("att", coordinates[:, 0], coordinates[:, 1], chunkSize=chunkSize)
+
+def build_tsplib_distance_map(problem, backend="auto", memoryLimit=DEFAULT_MEMORY_LIMIT):
+    """
+    Build the distance matrix or backend for a TSPLIB problem.
+    Coordinate instances get a dense matrix when it fits in the memory limit, then a condensed backend,
+    then a distance_backends.PlanarDistance or GeoDistance that stores nothing but coordinates.
+    :param problem: A TSPLIBProblem.
+    :param backend: "auto", "dense", "condensed" or "tiled" for on the fly. EXPLICIT weights are already a dense matrix
+                    and ignore it.
+    :param memoryLimit: The budget in bytes for the distance data.
+    :return: A matrix or backend usable everywhere a distance matrix from tsp.build_distance_map is.
+    """
+    if problem.edgeWeightType == "EXPLICIT":
+        return np.ascontiguousarray(problem.weights, dtype=np.float64)
+    if backend == "auto":
+        backend = select_backend(problem.dimension, memoryLimit)
+    if backend != "dense":
+        return build_metric_backend(EDGE_WEIGHT_METRICS[problem.edgeWeightType], problem.coordinates[:, 0],
+                                    problem.coordinates[:, 1], backend, memoryLimit)
+    if problem.edgeWeightType == "EUC_2D":
+        return euc_2d_matrix(problem.coordinates)
+    if problem.edgeWeightType == "ATT":
+        return att_matrix(problem.coordinates)
+    return geo_matrix(problem.coordinates)
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+# coding=utf-8
+
+from time import perf_counter
+from numba import types
+import tsp
+import hill_climbing
+import gradient_descent
+import local_search
+import annealing
+import spatial_index
+import initial_tours
+import genetic
+import islands
+import lower_bound
+
+"""
+Pre-populate the on-disk numba cache for every compiled kernel.
+All kernels are decorated with @njit(cache=True), so a call with the exact argument types
+listed here loads machine code from __pycache__ (or NUMBA_CACHE_DIR) instead of compiling.
+Run `python warmup.py` once per deployment, then every later process starts warm.
+"""
+
+TOUR = types.int64[::1]
+NEIGHBORS = types.int64[:, ::1]
+POINTS = types.float64[:, ::1]
+POPULATION = types.int32[:, ::1]
+PAIRS = types.int64[:, ::1]
+# Writable matrices from tsp.build_distance_map, and read-only ones memory-mapped from the distance cache.
+MATRICES = (types.float64[:, ::1], types.float32[:, ::1],
+            types.Array(types.float64, 2, 'C', readonly=True), types.Array(types.float32, 2, 'C', readonly=True))
+
+def kernel_signatures():
+    """
+    List the explicit type signatures of every kernel, one entry per argument type combination used by the drivers.
+    Omitted keyword arguments need their own signature, typed as types.Omitted(default).
+    :return: A list of (name, dispatcher, signatures) triples.
+    """
+    return [
+        ("tsp.haversine", tsp.haversine, [(types.float64,) * 4]),
+        ("tsp.seed_random", tsp.seed_random, [(types.int64,)]),
+        ("tsp.random_solution", tsp.random_solution, [(TOUR,)]),
+        ("tsp.shuffle_into", tsp.shuffle_into, [(TOUR, TOUR)]),
+        ("tsp.total_distance", tsp.total_distance, [(TOUR, matrix) for matrix in MATRICES]),
+        ("tsp.swap_delta", tsp.swap_delta, [(TOUR, matrix, types.int64, types.int64) for matrix in MATRICES]),
+        ("hill_climbing.find_best_neighbor", hill_climbing.find_best_neighbor, [(TOUR, matrix) for matrix in MATRICES]),
+        ("hill_climbing.climb_to_local_optimum", hill_climbing.climb_to_local_optimum,
+            [(TOUR, matrix, steps) for matrix in MATRICES for steps in (types.Omitted(hill_climbing.MAX_CLIMB_STEPS), types.int64)]),
+        ("gradient_descent.sample_best_swap", gradient_descent.sample_best_swap, [(TOUR, matrix, types.int64) for matrix in MATRICES]),
+        ("gradient_descent.find_best_neighbor", gradient_descent.find_best_neighbor,
+            [(TOUR, matrix, limit) for matrix in MATRICES for limit in (types.Omitted(None), types.int64)]),
+        ("local_search.local_search", local_search.local_search,
+            [(TOUR, matrix, NEIGHBORS, types.Omitted(True), types.Omitted(3)) for matrix in MATRICES]),
+        ("annealing.sample_uphill_delta", annealing.sample_uphill_delta,
+            [(TOUR, TOUR, matrix, NEIGHBORS, types.int64) for matrix in MATRICES]),
+        ("annealing.anneal_batch", annealing.anneal_batch,
+            [(TOUR, TOUR, TOUR, matrix, NEIGHBORS, types.float64, types.float64, types.int64, types.float64, types.float64, TOUR)
+             for matrix in MATRICES]),
+        ("annealing.late_acceptance_batch", annealing.late_acceptance_batch,
+            [(TOUR, TOUR, TOUR, matrix, NEIGHBORS, types.float64, types.float64, types.int64, types.float64[::1], types.int64, TOUR)
+             for matrix in MATRICES]),
+        ("genetic.population_distances", genetic.population_distances, [(POPULATION, matrix, types.float64[::1]) for matrix in MATRICES]),
+        ("genetic.random_population", genetic.random_population, [(POPULATION, types.int32[::1])]),
+        ("genetic.plan_generation", genetic.plan_generation,
+            [(types.float64[::1], types.int64, types.int64, types.float64, PAIRS, PAIRS, PAIRS)]),
+        ("genetic.breed", genetic.breed,
+            [(POPULATION, PAIRS, PAIRS, PAIRS, types.int64, POPULATION, types.boolean[:, ::1], types.int32[:, :, ::1], PAIRS)]),
+        ("islands.double_bridge", islands.double_bridge, [(TOUR, TOUR)]),
+        ("lower_bound.nearest_neighbor_length", lower_bound.nearest_neighbor_length, [(matrix,) for matrix in MATRICES]),
+        ("lower_bound.held_karp", lower_bound.held_karp,
+            [(matrix, types.float64, types.int64, types.float64[::1]) for matrix in MATRICES]),
+        ("spatial_index.build_kdtree", spatial_index.build_kdtree, [(POINTS,)]),
+        ("spatial_index.nearest_neighbor_lists", spatial_index.nearest_neighbor_lists, [(POINTS, TOUR, TOUR, TOUR, types.int64)]),
+        ("initial_tours.nearest_neighbor_tour", initial_tours.nearest_neighbor_tour,
+            [(POINTS, TOUR, TOUR, TOUR, TOUR, types.int64, types.float64, TOUR)]),
+        ("initial_tours.greedy_tour", initial_tours.greedy_tour,
+            [(POINTS, TOUR, TOUR, TOUR, TOUR, NEIGHBORS, types.float64, TOUR)]),
+        ("initial_tours.space_filling_curve_tour", initial_tours.space_filling_curve_tour, [(POINTS, types.boolean, TOUR)]),
+    ]
+
+def warm_up(verbose=False, parallel=True):
+    """
+    Compile every kernel signature, loading from the on-disk cache when it is already there.
+    :param verbose: Print the time taken per kernel.
+    :param parallel: Include the kernels compiled with parallel=True. Compiling one starts numba's threading layer,
+                     and a process that forks after that hangs at exit, so pass False before forking workers.
+    :return: A dictionary of kernel name to seconds spent compiling or loading.
+    """
+    timings = {}
+    for name, dispatcher, signatures in kernel_signatures():
+        if not parallel and dispatcher.targetoptions.get("parallel"):
+            continue
+        t1 = perf_counter()
+        for signature in signatures:
+            dispatcher.compile(signature)
+        timings[name] = perf_counter() - t1
+        if verbose:
+            hits = sum(dispatcher.stats.cache_hits.values())
+            print(f"{name:<40} {timings[name]:.3f} sec\t({hits} of {len(signatures)} signatures from cache)")
+    return timings
+
+def main():
+    print("Warming up the numba kernel cache")
+    timings = warm_up(verbose=True)
+    print(f"Total: {round(sum(timings.values()), 3)} sec")
+
+if __name__ == "__main__":
+    main()